@@ -1,7 +1,8 @@
 # src/dashboard.py
 """
 Terminal-based Real-time Dashboard (Pure MQTT version)
-Monitors 4 major topics: Helmet Telemetry, Station Telemetry, Helmet Commands, and Alarm Commands.
+Consumes the manager's aggregated site-state topic (fleet, devices, zones, siren)
+and the manager command topics for the command log, instead of the raw telemetry firehose.
 """
 
 import paho.mqtt.client as mqtt
@@ -11,8 +12,16 @@ import sys
 from datetime import datetime
 from dotenv import load_dotenv
 import time
+import shutil
 import threading
 from collections import deque
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+from model.site_state import SiteStateView
+from model.site_registry import DEFAULT_SITE_ID, site_topic
 
 load_dotenv()
 
@@ -28,6 +37,10 @@ TOPIC_STATION = os.getenv("TOPIC_STATION")
 TOPIC_MANAGER = os.getenv("TOPIC_MANAGER")
 TOPIC_ALARM = os.getenv("TOPIC_ALARM")
 
+SITE_ID = os.getenv("SITE_ID", DEFAULT_SITE_ID) # Site whose aggregated state is shown
+SITE_STATE_TOPIC = f"{site_topic(f'{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}', SITE_ID)}/state"
+SECTOR_CATALOG_TOPIC = f"{site_topic(f'{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}', SITE_ID)}/sectors"
+
 # Global data (Thread-safe)
 helmets_data = {}
 stations_data = {}
@@ -36,11 +49,21 @@ alarm_state = {
     'siren': False,
     'zones': []
 }
+site_view = SiteStateView()
+sector_catalog = [] # Sector index -> sector ID (retained catalog from the manager)
 
 mqtt_connected = False
 message_count = 0
 data_lock = threading.Lock()
 
+# Bumped on every change so the main loop only re-renders when needed
+data_version = 0
+data_changed = threading.Event()
+
+# Refresh pacing (seconds): at most one frame per MIN interval, at least one per MAX (clock)
+REFRESH_MIN_INTERVAL = float(os.getenv("DASHBOARD_MIN_INTERVAL", 0.2))
+REFRESH_MAX_INTERVAL = float(os.getenv("DASHBOARD_MAX_INTERVAL", 1.0))
+
 # ANSI Colors
 class Colors:
     HEADER = '\033[95m'
@@ -54,9 +77,57 @@ class Colors:
     END = '\033[0m'
     GRAY = '\033[90m'
 
-def clear_screen():
-    """Clear terminal screen"""
-    os.system('clear' if os.name != 'nt' else 'cls')
+class TerminalRenderer:
+    """
+    Diff-based renderer using ANSI cursor positioning.
+    Only lines that differ from the previous frame are rewritten, in a single
+    write, on the alternate screen buffer (no flicker, no scrolling, no subprocess).
+    """
+
+    ENTER = "\033[?1049h\033[?25l\033[2J"  # Alternate screen, hide cursor, clear
+    EXIT = "\033[?25h\033[?1049l"            # Show cursor, back to main screen
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+        self.previous = []
+        self.active = False
+
+    def render(self, lines):
+        rows = shutil.get_terminal_size().lines
+        if len(lines) > rows:
+            hidden = len(lines) - rows + 1
+            lines = lines[:rows - 1] + [f"{Colors.GRAY}... {hidden} more lines (enlarge the terminal){Colors.END}"]
+
+        out = []
+        if not self.active:
+            out.append(self.ENTER)
+            self.previous = []
+            self.active = True
+
+        for row, line in enumerate(lines):
+            if row >= len(self.previous) or self.previous[row] != line:
+                out.append(f"\033[{row + 1};1H{line}\033[K")
+        # Clear lines left over from a longer previous frame
+        for row in range(len(lines), len(self.previous)):
+            out.append(f"\033[{row + 1};1H\033[K")
+
+        self.previous = lines
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+
+    def close(self):
+        if self.active:
+            self.stream.write(self.EXIT)
+            self.stream.flush()
+            self.active = False
+
+
+def mark_changed():
+    """Call with data_lock held after mutating dashboard state"""
+    global data_version
+    data_version += 1
+    data_changed.set()
 
 def get_battery_bar(battery, width=15):
     """Generate a visual battery bar"""
@@ -83,33 +154,34 @@ def get_status_icon(led):
     else:
         return f"{Colors.CYAN}⚒️  WORKING{Colors.END}"
 
-def print_dashboard():
-    """Print the dashboard to terminal"""
-    with data_lock:
-        helmets = dict(helmets_data)
-        stations = dict(stations_data)
-        current_alarm = dict(alarm_state)
-        logs = list(command_log)
-    
-    clear_screen()
+def build_frame():
+    """Build the dashboard as a list of lines (call with data_lock held)"""
+    helmets = helmets_data
+    stations = stations_data
+    current_alarm = alarm_state
+    logs = command_log
+    lines = []
+
+    def add(text=""):
+        lines.extend(text.split("\n"))
     
     # === HEADER ===
-    print(f"\n{Colors.BOLD}{Colors.CYAN}{'='*90}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.CYAN}🏗️  PURE MQTT MONITORING DASHBOARD{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.CYAN}{'='*90}{Colors.END}\n")
+    add(f"\n{Colors.BOLD}{Colors.CYAN}{'='*90}{Colors.END}")
+    add(f"{Colors.BOLD}{Colors.CYAN}🏗️  PURE MQTT MONITORING DASHBOARD{Colors.END}")
+    add(f"{Colors.BOLD}{Colors.CYAN}{'='*90}{Colors.END}\n")
     
     # Connection Status
     status = f"{Colors.GREEN}✅ CONNECTED{Colors.END}" if mqtt_connected else f"{Colors.RED}❌ DISCONNECTED{Colors.END}"
-    print(f"📡 MQTT Status: {status}  |  📊 Total Messages: {Colors.BOLD}{message_count}{Colors.END}")
-    print(f"⏰ Local Time: {Colors.BOLD}{datetime.now().strftime('%H:%M:%S')}{Colors.END}")
-    print(f"{Colors.CYAN}{'─'*90}{Colors.END}\n")
+    add(f"📡 MQTT Status: {status}  |  📊 Total Messages: {Colors.BOLD}{message_count}{Colors.END}")
+    add(f"⏰ Local Time: {Colors.BOLD}{datetime.now().strftime('%H:%M:%S')}{Colors.END}")
+    add(f"{Colors.CYAN}{'─'*90}{Colors.END}\n")
     
     # === DEVICES OVERVIEW (HELMETS & STATIONS) ===
     col_width = 44
     
     # Split into two columns
-    print(f"{Colors.BOLD}{'⛑️  SMART HELMETS':<{col_width}} | {'🌩️  ENVIRONMENTAL STATIONS':<{col_width}}{Colors.END}")
-    print(f"{'─'*col_width}─┼─{'─'*col_width}")
+    add(f"{Colors.BOLD}{'⛑️  SMART HELMETS':<{col_width}} | {'🌩️  ENVIRONMENTAL STATIONS':<{col_width}}{Colors.END}")
+    add(f"{'─'*col_width}─┼─{'─'*col_width}")
     
     max_rows = max(len(helmets), len(stations))
     h_ids = sorted(helmets.keys())
@@ -121,8 +193,8 @@ def print_dashboard():
         if i < len(h_ids):
             h_id = h_ids[i]
             h = helmets[h_id]
-            batt = h.get('battery', 0)
-            led = h.get('led', 0)
+            batt = int(h.get('battery') or 0)
+            led = int(h.get('led') or 0)
             h_info = f"{Colors.BOLD}{h_id}{Colors.END} {get_battery_bar(batt, 10)} {batt:3d}% {get_status_icon(led)}"
         elif i == 0 and not h_ids:
             h_info = f"{Colors.GRAY}Waiting for helmets...{Colors.END}"
@@ -133,52 +205,61 @@ def print_dashboard():
             s_id = s_ids[i]
             s = stations[s_id]
             dust, noise, gas = s.get('dust', 0), s.get('noise', 0), s.get('gas', 0)
-            # Threshold markers
-            is_warn = (dust > 50 or noise > 80 or gas > 1.0)
-            warn_icon = "🔴" if is_warn else "🟢"
+            # Danger as evaluated by the manager
+            warn_icon = "🔴" if s.get('danger') else "🟢"
             s_info = f"{Colors.BOLD}{s_id}{Colors.END} {warn_icon} D:{dust:4.1f} N:{noise:4.1f} G:{gas:4.2f}"
         elif i == 0 and not s_ids:
             s_info = f"{Colors.GRAY}Waiting for stations...{Colors.END}"
             
-        print(f"{h_info:<{col_width + (10 if i < len(h_ids) else 0)}} | {s_info}")
+        add(f"{h_info:<{col_width + (10 if i < len(h_ids) else 0)}} | {s_info}")
     
-    print(f"{Colors.CYAN}{'─'*90}{Colors.END}\n")
+    add(f"{Colors.CYAN}{'─'*90}{Colors.END}\n")
 
     # === ALARM & DISPLAY SECTION ===
-    print(f"{Colors.BOLD}🚨 SYSTEM ALARM & DISPLAY{Colors.END}")
-    print(f"{'─'*90}")
+    add(f"{Colors.BOLD}🚨 SYSTEM ALARM & DISPLAY{Colors.END}")
+    add(f"{'─'*90}")
     siren = f"{Colors.RED}📢 ON (SOUNDING){Colors.END}" if current_alarm['siren'] else f"{Colors.GREEN}🔕 OFF (SILENT){Colors.END}"
-    print(f"🔊 Siren Status: {siren}")
+    add(f"🔊 Siren Status: {siren}")
     
     zones = current_alarm['zones']
     if zones:
-        print(f"🖥️  Dangerous Zones on Display: {Colors.RED}{', '.join(zones[:10])}{' ...' if len(zones) > 10 else ''}{Colors.END}")
+        names = [sector_name(z) for z in zones[:10]]
+        add(f"🖥️  Dangerous Zones on Display: {Colors.RED}{', '.join(names)}{' ...' if len(zones) > 10 else ''}{Colors.END}")
     else:
-        print(f"🖥️  Dangerous Zones on Display: {Colors.GREEN}None (All areas safe){Colors.END}")
-    print(f"{Colors.CYAN}{'─'*90}{Colors.END}\n")
+        add(f"🖥️  Dangerous Zones on Display: {Colors.GREEN}None (All areas safe){Colors.END}")
+    add(f"{Colors.CYAN}{'─'*90}{Colors.END}\n")
 
     # === COMMAND LOG (REAL-TIME COMMANDS FROM MANAGER) ===
-    print(f"{Colors.BOLD}📜 MANAGER COMMAND LOG (RECENT){Colors.END}")
-    print(f"{'─'*90}")
+    add(f"{Colors.BOLD}📜 MANAGER COMMAND LOG (RECENT){Colors.END}")
+    add(f"{'─'*90}")
     if not logs:
-        print(f"{Colors.GRAY}No commands recorded yet.{Colors.END}")
+        add(f"{Colors.GRAY}No commands recorded yet.{Colors.END}")
     else:
         for log in logs:
-            print(f"{Colors.GRAY}[{log['time']}]{Colors.END} {log['msg']}")
+            add(f"{Colors.GRAY}[{log['time']}]{Colors.END} {log['msg']}")
     
-    print(f"\n{Colors.CYAN}{'='*90}{Colors.END}")
-    print(f"Press {Colors.BOLD}Ctrl+C{Colors.END} to exit")
+    add(f"\n{Colors.CYAN}{'='*90}{Colors.END}")
+    add(f"Press {Colors.BOLD}Ctrl+C{Colors.END} to exit")
+    return lines
+
+
+def sector_name(index):
+    """Sector index -> display name (falls back to #index until the catalog arrives)"""
+    return sector_catalog[index] if 0 <= index < len(sector_catalog) else f"#{index}"
 
 # MQTT Callbacks
 def on_connect(client, userdata, flags, rc):
     global mqtt_connected
     if rc == 0:
         mqtt_connected = True
-        # Subscribe to EVERYTHING under the project namespace
-        client.subscribe(f"{MQTT_BASIC_TOPIC}/#", qos=1)
-        print(f"✅ Dashboard subscribed to all topics under: {MQTT_BASIC_TOPIC}")
+        # Aggregated state (retained full snapshot + deltas) and manager commands for the log
+        client.subscribe(SITE_STATE_TOPIC, qos=1)
+        client.subscribe(SECTOR_CATALOG_TOPIC, qos=1)
+        client.subscribe(f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/+/+/command", qos=1)
     else:
         mqtt_connected = False
+    with data_lock:
+        mark_changed()
 
 def on_message(client, userdata, message):
     global helmets_data, stations_data, alarm_state, message_count, command_log
@@ -190,59 +271,40 @@ def on_message(client, userdata, message):
         
         with data_lock:
             message_count += 1
+            mark_changed()
             
+            # AGGREGATED SITE STATE (From Manager)
+            if topic == SITE_STATE_TOPIC:
+                if site_view.apply(payload):
+                    helmets_data.clear()
+                    helmets_data.update(site_view.helmets)
+                    stations_data.clear()
+                    stations_data.update(site_view.stations)
+                    alarm_state['siren'] = site_view.siren
+                    alarm_state['zones'] = list(site_view.zones)
+                return
+
+            if topic == SECTOR_CATALOG_TOPIC:
+                sector_catalog[:] = payload.get('sectors', [])
+                return
+
             parts = topic.split('/')
-            if len(parts) < 3:
+            if len(parts) < 4:
                 return
 
             device_type = parts[-3]
             device_id = parts[-2]
-            msg_type = parts[-1]
-
-            # DEVICE INFO (Discovery)
-            if msg_type == "info":
-                if device_type == TOPIC_HELMET:
-                    if device_id not in helmets_data:
-                        helmets_data[device_id] = {'battery': 0, 'led': 0}
-                elif device_type == TOPIC_STATION:
-                    if device_id not in stations_data:
-                        stations_data[device_id] = {'dust': 0, 'noise': 0, 'gas': 0}
-
-            # TELEMETRY (SenML)
-            elif msg_type == "telemetry":
-                data = {}
-                if isinstance(payload, list):
-                    for entry in payload:
-                        n, v = entry.get('n', ''), entry.get('v')
-                        if 'gps.lat' in n: data['latitude'] = v
-                        elif 'gps.lon' in n: data['longitude'] = v
-                        elif 'sensor.battery' in n: data['battery'] = v
-                        elif 'actuator.led' in n: data['led'] = v
-                        elif 'sensor.dust' in n: data['dust'] = v
-                        elif 'sensor.noise' in n: data['noise'] = v
-                        elif 'sensor.gas' in n: data['gas'] = v
-                
-                if device_type == TOPIC_HELMET:
-                    helmets_data[device_id] = {
-                        'battery': int(data.get('battery', 0)),
-                        'led': int(data.get('led', 0)),
-                        'lat': data.get('latitude', 0),
-                        'lon': data.get('longitude', 0)
-                    }
-                elif device_type == TOPIC_STATION:
-                    stations_data[device_id] = {
-                        'dust': data.get('dust', 0),
-                        'noise': data.get('noise', 0),
-                        'gas': data.get('gas', 0)
-                    }
 
             # COMMANDS (From Manager)
-            elif parts[-4] == TOPIC_MANAGER:
+            if parts[-4] == TOPIC_MANAGER:
                 cmd = payload.get('command')
                 
                 if device_type == TOPIC_HELMET:
-                    val = payload.get('led')
-                    msg = f"{Colors.YELLOW}HELMET {device_id}{Colors.END} -> {Colors.BOLD}{cmd}{Colors.END} (led={val})"
+                    if cmd == 'set_interval':
+                        msg = f"{Colors.YELLOW}HELMET {device_id}{Colors.END} -> {Colors.BOLD}{cmd}{Colors.END} ({payload.get('interval')}s)"
+                    else:
+                        val = payload.get('led')
+                        msg = f"{Colors.YELLOW}HELMET {device_id}{Colors.END} -> {Colors.BOLD}{cmd}{Colors.END} (led={val})"
                 elif device_type == TOPIC_ALARM:
                     if cmd == 'turn_siren_on':
                         alarm_state['siren'] = True
@@ -252,8 +314,10 @@ def on_message(client, userdata, message):
                         msg = f"{Colors.GREEN}ALARM {device_id}{Colors.END} -> {Colors.BOLD}SIREN OFF{Colors.END}"
                     elif cmd == 'update_display':
                         zones = payload.get('zones', [])
-                        alarm_state['zones'] = [str(z) for z in zones]
-                        msg = f"{Colors.BLUE}ALARM {device_id}{Colors.END} -> {Colors.BOLD}ZONES UPDATED{Colors.END} ({len(zones)} zones)"
+                        msg = f"{Colors.BLUE}ALARM {device_id}{Colors.END} -> {Colors.BOLD}ZONES RESYNC{Colors.END} ({len(zones)} zones)"
+                    elif cmd == 'update_display_delta':
+                        added, removed = payload.get('add', []), payload.get('remove', [])
+                        msg = f"{Colors.BLUE}ALARM {device_id}{Colors.END} -> {Colors.BOLD}ZONES UPDATED{Colors.END} (+{len(added)} / -{len(removed)})"
                     else:
                         msg = f"ALARM {device_id} -> {cmd}"
                 
@@ -271,15 +335,33 @@ def main():
     client.on_message = on_message
     client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
     
+    renderer = TerminalRenderer()
+    
     try:
         client.connect(BROKER_ADDRESS, BROKER_PORT, 60)
         client.loop_start()
         
+        rendered_version = -1
+        rendered_second = None
         while True:
-            print_dashboard()
-            time.sleep(1)
+            # Wake up on new data, or at least once per MAX interval for the clock
+            data_changed.wait(REFRESH_MAX_INTERVAL)
+            data_changed.clear()
+
+            second = int(time.time())
+            with data_lock:
+                if data_version == rendered_version and second == rendered_second:
+                    continue
+                rendered_version = data_version
+                rendered_second = second
+                lines = build_frame()
+            renderer.render(lines)
+
+            # Coalesce bursts of messages into one frame
+            time.sleep(REFRESH_MIN_INTERVAL)
             
     except KeyboardInterrupt:
+        renderer.close()
         client.loop_stop()
         client.disconnect()
         print(f"\n{Colors.GREEN}✅ Dashboard stopped{Colors.END}\n")
@@ -0,0 +1,81 @@
+# Distance (in grid cells) from every grid cell to the nearest dangerous cell.
+# Used by the manager to warn workers before they step into a dangerous sector.
+#
+# Distances use 8-neighbour steps (Chebyshev metric) and are bounded by max_distance:
+# cells farther away than that hold max_distance + 1. Because of the bound, a change at
+# one cell can only affect cells within max_distance of it, so updates recompute a
+# small window around the changed cells instead of the whole grid.
+
+import numpy as np
+
+
+class DangerDistanceField:
+
+    def __init__(self, rows, cols, max_distance):
+        self.shape = (rows, cols)
+        self.max_distance = max(0, int(max_distance))
+        self.far = self.max_distance + 1 # Value for "not within max_distance"
+        self.dangerous = np.zeros((rows, cols), dtype=bool)
+        self.distance = np.full((rows, cols), self.far, dtype=np.int16)
+
+    def distance_at(self, row, col):
+        """Cells to the nearest dangerous cell (0 = inside danger, far = out of range)"""
+        return int(self.distance[row, col])
+
+    def update(self, added, removed):
+        """
+        Apply a change of the danger set.
+        added / removed: (rows_array, cols_array) of cells that became dangerous / safe.
+        """
+        add_r, add_c = (np.asarray(a, dtype=np.intp) for a in added)
+        rem_r, rem_c = (np.asarray(a, dtype=np.intp) for a in removed)
+        self.dangerous[add_r, add_c] = True
+        self.dangerous[rem_r, rem_c] = False
+
+        if rem_r.size:
+            # Cells that relied on a removed source: recompute the window around them
+            # from every source that can still reach it (window grown by max_distance)
+            self._recompute(self._window(rem_r, rem_c, self.max_distance))
+        if add_r.size:
+            # New sources can only lower distances: merge their local field
+            window = self._window(add_r, add_c, self.max_distance)
+            sources = np.zeros(self.shape, dtype=bool)
+            sources[add_r, add_c] = True
+            local = self._bounded_distance(sources[window])
+            np.minimum(self.distance[window], local, out=self.distance[window])
+
+    def _recompute(self, window):
+        r0, r1 = window[0].start, window[0].stop
+        c0, c1 = window[1].start, window[1].stop
+        outer = self._window(np.array([r0, r1 - 1]), np.array([c0, c1 - 1]), self.max_distance)
+        local = self._bounded_distance(self.dangerous[outer])
+        inner = (slice(r0 - outer[0].start, r1 - outer[0].start), slice(c0 - outer[1].start, c1 - outer[1].start))
+        self.distance[window] = local[inner]
+
+    def _window(self, rows, cols, margin):
+        """Bounding box of the cells grown by margin, clipped to the grid"""
+        return (
+            slice(max(0, int(rows.min()) - margin), min(self.shape[0], int(rows.max()) + margin + 1)),
+            slice(max(0, int(cols.min()) - margin), min(self.shape[1], int(cols.max()) + margin + 1))
+        )
+
+    def _bounded_distance(self, sources):
+        """Multi-source BFS as repeated 3x3 dilations, stopped at max_distance"""
+        distance = np.full(sources.shape, self.far, dtype=np.int16)
+        distance[sources] = 0
+        reached = sources.copy()
+        for d in range(1, self.max_distance + 1):
+            grown = reached.copy() # One 8-neighbour step
+            grown[1:, :] |= reached[:-1, :]
+            grown[:-1, :] |= reached[1:, :]
+            grown[:, 1:] |= reached[:, :-1]
+            grown[:, :-1] |= reached[:, 1:]
+            grown[1:, 1:] |= reached[:-1, :-1]
+            grown[1:, :-1] |= reached[:-1, 1:]
+            grown[:-1, 1:] |= reached[1:, :-1]
+            grown[:-1, :-1] |= reached[1:, 1:]
+            distance[grown & ~reached] = d
+            reached = grown
+            if reached.all():
+                break
+        return distance
@@ -7,6 +7,7 @@
 import json
 import random
 from model.gps import GPS
+from utils.sim_clock import clock
 
 from dotenv import load_dotenv
 import os
@@ -67,20 +68,22 @@ class EnvironmentalMonitoringStation:
 
         return json.dumps(data)
 
-    def device_info(self):
+    def device_info(self, reporting: dict = None):
         """Metadata for retained info topic (aligned with template)"""
-        return json.dumps({
+        info = {
             "id": self.id,
             "user_id": "admin-unimore-333695",
             "software_version": "2.0.0",
             "type": "station",
             "capabilities": ["gps", "dust", "noise", "gas"]
-        })
+        }
+        if reporting:
+            info["reporting"] = reporting # Telemetry deadbands and heartbeat period
+        return json.dumps(info)
 
     def to_senml(self):
         """Convert telemetry to SenML+JSON format with hierarchical names"""
-        import time
-        timestamp = time.time()
+        timestamp = clock.time()
         return json.dumps([
             {"n": "station.gps.lat", "u": "lat", "v": self.position.latitude, "t": timestamp},
             {"n": "station.gps.lon", "u": "lon", "v": self.position.longitude, "t": timestamp},
@@ -0,0 +1,172 @@
+# Whole fleets of simulated devices held in NumPy arrays (one entry per device).
+# Same behaviour as WorkerSmartHelmet / EnvironmentalMonitoringStation, but every
+# step (random walk, boundary check, battery, sensor drift) runs for all selected
+# devices at once instead of one Python object per device.
+
+import json
+import numpy as np
+
+
+def points_in_polygon(lat, lon, polygon):
+    """
+    Vectorized ray casting, point for point the same result as WorkerSmartHelmet._point_in_polygon:
+    an edge counts when min(lon1, lon2) < lon <= max(lon1, lon2) and the point lies at or below
+    it in latitude (lat <= intersection), so points on those edges and vertices match too.
+    lat, lon: arrays of points; polygon: list of (lat, lon) tuples
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    inside = np.zeros(lat.shape, dtype=bool)
+    n = len(polygon)
+    for i in range(n):
+        lat1, lon1 = polygon[i]
+        lat2, lon2 = polygon[(i + 1) % n]
+        crosses = (lon1 < lon) != (lon2 < lon) # Edge spans the point's longitude (lon1 != lon2 here)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_intersection = (lon - lon1) * (lat2 - lat1) / (lon2 - lon1) + lat1
+        inside ^= crosses & (lat <= x_intersection)
+    return inside
+
+
+def random_points_in_polygon(count, polygon, rng):
+    """count uniform random (lat, lon) points inside the polygon (rejection sampling)"""
+    lats = np.array([p[0] for p in polygon])
+    lons = np.array([p[1] for p in polygon])
+    out_lat = np.empty(0)
+    out_lon = np.empty(0)
+    while out_lat.size < count:
+        batch = max(2 * (count - out_lat.size), 64)
+        lat = rng.uniform(lats.min(), lats.max(), batch)
+        lon = rng.uniform(lons.min(), lons.max(), batch)
+        ok = points_in_polygon(lat, lon, polygon)
+        out_lat = np.concatenate([out_lat, lat[ok]])
+        out_lon = np.concatenate([out_lon, lon[ok]])
+    return out_lat[:count], out_lon[:count]
+
+
+def _select(size, mask):
+    return np.arange(size) if mask is None else np.flatnonzero(mask)
+
+
+class HelmetFleet:
+
+    STEP_SIZE = 0.00002 # approx 2 meters, as WorkerSmartHelmet.move
+
+    def __init__(self, ids, latitudes, longitudes, polygon=None, rng=None):
+        self.ids = list(ids)
+        self.index = {helmet_id: i for i, helmet_id in enumerate(self.ids)}
+        self.latitude = np.array(latitudes, dtype=np.float64)
+        self.longitude = np.array(longitudes, dtype=np.float64)
+        self.battery = np.full(len(self.ids), 100, dtype=np.int16)
+        self.led = np.zeros(len(self.ids), dtype=np.int8) # 0: Work (moving), 1: Charging (stationary)
+        self.polygon = polygon # list of (lat, lon) tuples, None = no boundary
+        self.rng = rng or np.random.default_rng()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def set_led(self, helmet_id, state: int):
+        i = self.index.get(helmet_id)
+        if i is not None:
+            self.led[i] = state
+
+    def step(self, mask=None):
+        """One simulation step for the selected helmets (all of them when mask is None)"""
+        selected = _select(len(self), mask)
+        working = selected[self.led[selected] == 0]
+        charging = selected[self.led[selected] != 0]
+
+        if working.size:
+            # Random walk, rejected where it would leave the site
+            new_lat = self.latitude[working] + self.rng.uniform(-self.STEP_SIZE, self.STEP_SIZE, working.size)
+            new_lon = self.longitude[working] + self.rng.uniform(-self.STEP_SIZE, self.STEP_SIZE, working.size)
+            if self.polygon:
+                inside = points_in_polygon(new_lat, new_lon, self.polygon)
+                moved = working[inside]
+                self.latitude[moved] = new_lat[inside]
+                self.longitude[moved] = new_lon[inside]
+            else:
+                self.latitude[working] = new_lat
+                self.longitude[working] = new_lon
+            drain = self.rng.integers(1, 11, working.size, dtype=np.int16)
+            self.battery[working] = np.maximum(self.battery[working] - drain, 0)
+
+        if charging.size:
+            charge = self.rng.integers(5, 11, charging.size, dtype=np.int16)
+            self.battery[charging] = np.minimum(self.battery[charging] + charge, 100)
+
+    def device_info(self, i, reporting: dict = None):
+        info = {
+            "id": self.ids[i],
+            "user_id": "worker-unimore-333695",
+            "software_version": "2.0.0",
+            "type": "helmet",
+            "capabilities": ["gps", "battery", "led"]
+        }
+        if reporting:
+            info["reporting"] = reporting
+        return json.dumps(info)
+
+    def to_senml(self, indices, timestamp):
+        """SenML payloads (same records as WorkerSmartHelmet.to_senml) for the given helmets"""
+        return [
+            f'[{{"n":"helmet.gps.lat","u":"lat","v":{lat!r},"t":{timestamp}}},'
+            f'{{"n":"helmet.gps.lon","u":"lon","v":{lon!r},"t":{timestamp}}},'
+            f'{{"n":"helmet.sensor.battery","u":"%","v":{battery},"t":{timestamp}}},'
+            f'{{"n":"helmet.actuator.led","v":{led},"t":{timestamp}}}]'
+            for lat, lon, battery, led in zip(
+                self.latitude[indices].tolist(), self.longitude[indices].tolist(),
+                self.battery[indices].tolist(), self.led[indices].tolist())
+        ]
+
+
+class StationFleet:
+
+    def __init__(self, ids, latitudes, longitudes, rng=None):
+        self.ids = list(ids)
+        self.index = {station_id: i for i, station_id in enumerate(self.ids)}
+        self.rng = rng or np.random.default_rng()
+        n = len(self.ids)
+        self.latitude = np.array(latitudes, dtype=np.float64)
+        self.longitude = np.array(longitudes, dtype=np.float64)
+        self.dust = self.rng.uniform(20, 40, n)
+        self.noise = self.rng.uniform(40, 60, n)
+        self.gas = self.rng.uniform(0, 0.5, n)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def step(self, mask=None):
+        """Sensor drift for the selected stations (same ranges as EnvironmentalMonitoringStation)"""
+        selected = _select(len(self), mask)
+        n = selected.size
+        if not n:
+            return
+        self.dust[selected] = np.clip(self.dust[selected] + self.rng.uniform(-5, 5, n), 0, 120)
+        self.noise[selected] = np.clip(self.noise[selected] + self.rng.uniform(-5, 5, n), 0, 120)
+        self.gas[selected] = np.clip(self.gas[selected] + self.rng.uniform(-0.1, 0.1, n), 0, 10)
+
+    def device_info(self, i, reporting: dict = None):
+        info = {
+            "id": self.ids[i],
+            "user_id": "admin-unimore-333695",
+            "software_version": "2.0.0",
+            "type": "station",
+            "capabilities": ["gps", "dust", "noise", "gas"]
+        }
+        if reporting:
+            info["reporting"] = reporting
+        return json.dumps(info)
+
+    def to_senml(self, indices, timestamp):
+        """SenML payloads (same records as EnvironmentalMonitoringStation.to_senml) for the given stations"""
+        return [
+            f'[{{"n":"station.gps.lat","u":"lat","v":{lat!r},"t":{timestamp}}},'
+            f'{{"n":"station.gps.lon","u":"lon","v":{lon!r},"t":{timestamp}}},'
+            f'{{"n":"station.sensor.dust","u":"pm","v":{dust!r},"t":{timestamp}}},'
+            f'{{"n":"station.sensor.noise","u":"db","v":{noise!r},"t":{timestamp}}},'
+            f'{{"n":"station.sensor.gas","u":"ppm","v":{gas!r},"t":{timestamp}}}]'
+            for lat, lon, dust, noise, gas in zip(
+                self.latitude[indices].tolist(), self.longitude[indices].tolist(),
+                self.dust[indices].tolist(), self.noise[indices].tolist(), self.gas[indices].tolist())
+        ]
@@ -0,0 +1,152 @@
+# Continuous per-sector hazard estimate (dust, noise, gas) interpolated from every station
+# with inverse-distance weighting (see model/idw.py).
+#
+# Sector-to-station weights are precomputed once (sector centers = bounding-box centers)
+# and stored grouped by station, CSR style: offsets[slot]:offsets[slot + 1] are that
+# station's (sector, weight) pairs. A new station appends its pairs (it takes the last slot);
+# they are all rebuilt only when a station moves.
+#
+# Per quantity the field keeps the IDW numerator and denominator of every sector. A report
+# from one station only moves its own contribution:
+#     numerator[sectors] += weight * (new - old)      (denominator changes only on the first reading)
+# so an update costs O(sectors the station reaches), and only those estimates are refreshed.
+# A per-sector count of reporting stations tells when the last one stopped reporting a
+# quantity: the sums are then reset to exactly 0 instead of keeping the subtraction residue.
+# A full recompute after `refresh_every` incremental updates bounds float drift.
+#
+# index = max over quantities of estimate / limit: >= 1 where the interpolated level is
+# over a limit. NaN where no reporting station reaches the sector.
+
+import numpy as np
+from model.idw import StationField, idw_weights, ENERGY_QUANTITIES
+
+
+class HazardField:
+
+    def __init__(self, sector_xy, limits, radius=0.0, power=2.0, min_distance=1.0, refresh_every=10000):
+        """
+        sector_xy: (n, 2) sector centers in local meters; limits: {quantity: limit}
+        radius: stations farther than this are ignored (0 = every station reaches every sector)
+        """
+        self.sector_xy = np.asarray(sector_xy, dtype=np.float64).reshape(-1, 2)
+        self.limits = dict(limits)
+        self.quantities = tuple(self.limits)
+        self.radius = radius
+        self.power = power
+        self.min_distance = min_distance
+        self.refresh_every = refresh_every
+
+        n = len(self.sector_xy)
+        self.stations = StationField(self.quantities)
+        self.numerator = {q: np.zeros(n) for q in self.quantities}
+        self.denominator = {q: np.zeros(n) for q in self.quantities}
+        self.reporting = {q: np.zeros(n, dtype=np.intp) for q in self.quantities} # Stations with a value per sector
+        self.estimate = {q: np.full(n, np.nan) for q in self.quantities}
+        self.index = np.full(n, np.nan)
+
+        self.pair_sector = np.zeros(0, dtype=np.intp) # Grouped by station slot
+        self.pair_weight = np.zeros(0)
+        self.offsets = np.zeros(1, dtype=np.intp)
+        self._updates = 0
+        self.dirty = False # Changed since the last flush
+
+    def update_station(self, station_id, east, north, values):
+        """Apply one station reading; returns the sector indices whose estimate may have changed"""
+        slot = self.stations.slots.get(station_id)
+        is_new = slot is None
+        old = {q: np.nan if is_new else self.stations.values[q][slot] for q in self.quantities}
+        slot, moved = self.stations.update(station_id, east, north, values)
+        self.dirty = True
+        if is_new:
+            sectors, weights = self._station_pairs(slot)
+            self.pair_sector = np.concatenate([self.pair_sector, sectors])
+            self.pair_weight = np.concatenate([self.pair_weight, weights])
+            self.offsets = np.append(self.offsets, len(self.pair_sector))
+        elif moved:
+            self._rebuild()
+            return np.arange(len(self.sector_xy))
+
+        self._updates += 1
+        if self._updates >= self.refresh_every:
+            self._recompute()
+            return np.arange(len(self.sector_xy))
+
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        sectors, weights = self.pair_sector[start:end], self.pair_weight[start:end]
+        for q in self.quantities:
+            new, previous = self.stations.values[q][slot], old[q]
+            if np.isnan(new) and np.isnan(previous):
+                continue
+            new, previous = self._linear(q, new), self._linear(q, previous)
+            if np.isnan(previous):
+                self.numerator[q][sectors] += weights * new
+                self.denominator[q][sectors] += weights
+                self.reporting[q][sectors] += 1
+            elif np.isnan(new):
+                self.numerator[q][sectors] -= weights * previous
+                self.denominator[q][sectors] -= weights
+                self.reporting[q][sectors] -= 1
+                empty = sectors[self.reporting[q][sectors] == 0]
+                self.numerator[q][empty] = 0.0 # No station left: drop the float residue
+                self.denominator[q][empty] = 0.0
+            else:
+                self.numerator[q][sectors] += weights * (new - previous)
+        self._refresh(sectors)
+        return sectors
+
+    def _linear(self, quantity, value):
+        """Value in the domain where it is averaged (sound energy for dB)"""
+        return 10.0 ** (value / 10.0) if quantity in ENERGY_QUANTITIES else value
+
+    def _station_pairs(self, slot):
+        """(sector indices, weights) reached by one station"""
+        east, north = self.stations.xy[slot]
+        distance = np.hypot(self.sector_xy[:, 0] - east, self.sector_xy[:, 1] - north)
+        sectors = np.arange(len(self.sector_xy)) if self.radius <= 0 else np.flatnonzero(distance <= self.radius)
+        return sectors, idw_weights(distance[sectors], self.power, self.min_distance)
+
+    def _rebuild(self):
+        """Precompute the weights of every (sector, station) pair, grouped by station"""
+        pairs = [self._station_pairs(slot) for slot in range(len(self.stations))]
+        self.pair_sector = np.concatenate([sectors for sectors, _ in pairs])
+        self.pair_weight = np.concatenate([weights for _, weights in pairs])
+        self.offsets = np.zeros(len(pairs) + 1, dtype=np.intp)
+        self.offsets[1:] = np.cumsum([len(sectors) for sectors, _ in pairs])
+        self._recompute()
+
+    def _recompute(self):
+        """Numerators and denominators from scratch"""
+        n = len(self.sector_xy)
+        slots = np.repeat(np.arange(len(self.stations)), np.diff(self.offsets))
+        for q in self.quantities:
+            values = self._linear(q, self.stations.values[q][slots])
+            valid = ~np.isnan(values)
+            self.numerator[q] = np.bincount(
+                self.pair_sector[valid], weights=self.pair_weight[valid] * values[valid], minlength=n)
+            self.denominator[q] = np.bincount(self.pair_sector[valid], weights=self.pair_weight[valid], minlength=n)
+            self.reporting[q] = np.bincount(self.pair_sector[valid], minlength=n)
+        self._updates = 0
+        self._refresh(slice(None))
+
+    def _refresh(self, sectors):
+        """Estimates and hazard index of the given sectors from their numerators/denominators"""
+        index = None
+        for q in self.quantities:
+            denominator = self.denominator[q][sectors]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                estimate = self.numerator[q][sectors] / denominator
+            estimate[denominator <= 0] = np.nan
+            if q in ENERGY_QUANTITIES:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    estimate = 10.0 * np.log10(estimate)
+            self.estimate[q][sectors] = estimate
+            ratio = estimate / self.limits[q]
+            index = ratio if index is None else np.fmax(index, ratio)
+        if index is not None:
+            self.index[sectors] = index
+
+    def layers(self):
+        """{layer name: per-sector values} for storage and the web UI"""
+        layers = {"hazard": self.index}
+        layers.update(self.estimate)
+        return layers
@@ -0,0 +1,98 @@
+# Inverse-distance weighting (IDW) of station readings at arbitrary points (helmets, sectors).
+#
+# StationField keeps one slot per station: position in local meters and the latest value
+# of every quantity (NaN until the station reported it). A Shapely STRtree over the station
+# positions is the spatial index; it is rebuilt only when a station appears or moves,
+# not on every reading.
+#
+# Joins are vectorized: query() returns every (point, station) pair closer than a radius
+# as flat index arrays, and interpolate() reduces them per point with np.bincount, so the
+# cost grows with the number of nearby pairs, not helmets x stations.
+#
+# weight = 1 / max(distance, min_distance) ** power
+# Sound levels (dB) are averaged as energy (10 ** (L / 10)), not as decibels.
+
+import numpy as np
+
+QUANTITIES = ("dust", "noise", "gas")
+ENERGY_QUANTITIES = ("noise",) # Logarithmic units: average 10^(L/10)
+
+
+def idw_weights(distance, power=2.0, min_distance=1.0):
+    """IDW weight per distance (min_distance avoids the singularity at a station)"""
+    return 1.0 / np.maximum(distance, min_distance) ** power
+
+
+class StationField:
+
+    def __init__(self, quantities=QUANTITIES):
+        self.quantities = tuple(quantities)
+        self.slots = {} # {station_id: slot}
+        self.ids = [] # Station id per slot
+        self.xy = np.zeros((0, 2)) # (east, north) per slot
+        self.values = {q: np.zeros(0) for q in self.quantities} # Latest reading per slot (NaN = none)
+        self.version = 0 # +1 whenever a station appears or moves (cached joins are stale)
+        self._tree = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, station_id, east, north, values):
+        """Store a station reading; returns (slot, moved) where moved means joins must be rebuilt"""
+        slot = self.slots.get(station_id)
+        moved = False
+        if slot is None:
+            slot = self.slots[station_id] = len(self.ids)
+            self.ids.append(station_id)
+            self.xy = np.vstack([self.xy, [[east, north]]])
+            for q in self.quantities:
+                self.values[q] = np.append(self.values[q], np.nan)
+            moved = True
+        elif abs(self.xy[slot, 0] - east) > 0.01 or abs(self.xy[slot, 1] - north) > 0.01:
+            self.xy[slot] = (east, north)
+            moved = True
+        for q in self.quantities:
+            if q in values:
+                self.values[q][slot] = values[q]
+        if moved:
+            self.version += 1
+            self._tree = None
+        return slot, moved
+
+    def query(self, east, north, radius):
+        """
+        All (point, station) pairs within radius meters.
+        Returns (point index, station slot, distance) arrays.
+        """
+        east = np.asarray(east, dtype=np.float64)
+        north = np.asarray(north, dtype=np.float64)
+        if not len(self.ids) or not east.size:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, np.zeros(0)
+        import shapely
+        if self._tree is None:
+            self._tree = shapely.STRtree(shapely.points(self.xy))
+        pairs = self._tree.query(shapely.points(east, north), predicate="dwithin", distance=radius)
+        point_idx, slot_idx = pairs[0], pairs[1]
+        distance = np.hypot(east[point_idx] - self.xy[slot_idx, 0], north[point_idx] - self.xy[slot_idx, 1])
+        return point_idx, slot_idx, distance
+
+    def interpolate(self, point_idx, slot_idx, weights, quantity, n_points):
+        """
+        IDW estimate of quantity at n_points from query() pairs and their weights.
+        Points without a reporting station in range get NaN.
+        """
+        values = self.values[quantity][slot_idx]
+        valid = ~np.isnan(values)
+        if quantity in ENERGY_QUANTITIES:
+            values = np.power(10.0, values / 10.0)
+        w = np.where(valid, weights, 0.0)
+        numerator = np.bincount(point_idx, weights=np.where(valid, w * values, 0.0), minlength=n_points)
+        denominator = np.bincount(point_idx, weights=w, minlength=n_points)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            estimate = numerator / denominator
+        estimate[denominator == 0] = np.nan
+        if quantity in ENERGY_QUANTITIES:
+            with np.errstate(divide="ignore"):
+                estimate = 10.0 * np.log10(estimate)
+        return estimate
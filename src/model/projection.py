@@ -0,0 +1,62 @@
+# Local metric frame for site geometry.
+# Coordinates are converted once into east/north meters around a site origin, so that
+# distances, radii and point-in-polygon tests are plain planar math.
+#
+# The frame is a local tangent plane on the WGS84 ellipsoid: meridian (M) and prime
+# vertical (N) radii of curvature are evaluated at the origin. For construction-site
+# extents (a few km) the error is well below GPS accuracy.
+
+import math
+import numpy as np
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0 # Semi-major axis (meters)
+WGS84_E2 = 6.69437999014e-3 # First eccentricity squared
+
+
+class LocalProjection:
+
+    def __init__(self, origin_lat: float, origin_lon: float):
+        self.origin_lat = float(origin_lat)
+        self.origin_lon = float(origin_lon)
+
+        phi = math.radians(self.origin_lat)
+        w = 1.0 - WGS84_E2 * math.sin(phi) ** 2
+        meridian_radius = WGS84_A * (1.0 - WGS84_E2) / w ** 1.5 # M
+        normal_radius = WGS84_A / math.sqrt(w) # N
+
+        # Meters per degree at the origin
+        self.m_per_deg_lat = math.radians(meridian_radius)
+        self.m_per_deg_lon = math.radians(normal_radius * math.cos(phi))
+
+    @classmethod
+    def for_points(cls, points):
+        """Projection centered on the mean of the given GPS points"""
+        lats = [p.latitude for p in points]
+        lons = [p.longitude for p in points]
+        return cls(sum(lats) / len(lats), sum(lons) / len(lons))
+
+    def forward(self, lat, lon):
+        """(lat, lon) in degrees -> (east, north) in meters. Scalars or arrays."""
+        if np.ndim(lat) == 0 and np.ndim(lon) == 0:
+            return (
+                (lon - self.origin_lon) * self.m_per_deg_lon,
+                (lat - self.origin_lat) * self.m_per_deg_lat
+            )
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        return (lon - self.origin_lon) * self.m_per_deg_lon, (lat - self.origin_lat) * self.m_per_deg_lat
+
+    def inverse(self, east, north):
+        """(east, north) in meters -> (lat, lon) in degrees. Scalars or arrays."""
+        if np.ndim(east) == 0 and np.ndim(north) == 0:
+            return (
+                self.origin_lat + north / self.m_per_deg_lat,
+                self.origin_lon + east / self.m_per_deg_lon
+            )
+        east = np.asarray(east, dtype=np.float64)
+        north = np.asarray(north, dtype=np.float64)
+        return self.origin_lat + north / self.m_per_deg_lat, self.origin_lon + east / self.m_per_deg_lon
+
+    def params(self):
+        return (self.origin_lat, self.origin_lon)
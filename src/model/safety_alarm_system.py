@@ -10,8 +10,8 @@ import json
 class SafetyAlarmSystem:
 
     def __init__(self):
-        self.siren = False # True if siren is ON, False if siren is OFF
-        self.display = [] # add IDs of the dangerous sectors 
+        self.siren = False # True if siren is ON, False if siren is OFF
+        self._display = {} # Indices of the dangerous sectors (dict used as an ordered set)
 
     def turn_siren_on(self):
         self.siren = True
@@ -19,14 +19,21 @@ class SafetyAlarmSystem:
     def turn_siren_off(self):
         self.siren = False
 
+    @property
+    def display(self):
+        return list(self._display)
+
     def add_dangerous_zone(self, id: int):
-        self.display.append(id)
+        self._display[id] = None
 
     def remove_dangerous_zone(self, id: int):
-        self.display.remove(id)    
+        self._display.pop(id, None)
+
+    def set_dangerous_zones(self, ids):
+        self._display = dict.fromkeys(ids)
 
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps({"siren": self.siren, "display": self.display})
 
     def device_info(self, alarm_id):
         """Metadata for retained info topic (aligned with template)"""
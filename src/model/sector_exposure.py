@@ -0,0 +1,69 @@
+# Worker time spent in each sector (occupancy) and in each sector while it was dangerous
+# (danger exposure), accumulated incrementally from helmet messages.
+#
+# Every helmet message (telemetry or heartbeat) closes the interval since that helmet's
+# previous message and credits it to the sector the helmet was in, with the danger flag
+# it had then (positions are piecewise constant between reports). Intervals are capped
+# at max_gap, so a helmet that went silent does not keep accumulating. Charging helmets
+# and positions outside the grid are not credited.
+#
+# The totals are plain arrays indexed by sector index (see Site.sector_index): reading
+# the heatmap never replays history.
+
+import numpy as np
+
+NO_SECTOR = -1
+
+
+class SectorExposure:
+
+    def __init__(self, n_sectors, max_gap=60.0):
+        self.max_gap = float(max_gap)
+        self.occupancy = np.zeros(n_sectors, dtype=np.float64) # Worker-seconds per sector
+        self.danger = np.zeros(n_sectors, dtype=np.float64) # Worker-seconds while the sector was dangerous
+        self.last = {} # {helmet_id: (t, sector index or NO_SECTOR, dangerous)}
+        self.since = None # Time of the first credited interval
+        self.dirty = False # Changed since the last flush
+
+    def observe(self, helmet_id, t, sector, dangerous):
+        """Close the helmet's open interval at t and start a new one in sector"""
+        previous = self.last.get(helmet_id)
+        self.last[helmet_id] = (t, sector, bool(dangerous))
+        if previous is None:
+            return
+        t0, sector0, dangerous0 = previous
+        dt = min(t - t0, self.max_gap)
+        if dt <= 0 or sector0 == NO_SECTOR:
+            return
+        self.occupancy[sector0] += dt
+        if dangerous0:
+            self.danger[sector0] += dt
+        if self.since is None:
+            self.since = t0
+        self.dirty = True
+
+    def heartbeat(self, helmet_id, t, danger_mask):
+        """Helmet alive and unmoved: credit the interval, stay in the same sector"""
+        previous = self.last.get(helmet_id)
+        if previous is not None:
+            sector = previous[1]
+            self.observe(helmet_id, t, sector, sector != NO_SECTOR and danger_mask[sector])
+
+    def forget(self, helmet_id):
+        self.last.pop(helmet_id, None)
+
+    def minutes(self):
+        """(occupancy, danger exposure) in worker-minutes per sector index"""
+        return self.occupancy / 60.0, self.danger / 60.0
+
+    def state(self):
+        return {"occupancy": self.occupancy.copy(), "danger": self.danger.copy(), "since": self.since}
+
+    def restore(self, state):
+        if state is None or len(state["occupancy"]) != len(self.occupancy):
+            return False
+        self.occupancy[:] = state["occupancy"]
+        self.danger[:] = state["danger"]
+        self.since = state["since"]
+        self.dirty = True
+        return True
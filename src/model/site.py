@@ -5,137 +5,335 @@
 
 import math
 import json
+import hashlib
+import os
+from pathlib import Path
+import numpy as np
 from model.gps import AreaVertices, GPS
+from model.projection import LocalProjection
+
+# Bump when the grid algorithm or the cache layout changes (invalidates old caches)
+GRID_CACHE_VERSION = 2
+
+MIN_SECTOR_AREA = 1.0 # m², smaller clipped pieces are dropped as slivers
 
 class Site:
 
     def __init__(self, area_vertices: AreaVertices):
-        self.area_vertices = area_vertices # list with 4 floats (vertices of the site)
-        self.grid = [] # list of vertices, one list for every grid sector
+        self.area_vertices = area_vertices # list with 4 floats (vertices of the site)
+        self.grid = [] # list of vertices, one list for every grid sector
+        self.sector_index = {} # {sector_id: index}, index = position in self.grid
+        self.cell_sectors = {} # {(row, col): [Sector, ...]} (several only where the boundary splits a cell)
+        self._polygons = {} # {sector index: shapely Polygon in local meters}, built lazily
+        self.sector_rows = np.zeros(0, dtype=np.intp) # Grid row/col per sector index
+        self.sector_cols = np.zeros(0, dtype=np.intp)
+        self.sector_bboxes = np.zeros((0, 4)) # (min_east, min_north, max_east, max_north) per sector index
+        self._vertices_xy = np.zeros((0, 2)) # All sector vertices in local meters (see _offsets)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._is_rectangle = np.zeros(0, dtype=bool) # Sector is a whole, unclipped cell
+
+        # Local metric frame: all containment/distance math runs in (east, north) meters
+        self.projection = LocalProjection.for_points(area_vertices.vertices) if area_vertices.vertices else None
+
+        # Grid parameters (set by create_grid / load_grid), in local meters
+        self.sector_size_meters = None
+        self.grid_origin = None # (min_north, min_east)
+        self.grid_step = None # (step_north, step_east)
+        self.grid_shape = (0, 0) # (rows, cols)
 
     def create_grid(self, sector_size_meters=10.0):
         """
-        Divides the site area into a grid of sectors, clipping them to the site boundaries using Shapely.
+        Divides the site area into a grid of square sectors (in local meters),
+        clipping them to the site boundaries using Shapely.
         """
         from shapely.geometry import Polygon, box
         
-        # 1. Create Site Polygon
-        site_coords = [(p.latitude, p.longitude) for p in self.area_vertices.vertices]
-        if len(site_coords) < 3:
+        # 1. Create Site Polygon (local meters)
+        lats = [p.latitude for p in self.area_vertices.vertices]
+        lons = [p.longitude for p in self.area_vertices.vertices]
+        if len(lats) < 3:
             return # Invalid polygon
         
-        site_poly = Polygon(site_coords)
+        xs, ys = self.projection.forward(lats, lons)
+        site_poly = Polygon(zip(xs.tolist(), ys.tolist()))
         if not site_poly.is_valid:
             site_poly = site_poly.buffer(0) # Attempt to fix self-intersections
 
         # Get bounds
-        min_lat, min_lon, max_lat, max_lon = site_poly.bounds
+        min_x, min_y, max_x, max_y = site_poly.bounds
+        step = float(sector_size_meters)
 
-        # Earth radius approximation for meter conversion
-        R = 6378137
-        
-        # Calculate approximate dimensions in degrees
-        lat_diff_per_meter = (1 / ((2 * math.pi * R) / 360))
-        # Longitudinal degrees vary with latitude, use center lat for approx
-        center_lat = (min_lat + max_lat) / 2
-        lon_diff_per_meter = (1 / ((2 * math.pi * R * math.cos(math.radians(center_lat))) / 360))
-        
-        step_lat = sector_size_meters * lat_diff_per_meter
-        step_lon = sector_size_meters * lon_diff_per_meter
-
-        rows = int((max_lat - min_lat) / step_lat) + 1
-        cols = int((max_lon - min_lon) / step_lon) + 1
+        rows = int((max_y - min_y) / step) + 1 # Rows go north
+        cols = int((max_x - min_x) / step) + 1 # Columns go east
 
         self.grid = []
+        self.sector_size_meters = step
+        self.grid_origin = (min_y, min_x)
+        self.grid_step = (step, step)
+        self.grid_shape = (rows, cols)
 
         for r in range(rows):
             for c in range(cols):
                 # Create grid cell polygon
-                cell_min_lat = min_lat + r * step_lat
-                cell_max_lat = min_lat + (r+1) * step_lat
-                cell_min_lon = min_lon + c * step_lon
-                cell_max_lon = min_lon + (c+1) * step_lon
-                
-                # Shapely expects (x, y) -> (lat, lon) or (lon, lat). 
-                # Let's use (lat, lon) consistently for our geometric operations 
-                # BEWARE: Shapely usually treats cartesian, but for intersection logic it works if units are consistent.
-                cell_poly = box(cell_min_lat, cell_min_lon, cell_max_lat, cell_max_lon)
+                cell_poly = box(min_x + c * step, min_y + r * step, min_x + (c + 1) * step, min_y + (r + 1) * step)
                 
                 # Intersect
                 intersection = site_poly.intersection(cell_poly)
                 
-                if not intersection.is_empty and intersection.area > 1e-10: # Filter tiny slivers
+                if not intersection.is_empty and intersection.area > MIN_SECTOR_AREA: # Filter tiny slivers
                     # If MultiPolygon (rare but possible with weird shapes), take biggest or all
                     polys = [intersection] if intersection.geom_type == 'Polygon' else intersection.geoms
                     
                     for i, poly in enumerate(polys):
-                        # Extract coords
-                        # poly.exterior.coords returns list of (lat, lon)
-                        coords = list(poly.exterior.coords)
-                        # Create GPS points
-                        gps_vertices = [GPS(lat, lon) for lat, lon in coords]
+                        # Back to GPS coordinates for storage/display
+                        east, north = np.asarray(poly.exterior.coords).T
+                        lat, lon = self.projection.inverse(east, north)
+                        gps_vertices = [GPS(a, b) for a, b in zip(lat.tolist(), lon.tolist())]
                         
                         sector_vertices = AreaVertices(gps_vertices)
                         
                         # Create ID
-                        suffix = f"-{i}" if len(polys) > 1 else ""
-                        sector_id = f"Zone-{r}-{c}{suffix}"
-                        
-                        sector = Sector(sector_id, sector_vertices)
+                        part = i if len(polys) > 1 else None
+                        sector = Sector(Sector.make_id(r, c, part), sector_vertices, r, c, part)
                         self.grid.append(sector)
 
-    def get_sector_by_coords(self, lat, lon):
-        """Finds which sector contains the given coordinates"""
-        # Linear search for point-in-polygon
-        # Optimization: use R-tree if many sectors, but linear ok for < 1000
-        from shapely.geometry import Point, Polygon
-        
-        point = Point(lat, lon)
-        
-        for sector in self.grid:
-            # Reconstruct polygon (cache this if performance needed)
-            coords = [(p.latitude, p.longitude) for p in sector.area_vertices.vertices]
-            poly = Polygon(coords)
-            if poly.contains(point):
+        self._index_sectors()
+
+    def _index_sectors(self, offsets=None, vertices=None, bboxes=None):
+        """
+        Give every sector a dense integer index (its position in self.grid)
+        and project all sector vertices to local meters in one pass.
+        offsets/vertices (flat GPS array)/bboxes: arrays read from a grid cache,
+        used as they are instead of being collected from the Sector objects.
+        """
+        self.sector_index = {}
+        self.cell_sectors = {}
+        self._polygons = {}
+        for i, sector in enumerate(self.grid):
+            sector.index = i
+            self.sector_index[sector.id] = i
+            self.cell_sectors.setdefault((sector.row, sector.col), []).append(sector)
+        self.sector_rows = np.array([s.row for s in self.grid], dtype=np.intp)
+        self.sector_cols = np.array([s.col for s in self.grid], dtype=np.intp)
+
+        if offsets is None:
+            counts = [len(sector.area_vertices.vertices) for sector in self.grid]
+            self._offsets = np.zeros(len(self.grid) + 1, dtype=np.int64)
+            self._offsets[1:] = np.cumsum(counts)
+        else:
+            self._offsets = np.asarray(offsets, dtype=np.int64)
+            counts = np.diff(self._offsets)
+        if not self.grid:
+            self._vertices_xy = np.zeros((0, 2))
+            self.sector_bboxes = np.zeros((0, 4))
+            self._is_rectangle = np.zeros(0, dtype=bool)
+            return
+        if vertices is None:
+            lats = [p.latitude for sector in self.grid for p in sector.area_vertices.vertices]
+            lons = [p.longitude for sector in self.grid for p in sector.area_vertices.vertices]
+        else:
+            lats, lons = vertices[:, 0], vertices[:, 1]
+        self._vertices_xy = np.column_stack(self.projection.forward(lats, lons))
+        starts = self._offsets[:-1]
+        if bboxes is None:
+            bboxes = np.column_stack([
+                np.minimum.reduceat(self._vertices_xy, starts, axis=0),
+                np.maximum.reduceat(self._vertices_xy, starts, axis=0)
+            ])
+        self.sector_bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+
+        # Rectangle = 4 distinct vertices (+ closing one), all on bounding box corners
+        bb = np.repeat(self.sector_bboxes, counts, axis=0)
+        vx, vy = self._vertices_xy[:, 0], self._vertices_xy[:, 1]
+        at_corner = (np.isclose(vx, bb[:, 0]) | np.isclose(vx, bb[:, 2])) & (np.isclose(vy, bb[:, 1]) | np.isclose(vy, bb[:, 3]))
+        self._is_rectangle = np.logical_and.reduceat(at_corner, starts) & (np.asarray(counts) == 5)
+
+    def _polygon(self, index):
+        """Planar (meters) polygon of a sector, cached"""
+        poly = self._polygons.get(index)
+        if poly is None:
+            from shapely.geometry import Polygon
+            poly = Polygon(self._vertices_xy[self._offsets[index]:self._offsets[index + 1]])
+            self._polygons[index] = poly
+        return poly
+
+    def sector_names(self, indices):
+        """Sector indices -> sector IDs (for display only)"""
+        return [self.grid[i].id for i in indices]
+
+    def to_local(self, lat, lon):
+        """GPS -> (east, north) meters in the site frame (scalars or arrays)"""
+        return self.projection.forward(lat, lon)
+
+    def cell_at(self, east, north):
+        """Grid (row, col) containing a local point, or None outside the grid. O(1)."""
+        if self.grid_origin is None:
+            return None
+        row = math.floor((north - self.grid_origin[0]) / self.grid_step[0])
+        col = math.floor((east - self.grid_origin[1]) / self.grid_step[1])
+        if 0 <= row < self.grid_shape[0] and 0 <= col < self.grid_shape[1]:
+            return row, col
+        return None
+
+    def cell_of(self, lat, lon):
+        """Grid (row, col) containing the coordinates, or None outside the grid. O(1)."""
+        if self.projection is None:
+            return None
+        return self.cell_at(*self.to_local(lat, lon))
+
+    def grid_cache_key(self, sector_size_meters):
+        """Hash of the site geometry (site.csv vertices) and the sector size"""
+        digest = hashlib.sha256(f"v{GRID_CACHE_VERSION}|{float(sector_size_meters)!r}|".encode())
+        for p in self.area_vertices.vertices:
+            digest.update(f"{p.latitude!r},{p.longitude!r};".encode())
+        return digest.hexdigest()[:16]
+
+    def load_or_create_grid(self, sector_size_meters=10.0, cache_dir=None):
+        """
+        Load the grid from cache_dir/grid-<key>.npz if present, otherwise run
+        create_grid and save the result there. Returns True on a cache hit.
+        """
+        if cache_dir is None:
+            self.create_grid(sector_size_meters)
+            return False
+
+        cache_path = Path(cache_dir) / f"grid-{self.grid_cache_key(sector_size_meters)}.npz"
+        if cache_path.exists():
+            try:
+                self.load_grid(cache_path)
+                return True
+            except Exception as e:
+                print(f"⚠️  Invalid grid cache {cache_path.name}: {e}. Rebuilding.")
+
+        self.create_grid(sector_size_meters)
+        try:
+            self.save_grid(cache_path)
+        except Exception as e:
+            print(f"⚠️  Failed to save grid cache {cache_path}: {e}")
+        return False
+
+    def save_grid(self, filepath):
+        """
+        Saves the grid as a compact binary artifact (uncompressed .npz, atomic write).
+        Arrays: row/col/part per sector, flat GPS vertex array with offsets,
+        per-sector bounding boxes in local meters (min_east, min_north, max_east, max_north),
+        projection origin and grid parameters.
+        """
+        filepath = Path(filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        vertices = np.array(
+            [(p.latitude, p.longitude) for sector in self.grid for p in sector.area_vertices.vertices],
+            dtype=np.float64
+        ).reshape(-1, 2)
+
+        tmp_path = filepath.with_name(filepath.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=np.int32(GRID_CACHE_VERSION),
+                params=np.array(
+                    [*self.projection.params(), *self.grid_origin, *self.grid_step, self.sector_size_meters],
+                    dtype=np.float64
+                ),
+                shape=np.array(self.grid_shape, dtype=np.int32),
+                rows=np.array([s.row for s in self.grid], dtype=np.int32),
+                cols=np.array([s.col for s in self.grid], dtype=np.int32),
+                parts=np.array([-1 if s.part is None else s.part for s in self.grid], dtype=np.int32),
+                offsets=self._offsets,
+                vertices=vertices,
+                bboxes=self.sector_bboxes
+            )
+        os.replace(tmp_path, filepath)
+
+    def load_grid(self, filepath):
+        """
+        Rebuilds self.grid from an artifact written by save_grid. The stored offsets,
+        vertices and bounding boxes are indexed as arrays; each Sector only keeps a view
+        of its GPS vertices and builds the GPS objects when they are first read.
+        """
+        with np.load(filepath, allow_pickle=False) as data:
+            if int(data["version"]) != GRID_CACHE_VERSION:
+                raise ValueError("grid cache version mismatch")
+            params = data["params"]
+            shape = data["shape"]
+            rows, cols, parts = data["rows"].tolist(), data["cols"].tolist(), data["parts"].tolist()
+            offsets = data["offsets"]
+            vertices = data["vertices"]
+            bboxes = data["bboxes"]
+        if len(offsets) != len(rows) + 1 or len(bboxes) != len(rows) or offsets[-1] != len(vertices):
+            raise ValueError("grid cache arrays do not match")
+
+        grid = []
+        bounds = offsets.tolist()
+        for i, (r, c, part) in enumerate(zip(rows, cols, parts)):
+            part = None if part < 0 else part
+            sector = Sector(Sector.make_id(r, c, part), None, r, c, part)
+            sector.gps_array = vertices[bounds[i]:bounds[i + 1]]
+            grid.append(sector)
+
+        self.projection = LocalProjection(float(params[0]), float(params[1]))
+        self.grid = grid
+        self._index_sectors(offsets, vertices, bboxes)
+        self.grid_origin = (float(params[2]), float(params[3]))
+        self.grid_step = (float(params[4]), float(params[5]))
+        self.sector_size_meters = float(params[6])
+        self.grid_shape = (int(shape[0]), int(shape[1]))
+
+    def get_sector_at(self, east, north):
+        """Finds which sector contains a local point (meters)"""
+        # The grid cell is computed directly; only the sector(s) clipped from that cell are tested
+        from shapely.geometry import Point
+
+        cell = self.cell_at(east, north)
+        if cell is None:
+            return None
+
+        point = Point(east, north)
+        for sector in self.cell_sectors.get(cell, ()):
+            if self._polygon(sector.index).contains(point):
                 return sector
         return None
 
+    def sector_index_at(self, east, north):
+        """Index of the sector containing a local point, or -1. Whole cells need no polygon test."""
+        cell = self.cell_at(east, north)
+        if cell is None:
+            return -1
+        sectors = self.cell_sectors.get(cell, ())
+        if len(sectors) == 1 and self._is_rectangle[sectors[0].index]:
+            return sectors[0].index
+        sector = self.get_sector_at(east, north)
+        return sector.index if sector else -1
+
+    def get_sector_by_coords(self, lat, lon):
+        """Finds which sector contains the given coordinates"""
+        if self.projection is None:
+            return None
+        return self.get_sector_at(*self.to_local(lat, lon))
+
     def get_sectors_in_radius(self, center_lat, center_lon, radius_meters):
         """
-        Returns a list of Sectors that fall within the radius.
-        Uses elliptical buffer to account for lat/lon scaling differences.
+        Returns a list of Sectors that fall within the radius
+        (true circle in local meters: sectors closer than radius_meters to the center).
         """
-        from shapely.geometry import Point, Polygon
-        from shapely import affinity
-        
-        # Correct conversion from meters to degrees
-        # 1 degree latitude ≈ 111,000 meters
-        # 1 degree longitude ≈ 111,000 * cos(latitude) meters
-        lat_deg_per_meter = 1.0 / 111000.0
-        lon_deg_per_meter = 1.0 / (111000.0 * math.cos(math.radians(center_lat)))
-        
-        # Create elliptical buffer by scaling
-        center_point = Point(center_lat, center_lon)
-        
-        # Scale radius differently for lat and lon to create proper circle
-        lat_radius = radius_meters * lat_deg_per_meter
-        lon_radius = radius_meters * lon_deg_per_meter
-        
-        # Create ellipse by buffering with average then scaling
-        avg_radius = (lat_radius + lon_radius) / 2
-        circle = center_point.buffer(avg_radius)
-        
-        # Scale to create ellipse that represents true circular distance
-        scale_x = lat_radius / avg_radius
-        scale_y = lon_radius / avg_radius
-        search_area = affinity.scale(circle, xfact=scale_x, yfact=scale_y)
-        
+        if self.projection is None or not self.grid:
+            return []
+        from shapely.geometry import Point
+
+        x, y = self.to_local(center_lat, center_lon)
+
+        # Distance from the center to each sector's bounding box (vectorized lower bound)
+        dx = np.maximum(np.maximum(self.sector_bboxes[:, 0] - x, x - self.sector_bboxes[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(self.sector_bboxes[:, 1] - y, y - self.sector_bboxes[:, 3]), 0.0)
+        candidates = np.flatnonzero(dx * dx + dy * dy <= radius_meters * radius_meters)
+
+        # The bound is exact for rectangles; clipped sectors get an exact polygon distance
+        center = Point(x, y)
         affected_sectors = []
-        for sector in self.grid:
-            coords = [(p.latitude, p.longitude) for p in sector.area_vertices.vertices]
-            poly = Polygon(coords)
-            if search_area.intersects(poly):
-                affected_sectors.append(sector)
+        for i in candidates.tolist():
+            if self._is_rectangle[i] or self._polygon(i).distance(center) <= radius_meters:
+                affected_sectors.append(self.grid[i])
                 
         return affected_sectors
 
@@ -162,10 +360,34 @@ class Site:
     
 class Sector:
 
-    def __init__(self, id: str, area_vertices: AreaVertices):
+    def __init__(self, id: str, area_vertices: AreaVertices, row: int = None, col: int = None, part: int = None):
         self.id = id
-        self.area_vertices = area_vertices
+        self._area_vertices = area_vertices
+        self.gps_array = None # (n, 2) lat/lon view into a loaded grid cache, until area_vertices is read
+        self.row = row # Grid row/col of the cell this sector was clipped from
+        self.col = col
+        self.part = part # Index of the piece when a cell is split by the site boundary, else None
+        self.index = None # Dense integer index in Site.grid (set by the Site)
         # Status removed, managed by Manager
 
+    @property
+    def area_vertices(self):
+        if self._area_vertices is None and self.gps_array is not None:
+            self._area_vertices = AreaVertices([GPS(lat, lon) for lat, lon in self.gps_array.tolist()])
+            self.gps_array = None
+        return self._area_vertices
+
+    @area_vertices.setter
+    def area_vertices(self, area_vertices):
+        self._area_vertices = area_vertices
+        self.gps_array = None
+
+    @staticmethod
+    def make_id(row, col, part=None):
+        suffix = f"-{part}" if part is not None else ""
+        return f"Zone-{row}-{col}{suffix}"
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
\ No newline at end of file
+        data = {"id": self.id, "area_vertices": self.area_vertices, "row": self.row, "col": self.col,
+                "part": self.part, "index": self.index}
+        return json.dumps(data, default=lambda o: o.__dict__)
\ No newline at end of file
@@ -0,0 +1,153 @@
+# Registry of the construction sites hosted by one manager process.
+#
+# sites.csv (one row per site):
+#   site_id,alarm_id,vertices_json
+#   north-yard,alarm_101,"[[45.1602, 10.7869], [45.1610, 10.7878], ...]"
+#
+# device_sites.csv (optional, static device -> site assignment):
+#   device_type,device_id,site_id
+#   helmet,001,north-yard
+#
+# Without sites.csv the registry holds a single "default" site built from site.csv,
+# with alarm "alarm_001" and the historical data/static + data/dynamic files.
+
+import csv
+import json
+import os
+import threading
+from pathlib import Path
+from model.gps import GPS
+
+DEFAULT_SITE_ID = "default"
+DEFAULT_ALARM_ID = "alarm_001"
+
+
+def site_topic(manager_topic, site_id):
+    """
+    Prefix of a site's aggregated manager topics (state, sectors, danger_map):
+    {manager_topic}/site for the default site, {manager_topic}/site/{site_id} otherwise
+    """
+    if site_id == DEFAULT_SITE_ID:
+        return f"{manager_topic}/site"
+    return f"{manager_topic}/site/{site_id}"
+
+
+class SiteConfig:
+    """Static description of a site: everything needed to (re)load it on demand"""
+
+    def __init__(self, site_id: str, vertices: list, alarm_id: str, static_dir: Path, dynamic_dir: Path):
+        self.site_id = site_id
+        self.vertices = vertices # list of (lat, lon) tuples
+        self.alarm_id = alarm_id
+        self.static_dir = Path(static_dir) # Seed files (helmets.csv, stations.csv)
+        self.dynamic_dir = Path(dynamic_dir) # Live files written by the manager
+        self.persist = True # False: keep state in memory only (e.g. accelerated simulations)
+
+    def gps_vertices(self):
+        return [GPS(lat, lon) for lat, lon in self.vertices]
+
+
+class SiteRegistry:
+
+    def __init__(self, data_dir: Path, sites_csv: Path = None, assignments_csv: Path = None):
+        self.data_dir = Path(data_dir)
+        self.sites = {} # {site_id: SiteConfig}
+        self.assignments = {} # {(device_type, device_id): site_id}
+        self.alarm_sites = {} # {alarm_id: site_id}
+        self.default_site_id = None
+        self._lock = threading.Lock()
+
+        sites_csv = Path(sites_csv) if sites_csv else self.data_dir / "static" / "sites.csv"
+        if sites_csv.exists():
+            self._load_sites(sites_csv)
+        if not self.sites:
+            self._load_default_site()
+
+        assignments_csv = Path(assignments_csv) if assignments_csv else self.data_dir / "static" / "device_sites.csv"
+        if assignments_csv.exists():
+            self._load_assignments(assignments_csv)
+
+    def _load_sites(self, filepath):
+        with open(filepath, newline="") as f:
+            for row in csv.DictReader(f):
+                site_id = (row.get("site_id") or "").strip()
+                if not site_id:
+                    continue
+                try:
+                    vertices = [(float(lat), float(lon)) for lat, lon in json.loads(row["vertices_json"])]
+                except Exception as e:
+                    print(f"⚠️  Skipping site {site_id}: invalid vertices ({e})")
+                    continue
+                alarm_id = (row.get("alarm_id") or "").strip() or f"alarm_{site_id}"
+                self.add_site(SiteConfig(
+                    site_id, vertices, alarm_id,
+                    self.data_dir / "static" / "sites" / site_id,
+                    self.data_dir / "dynamic" / "sites" / site_id
+                ))
+        print(f"✅ Loaded {len(self.sites)} sites from {filepath}")
+
+    def _load_default_site(self):
+        """Single-site setup: site.csv (4 vertices) or the hardcoded fallback rectangle"""
+        site_csv_path = self.data_dir / "static" / "site.csv"
+        vertices = []
+        try:
+            with open(site_csv_path, newline="") as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    vertices.append((float(row["latitude"]), float(row["longitude"])))
+
+            if len(vertices) != 4:
+                print("⚠️  Warning: site.csv does not have exactly 4 vertices. Using default hardcoded area.")
+                raise ValueError("Valid site.csv not found")
+
+            print(f"✅ Loaded {len(vertices)} site vertices from {site_csv_path}")
+
+        except Exception as e:
+            print(f"⚠️  Failed to load site.csv: {e}. Using default values.")
+            # Fallback to hardcoded (100x100m approximate area)
+            fallback_lat = float(os.getenv("SITE_ORIGIN_LAT", 45.156))
+            fallback_lon = float(os.getenv("SITE_ORIGIN_LON", 10.791))
+            vertices = [
+                (fallback_lat, fallback_lon),
+                (fallback_lat, fallback_lon + 0.0012),
+                (fallback_lat + 0.0009, fallback_lon + 0.0012),
+                (fallback_lat + 0.0009, fallback_lon)
+            ]
+
+        self.add_site(SiteConfig(
+            DEFAULT_SITE_ID, vertices, DEFAULT_ALARM_ID,
+            self.data_dir / "static", self.data_dir / "dynamic"
+        ))
+
+    def _load_assignments(self, filepath):
+        with open(filepath, newline="") as f:
+            for row in csv.DictReader(f):
+                device_type, device_id, site_id = row.get("device_type"), row.get("device_id"), row.get("site_id")
+                if device_type and device_id and site_id in self.sites:
+                    self.assignments[(device_type, device_id)] = site_id
+
+    def add_site(self, config: SiteConfig):
+        with self._lock:
+            self.sites[config.site_id] = config
+            self.alarm_sites[config.alarm_id] = config.site_id
+            if self.default_site_id is None:
+                self.default_site_id = config.site_id
+
+    def get(self, site_id):
+        return self.sites.get(site_id)
+
+    def assign(self, device_type, device_id, site_id):
+        """Runtime assignment (e.g. a site_id announced in the device info). Returns False for unknown sites."""
+        if site_id not in self.sites:
+            return False
+        with self._lock:
+            self.assignments[(device_type, device_id)] = site_id
+        return True
+
+    def site_for(self, device_type, device_id):
+        """Site of a device: static/runtime assignment, else the default site"""
+        return self.assignments.get((device_type, device_id), self.default_site_id)
+
+    def site_for_alarm(self, alarm_id):
+        """Site owning an alarm id (from sites.csv), else the default site"""
+        return self.alarm_sites.get(alarm_id, self.default_site_id)
@@ -0,0 +1,175 @@
+# Aggregated site state published by the manager for lightweight consumers
+# (dashboard, alarm, external tools) so they do not need the raw telemetry firehose.
+#
+# Payload (JSON, compact):
+# {
+#   "seq": 42,                 # +1 on every publish
+#   "type": "full" | "delta",  # full snapshots are retained, deltas are not
+#   "t": 1736698123.45,
+#   "fleet": {"helmets": 4, "charging": 1, "stations": 4, "dangerous_stations": 1,
+#             "workers_in_danger": 0, "dangerous_sectors": 8},
+#   "helmets": {"001": {"lat": 45.16, "lon": 10.78, "battery": 80, "led": 0}, ...},
+#   "stations": {"001": {"lat": ..., "lon": ..., "dust": ..., "noise": ..., "gas": ..., "danger": true}, ...},
+#   "zones": [3, 4, 17],       # dangerous sector indices (names: manager/site/sectors); deltas only when changed
+#   "siren": false             # present in deltas only when changed
+# }
+
+import json
+import threading
+from utils.sim_clock import clock
+
+
+class SiteStatePublisher:
+    """
+    Keeps the latest value of every device plus zones/siren and turns them into
+    rate-limited delta messages (changed entries only) and periodic full snapshots.
+    Updates are cheap dict writes; serialization happens only in flush().
+    """
+
+    def __init__(self, publish, min_interval=1.0, full_interval=10.0):
+        self.publish = publish # publish(payload_json, retain)
+        self.min_interval = min_interval
+        self.full_interval = full_interval
+
+        self.seq = 0
+        self.helmets = {}
+        self.stations = {}
+        self.zones = []
+        self.siren = False
+        self.workers_in_danger = 0
+
+        self._dirty_helmets = set()
+        self._dirty_stations = set()
+        self._dirty_zones = False
+        self._dirty_siren = False
+        self._last_flush = 0.0
+        self._last_full = None
+        self._lock = threading.Lock()
+
+    # --- Updates (called from the MQTT thread) ---
+
+    def update_helmet(self, helmet_id, lat, lon, battery, led):
+        entry = {"lat": _round(lat), "lon": _round(lon), "battery": battery, "led": led}
+        with self._lock:
+            if self.helmets.get(helmet_id) != entry:
+                self.helmets[helmet_id] = entry
+                self._dirty_helmets.add(helmet_id)
+
+    def update_station(self, station_id, lat, lon, dust, noise, gas, is_dangerous):
+        entry = {
+            "lat": _round(lat), "lon": _round(lon),
+            "dust": round(dust, 2), "noise": round(noise, 2), "gas": round(gas, 3),
+            "danger": bool(is_dangerous)
+        }
+        with self._lock:
+            if self.stations.get(station_id) != entry:
+                self.stations[station_id] = entry
+                self._dirty_stations.add(station_id)
+
+    def set_zones(self, zones):
+        with self._lock:
+            zones = list(zones)
+            if zones != self.zones:
+                self.zones = zones
+                self._dirty_zones = True
+
+    def set_siren(self, active, workers_in_danger):
+        with self._lock:
+            self.workers_in_danger = workers_in_danger
+            if bool(active) != self.siren:
+                self.siren = bool(active)
+                self._dirty_siren = True
+
+    # --- Publishing (called periodically) ---
+
+    def flush(self, now=None, force_full=False):
+        """Publish a full snapshot or a delta if due. Returns the message type sent, or None."""
+        now = clock.time() if now is None else now
+        with self._lock:
+            full_due = force_full or self._last_full is None or now - self._last_full >= self.full_interval
+            dirty = self._dirty_helmets or self._dirty_stations or self._dirty_zones or self._dirty_siren
+            if not full_due and (not dirty or now - self._last_flush < self.min_interval):
+                return None
+
+            self.seq += 1
+            message = {"seq": self.seq, "type": "full" if full_due else "delta", "t": round(now, 3)}
+            message["fleet"] = self._fleet_summary()
+            if full_due:
+                message["helmets"] = dict(self.helmets)
+                message["stations"] = dict(self.stations)
+                message["zones"] = list(self.zones)
+                message["siren"] = self.siren
+                self._last_full = now
+            else:
+                if self._dirty_helmets:
+                    message["helmets"] = {h: self.helmets[h] for h in self._dirty_helmets}
+                if self._dirty_stations:
+                    message["stations"] = {s: self.stations[s] for s in self._dirty_stations}
+                if self._dirty_zones:
+                    message["zones"] = list(self.zones)
+                if self._dirty_siren:
+                    message["siren"] = self.siren
+
+            self._dirty_helmets = set()
+            self._dirty_stations = set()
+            self._dirty_zones = False
+            self._dirty_siren = False
+            self._last_flush = now
+            payload = json.dumps(message, separators=(",", ":"))
+
+        self.publish(payload, full_due)
+        return message["type"]
+
+    def _fleet_summary(self):
+        return {
+            "helmets": len(self.helmets),
+            "charging": sum(1 for h in self.helmets.values() if h.get("led") == 1),
+            "stations": len(self.stations),
+            "dangerous_stations": sum(1 for s in self.stations.values() if s.get("danger")),
+            "workers_in_danger": self.workers_in_danger,
+            "dangerous_sectors": len(self.zones)
+        }
+
+
+class SiteStateView:
+    """
+    Consumer side: applies full snapshots and deltas in sequence order.
+    After a sequence gap, deltas are ignored until the next full snapshot.
+    """
+
+    def __init__(self):
+        self.seq = None
+        self.synced = False
+        self.fleet = {}
+        self.helmets = {}
+        self.stations = {}
+        self.zones = []
+        self.siren = False
+
+    def apply(self, message):
+        """Apply a decoded site-state message. Returns True if the view changed."""
+        seq = message.get("seq")
+        if message.get("type") == "full":
+            self.helmets = dict(message.get("helmets", {}))
+            self.stations = dict(message.get("stations", {}))
+            self.zones = list(message.get("zones", []))
+            self.siren = bool(message.get("siren", False))
+        else:
+            if not self.synced or seq != self.seq + 1:
+                self.synced = False # Gap: wait for the next full snapshot
+                return False
+            self.helmets.update(message.get("helmets", {}))
+            self.stations.update(message.get("stations", {}))
+            if "zones" in message:
+                self.zones = list(message["zones"])
+            if "siren" in message:
+                self.siren = bool(message["siren"])
+
+        self.fleet = message.get("fleet", self.fleet)
+        self.seq = seq
+        self.synced = True
+        return True
+
+
+def _round(value, digits=6):
+    return round(value, digits) if isinstance(value, float) else value
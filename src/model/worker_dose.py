@@ -0,0 +1,147 @@
+# Per-worker noise dose and dust exposure over a shift, integrated from station readings.
+#
+# Every integrate() call (manager tick, every DOSE_INTERVAL) estimates the noise level and
+# dust concentration at every active helmet at once: helmets are joined to the stations
+# within `radius` through the StationField spatial index and the readings are IDW-averaged
+# (see model/idw.py). The elapsed time is then credited to each helmet (sample and hold):
+#
+#   noise dose  += dt / T(L),  T(L) = shift_hours / 2 ** ((L - criterion) / exchange_rate)
+#                 (ISO 9612 / NIOSH style: 1.0 = 100 % of the daily allowance)
+#   dust        += C * dt      (concentration x hours; / shift_hours = 8-h TWA)
+#
+# Helmets with no reporting station in range accumulate nothing. A helmet is flagged once
+# per shift when its noise dose reaches 1.0 or its dust TWA reaches dust_limit.
+
+import numpy as np
+from model.idw import StationField, idw_weights
+
+NOISE = "noise"
+DUST = "dust"
+
+
+class WorkerDose:
+
+    def __init__(self, radius=50.0, power=2.0, min_distance=1.0, noise_criterion=85.0, exchange_rate=3.0,
+                 dust_limit=50.0, shift_hours=8.0, max_step=60.0):
+        self.radius = radius
+        self.power = power
+        self.min_distance = min_distance
+        self.noise_criterion = noise_criterion
+        self.exchange_rate = exchange_rate
+        self.dust_limit = dust_limit
+        self.shift_hours = shift_hours
+        self.max_step = max_step # Longest interval credited at once (manager stalled or restarted)
+
+        self.stations = StationField(quantities=(DUST, NOISE))
+        self.slots = {} # {helmet_id: row}
+        self.ids = [] # Helmet id per row
+        self.noise_dose = np.zeros(0) # Fraction of the daily noise allowance
+        self.dust_hours = np.zeros(0) # Concentration x hours
+        self.noise_level = np.full(0, np.nan) # Last estimated level at the helmet (dB)
+        self.dust_level = np.full(0, np.nan)
+        self.flagged = {NOISE: np.zeros(0, dtype=bool), DUST: np.zeros(0, dtype=bool)}
+        self.last_t = None
+        self.shift = None # Shift key the totals belong to
+
+    def update_station(self, station_id, east, north, dust, noise):
+        self.stations.update(station_id, east, north, {DUST: dust, NOISE: noise})
+
+    def _rows(self, helmet_ids):
+        """Row index per helmet, growing the arrays for new helmets"""
+        new = [h for h in helmet_ids if h not in self.slots]
+        if new:
+            for h in new:
+                self.slots[h] = len(self.ids)
+                self.ids.append(h)
+            grow = len(new)
+            self.noise_dose = np.concatenate([self.noise_dose, np.zeros(grow)])
+            self.dust_hours = np.concatenate([self.dust_hours, np.zeros(grow)])
+            self.noise_level = np.concatenate([self.noise_level, np.full(grow, np.nan)])
+            self.dust_level = np.concatenate([self.dust_level, np.full(grow, np.nan)])
+            for q in self.flagged:
+                self.flagged[q] = np.concatenate([self.flagged[q], np.zeros(grow, dtype=bool)])
+        return np.fromiter((self.slots[h] for h in helmet_ids), dtype=np.intp, count=len(helmet_ids))
+
+    def reset(self, shift=None):
+        """Start a new shift: all totals and flags back to zero"""
+        self.noise_dose[:] = 0.0
+        self.dust_hours[:] = 0.0
+        for q in self.flagged:
+            self.flagged[q][:] = False
+        self.shift = shift
+
+    def integrate(self, t, helmet_ids, east, north):
+        """
+        Credit the time since the previous call to the helmets given (the active ones,
+        at their current local positions). Returns [(helmet_id, quantity, value)] for
+        helmets that just crossed a limit.
+        """
+        dt = 0.0 if self.last_t is None else min(max(t - self.last_t, 0.0), self.max_step)
+        self.last_t = t
+        rows = self._rows(helmet_ids)
+        self.noise_level[:] = np.nan
+        self.dust_level[:] = np.nan
+        if not len(rows):
+            return []
+
+        point_idx, slot_idx, distance = self.stations.query(east, north, self.radius)
+        weights = idw_weights(distance, self.power, self.min_distance)
+        noise = self.stations.interpolate(point_idx, slot_idx, weights, NOISE, len(rows))
+        dust = self.stations.interpolate(point_idx, slot_idx, weights, DUST, len(rows))
+        self.noise_level[rows] = noise
+        self.dust_level[rows] = dust
+        if dt <= 0:
+            return []
+
+        hours = dt / 3600.0
+        covered = ~np.isnan(noise)
+        allowed_hours = self.shift_hours / np.power(2.0, (noise[covered] - self.noise_criterion) / self.exchange_rate)
+        self.noise_dose[rows[covered]] += hours / allowed_hours
+        covered = ~np.isnan(dust)
+        self.dust_hours[rows[covered]] += dust[covered] * hours
+
+        crossed = []
+        for quantity, value, limit in (
+                (NOISE, self.noise_dose, 1.0), (DUST, self.dust_twa(), self.dust_limit)):
+            new = np.flatnonzero((value >= limit) & ~self.flagged[quantity])
+            self.flagged[quantity][new] = True
+            crossed.extend((self.ids[i], quantity, float(value[i])) for i in new.tolist())
+        return crossed
+
+    def dust_twa(self):
+        """8-hour (shift_hours) time-weighted average dust concentration per helmet"""
+        return self.dust_hours / self.shift_hours
+
+    def doses(self):
+        """{helmet_id: {...}} for storage and the web UI"""
+        twa = self.dust_twa()
+        return {
+            helmet_id: {
+                "noise_dose": round(float(self.noise_dose[i]), 4),
+                "dust_twa": round(float(twa[i]), 3),
+                "noise_level": None if np.isnan(self.noise_level[i]) else round(float(self.noise_level[i]), 1),
+                "dust_level": None if np.isnan(self.dust_level[i]) else round(float(self.dust_level[i]), 2),
+                "over_limit": bool(self.flagged[NOISE][i] or self.flagged[DUST][i])
+            }
+            for i, helmet_id in enumerate(self.ids)
+        }
+
+    def state(self):
+        return {
+            "ids": list(self.ids),
+            "noise_dose": self.noise_dose.copy(),
+            "dust_hours": self.dust_hours.copy(),
+            "flagged": {q: f.copy() for q, f in self.flagged.items()},
+            "shift": self.shift
+        }
+
+    def restore(self, state):
+        if not state:
+            return False
+        rows = self._rows(state["ids"])
+        self.noise_dose[rows] = state["noise_dose"]
+        self.dust_hours[rows] = state["dust_hours"]
+        for q, flags in state["flagged"].items():
+            self.flagged[q][rows] = flags
+        self.shift = state["shift"]
+        return True
@@ -3,9 +3,12 @@
 # - Battery level sensor
 # - Multicolor LED
 
+import base64
 import json
+import math
 import random
 from model.gps import GPS
+from utils.sim_clock import clock
 
 class WorkerSmartHelmet:
 
@@ -15,13 +18,71 @@ class WorkerSmartHelmet:
         self.battery = 100
         self.led = 0  # 0: Green (Work/Moving), 1: Yellow (Charging/Stationary), 2: Red (Danger)
         self.boundaries = boundaries # expectation: {"min_lat": ..., "max_lat": ..., "min_lon": ..., "max_lon": ...}
+        self.report_interval = None # Seconds between telemetry messages (set by the device process / manager)
+        self.danger_map = None # Latest danger map from the manager (see set_danger_map)
+        self.in_danger = False # Last local geofencing result
+        self.danger_cell = None # (row, col) of the last local geofencing check
         # forse è meglio cambiare la logica del led, conviene fare:
         # 0, green, tutto ok
         # 1, giallo, batteria sotto il 10% 
         # 2, rosso, è entrato in una zona pericolosa
     
+    def set_danger_map(self, payload: dict):
+        """
+        Store the manager's danger map: local frame (projection origin and meters per degree),
+        grid origin/step/shape in meters, and one bit per grid cell (row-major, MSB first).
+        Returns True when the manager may not know this helmet's danger state: first map,
+        a gap in seq (manager restarted, or maps missed while disconnected) or another grid.
+        """
+        previous = self.danger_map
+        resync = (previous is None or payload.get("grid") != previous["grid"]
+                  or previous["seq"] is None or payload.get("seq") != previous["seq"] + 1)
+        self.danger_map = {
+            "seq": payload.get("seq"),
+            "grid": payload.get("grid"), # Echoed in danger events: the manager checks it is its own grid
+            "origin": tuple(payload["origin"]),
+            "m_per_deg": tuple(payload["m_per_deg"]),
+            "grid_origin": tuple(payload["grid_origin"]),
+            "step": tuple(payload["step"]),
+            "shape": tuple(payload["shape"]),
+            "bits": base64.b64decode(payload["bits"])
+        }
+        return resync
+
     def check_if_dangerous(self):
-        ...
+        """
+        Local geofencing, O(1): project the position, find the grid cell, read its bit.
+        Returns None without a danger map.
+        """
+        danger_map = self.danger_map
+        if danger_map is None:
+            return None
+
+        origin_lat, origin_lon = danger_map["origin"]
+        m_lat, m_lon = danger_map["m_per_deg"]
+        north = (self.position.latitude - origin_lat) * m_lat
+        east = (self.position.longitude - origin_lon) * m_lon
+        row = math.floor((north - danger_map["grid_origin"][0]) / danger_map["step"][0])
+        col = math.floor((east - danger_map["grid_origin"][1]) / danger_map["step"][1])
+        rows, cols = danger_map["shape"]
+        if not (0 <= row < rows and 0 <= col < cols):
+            self.danger_cell = None
+            return False
+
+        self.danger_cell = (row, col)
+        index = row * cols + col
+        return bool(danger_map["bits"][index >> 3] & (0x80 >> (index & 7)))
+
+    def update_danger_state(self, resync=False):
+        """
+        Re-run local geofencing: 'danger_enter', 'danger_exit' or None if unchanged.
+        resync: report the current state even if unchanged
+        """
+        dangerous = self.check_if_dangerous()
+        if dangerous is None or (dangerous == self.in_danger and not resync):
+            return None
+        self.in_danger = dangerous
+        return "danger_enter" if dangerous else "danger_exit"
 
     def descrease_battery_level(self, qty: int):
         self.battery -= qty
@@ -31,6 +92,10 @@ class WorkerSmartHelmet:
     def set_led(self, state: int): # i dont need it here, it will be implemented in the data collector and manager 
         self.led = state
     
+    def set_report_interval(self, seconds: float, min_seconds: float = 0.5, max_seconds: float = 60.0):
+        self.report_interval = max(min_seconds, min(max_seconds, float(seconds)))
+        return self.report_interval
+
     def recharge_battery(self, qty: int):
         self.battery += qty
         if self.battery >= 100:
@@ -98,20 +163,24 @@ class WorkerSmartHelmet:
 
         return json.dumps(data)
 
-    def device_info(self):
+    def device_info(self, reporting: dict = None, site_id: str = None):
         """Metadata for retained info topic (aligned with template)"""
-        return json.dumps({
+        info = {
             "id": self.id,
             "user_id": "worker-unimore-333695",
             "software_version": "2.0.0",
             "type": "helmet",
-            "capabilities": ["gps", "battery", "led"]
-        })
+            "capabilities": ["gps", "battery", "led", "edge_geofence"]
+        }
+        if reporting:
+            info["reporting"] = reporting # Telemetry deadbands and heartbeat period
+        if site_id:
+            info["site_id"] = site_id # The manager routes this helmet's messages to that site
+        return json.dumps(info)
 
     def to_senml(self):
         """Convert telemetry to SenML+JSON format with hierarchical names"""
-        import time
-        timestamp = time.time()
+        timestamp = clock.time()
         return json.dumps([
             {"n": "helmet.gps.lat", "u": "lat", "v": self.position.latitude, "t": timestamp},
             {"n": "helmet.gps.lon", "u": "lon", "v": self.position.longitude, "t": timestamp},
@@ -4,6 +4,7 @@
 
 import paho.mqtt.client as mqtt
 import os
+import time
 from dotenv import load_dotenv
 import sys
 from pathlib import Path
@@ -13,6 +14,8 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
 from model.safety_alarm_system import SafetyAlarmSystem
+from model.site_registry import SiteRegistry, DEFAULT_ALARM_ID, site_topic
+from utils.sim_clock import clock
 
 load_dotenv()
 
@@ -24,6 +27,7 @@ MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
 MQTT_BASIC_TOPIC = os.getenv("MQTT_BASIC_TOPIC") + MQTT_USERNAME
 TOPIC_ALARM = os.getenv("TOPIC_ALARM")
 TOPIC_MANAGER = os.getenv("TOPIC_MANAGER")
+RESYNC_TIMEOUT = float(os.getenv("RESYNC_TIMEOUT", 5)) # Seconds before an unanswered resync request is sent again
 
 # subscribe to topics 
 def on_connect(client, userdata, flags, rc):
@@ -36,16 +40,48 @@ def on_connect(client, userdata, flags, rc):
         client.publish(info_topic, info_payload, qos=2, retain=True)
         print(f"✅ Alarm {alarm_id} published info to: {info_topic}")
 
-        # Subscribe to manager commands for this alarm
-        command_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_ALARM}/#"
+        # Subscribe to manager commands for this alarm (not the other sites' alarms)
+        command_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_ALARM}/{alarm_id}/command"
         client.subscribe(command_topic, qos=2)
         print(f"✅ Subscribed to: {command_topic}")
 
+        # Sector index -> name table (retained), used only to show zone names
+        client.subscribe(sector_catalog_topic, qos=1)
+
+def request_resync(client):
+    """Ask the manager for the full zone list after a sequence gap"""
+    global display_seq, resync_pending, resync_sent_at
+    display_seq = None
+    if resync_pending and clock.monotonic() - resync_sent_at < RESYNC_TIMEOUT:
+        return # Already asked, wait for the full update
+    resync_pending = True
+    resync_sent_at = clock.monotonic()
+    resync_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_ALARM}/{alarm_id}/resync"
+    client.publish(resync_topic, json.dumps({"id": alarm_id}), qos=1, retain=False)
+    print(f"[ALM] 🔄 Display resync requested")
+
+def check_resync(client):
+    """Periodic: ask again when the request (or the manager's answer) was lost"""
+    if resync_pending and clock.monotonic() - resync_sent_at >= RESYNC_TIMEOUT:
+        print(f"[ALM] ⏳ No answer to the display resync, asking again")
+        request_resync(client)
+
+def zone_names():
+    """Displayed sector indices -> sector IDs"""
+    return [sector_catalog[i] if 0 <= i < len(sector_catalog) else f"#{i}" for i in alarm_system.display]
+
 # method to receive asynchronous messages
 def on_message(client, userdata, message):
+    global display_seq, resync_pending
     try:
         payload = json.loads(message.payload.decode("utf-8"))
         topic = message.topic
+
+        if topic == sector_catalog_topic:
+            sector_catalog[:] = payload.get("sectors", [])
+            print(f"[ALM] 🗺️  Sector catalog: {len(sector_catalog)} sectors")
+            return
+
         print(f"\n📨 Received: {topic}")
         print(f"📦 Payload: {payload}")
 
@@ -58,22 +94,25 @@ def on_message(client, userdata, message):
             alarm_system.turn_siren_off()
             print(f"[ALM] 📥 CMD | Siren OFF 🔕")
         elif command == "update_display":
-            new_zones = sorted(list(set(payload.get("zones", []))))
-            
-            # Keep existing logic for internal state (if needed later)
-            current_zones = set(alarm_system.display)
-            
-            # Identify zones to add and remove
-            to_add = set(new_zones) - current_zones
-            to_remove = current_zones - set(new_zones)
-            
-            for z_id in to_add:
-                alarm_system.add_dangerous_zone(z_id)
-                
-            for z_id in to_remove:
+            # Full list (initial sync or resync)
+            alarm_system.set_dangerous_zones(sorted(set(payload.get("zones", []))))
+            display_seq = payload.get("seq")
+            resync_pending = False
+            print(f"[ALM] 📥 CMD | Update Display (full, seq {display_seq}) | Zones: {zone_names()}")
+        elif command == "update_display_delta":
+            seq = payload.get("seq")
+            if display_seq is None or seq != display_seq + 1:
+                # Missed a delta (or never synced): the display can't be trusted
+                print(f"[ALM] ⚠️  Display seq gap (have {display_seq}, got {seq})")
+                request_resync(client)
+                return
+
+            for z_id in payload.get("remove", []):
                 alarm_system.remove_dangerous_zone(z_id)
-            
-            print(f"[ALM] 📥 CMD | Update Display | Zones: {alarm_system.display}")
+            for z_id in payload.get("add", []):
+                alarm_system.add_dangerous_zone(z_id)
+            display_seq = seq
+            print(f"[ALM] 📥 CMD | Update Display (seq {seq}) | Zones: {zone_names()}")
         else:
             print(f"ℹ️  Unknown command: {command}")
 
@@ -84,23 +123,39 @@ def on_message(client, userdata, message):
 
 
 # configuration variables
-alarm_id = "alarm_001"
+alarm_id = os.getenv("ALARM_ID", DEFAULT_ALARM_ID)
+site_id = SiteRegistry(ROOT / "data").site_for_alarm(alarm_id) # Site this alarm belongs to (sites.csv)
 alarm_system = SafetyAlarmSystem()
+display_seq = None # Sequence number of the last display update applied
+resync_pending = False
+resync_sent_at = 0.0 # clock.monotonic() of the last resync request
+sector_catalog = [] # Sector index -> sector ID
+sector_catalog_topic = f"{site_topic(f'{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}', site_id)}/sectors"
+
 
-mqtt_client = mqtt.Client(alarm_id)
-mqtt_client.on_message = on_message
-mqtt_client.on_connect = on_connect
+def main():
+    mqtt_client = mqtt.Client(alarm_id)
+    mqtt_client.on_message = on_message
+    mqtt_client.on_connect = on_connect
 
-# Set Account Username & Password
-mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+    # Set Account Username & Password
+    mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
 
-print("Connecting to " + BROKER_ADDRESS + " port: " + str(BROKER_PORT))
-mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
+    print("Connecting to " + BROKER_ADDRESS + " port: " + str(BROKER_PORT))
+    mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
 
-# start comunication
-try:
-    print(f"🔔 Alarm {alarm_id} started. Waiting for commands...")
-    mqtt_client.loop_forever()
-except KeyboardInterrupt:
-    print("\n🛑 Shutting down alarm...")
-    mqtt_client.disconnect()
\ No newline at end of file
+    # start comunication: network loop in its own thread, the main thread retries lost resyncs
+    mqtt_client.loop_start()
+    try:
+        print(f"🔔 Alarm {alarm_id} started. Waiting for commands...")
+        while True:
+            time.sleep(1.0)
+            check_resync(mqtt_client)
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down alarm...")
+        mqtt_client.loop_stop()
+        mqtt_client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,201 @@
+# src/process/export_history.py
+"""
+Telemetry history export (Parquet)
+Responsibilities:
+- Read the history table of every site's state.db (STORAGE_BACKEND=sqlite, STORAGE_HISTORY=1)
+- Write Hive-partitioned Parquet: {EXPORT_DIR}/device_type=helmet/date=2026-10-18/{site_id}.parquet
+- Stream: rows are fetched and written EXPORT_ROW_GROUP_ROWS at a time (one row group
+  each), so memory stays bounded whatever the size of a day
+- Rows sorted by device_id, then time: row-group statistics on device_id and time
+  let readers skip what a filter excludes (predicate pushdown)
+
+Complete UTC days only (EXPORT_INCLUDE_TODAY=1 adds the running day). A partition
+already on disk is skipped when it holds at least as many rows as the database has
+for that day (a running day exported earlier is written again once complete), unless
+EXPORT_OVERWRITE=1. EXPORT_PRUNE=1 deletes from the database exactly the (device type,
+complete day) ranges whose partition was verified on disk; rows of other device types
+are never deleted.
+
+Load a month in a notebook:
+    pd.read_parquet("src/data/export", filters=[("device_type", "=", "helmet"), ("date", ">=", "2026-10-01")])
+"""
+
+import os
+import sys
+import time
+import sqlite3
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from model.site_registry import SiteRegistry
+from utils.storage import SQLITE_FILENAME
+
+load_dotenv()
+
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR") or ROOT / "data" / "export")
+EXPORT_ROW_GROUP_ROWS = int(os.getenv("EXPORT_ROW_GROUP_ROWS", 100_000)) # Rows per fetch and per row group
+EXPORT_INCLUDE_TODAY = os.getenv("EXPORT_INCLUDE_TODAY", "0").lower() in ("1", "true", "yes")
+EXPORT_OVERWRITE = os.getenv("EXPORT_OVERWRITE", "0").lower() in ("1", "true", "yes")
+EXPORT_PRUNE = os.getenv("EXPORT_PRUNE", "0").lower() in ("1", "true", "yes")
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")
+
+# The manager stores history rows under the device type of the topic they came from
+TOPIC_HELMET = os.getenv("TOPIC_HELMET") or "helmet"
+TOPIC_STATION = os.getenv("TOPIC_STATION") or "station"
+
+# Columns per device type (history table column -> Arrow type)
+COLUMNS = {
+    TOPIC_HELMET: [("latitude", pa.float64()), ("longitude", pa.float64()), ("battery", pa.int16()), ("led", pa.int8())],
+    TOPIC_STATION: [("latitude", pa.float64()), ("longitude", pa.float64()),
+                ("dust", pa.float64()), ("noise", pa.float64()), ("gas", pa.float64())],
+}
+
+
+def schema_for(device_type):
+    return pa.schema([
+        ("device_id", pa.string()),
+        ("time", pa.timestamp("us", tz="UTC")),
+        *COLUMNS[device_type]
+    ])
+
+
+def utc_days(t_min, t_max, include_today=False):
+    """[(date string, start, end)] of the UTC days covering [t_min, t_max]"""
+    day = datetime.fromtimestamp(t_min, tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    today = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    days = []
+    while day.timestamp() <= t_max:
+        if day >= today and not include_today:
+            break
+        end = day + timedelta(days=1)
+        days.append((day.strftime("%Y-%m-%d"), day.timestamp(), end.timestamp()))
+        day = end
+    return days
+
+
+def day_index(conn):
+    """
+    Index that reads one (device type, day) range: (device_type, t), or (t) in databases
+    the manager created before it existed. (device_type, device_id, t) would satisfy the
+    ORDER BY but scan the device type's whole history for every day.
+    """
+    found = conn.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='history_type_t'").fetchone()
+    return "history_type_t" if found else "history_t"
+
+
+def count_rows(conn, index, device_type, start, end):
+    return conn.execute(
+        f"SELECT COUNT(*) FROM history INDEXED BY {index} WHERE device_type = ? AND t >= ? AND t < ?",
+        (device_type, start, end)
+    ).fetchone()[0]
+
+
+def export_partition(conn, site_id, device_type, start, end, path, index="history_t"):
+    """Stream one (device type, day) of one site into path; returns the number of rows written"""
+    columns = [name for name, _ in COLUMNS[device_type]]
+    schema = schema_for(device_type)
+    # The day's rows come from the index range, then are sorted (spilling to disk if needed)
+    cursor = conn.execute(
+        f"SELECT device_id, t, {', '.join(columns)} FROM history INDEXED BY {index} "
+        "WHERE device_type = ? AND t >= ? AND t < ? ORDER BY device_id, t",
+        (device_type, start, end)
+    )
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    writer = None
+    rows_written = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_ROW_GROUP_ROWS)
+            if not rows:
+                break
+            frame = pd.DataFrame.from_records(rows, columns=["device_id", "time", *columns])
+            frame["time"] = pd.to_datetime(frame["time"], unit="s", utc=True).dt.floor("us")
+            table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            if writer is None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                writer = pq.ParquetWriter(tmp_path, schema, compression=EXPORT_COMPRESSION)
+            writer.write_table(table, row_group_size=EXPORT_ROW_GROUP_ROWS)
+            rows_written += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp_path, path)
+    return rows_written
+
+
+def export_site(site_id, db_path, output_dir):
+    """Export every complete day of one site's history; returns (partitions written, rows)"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        if not conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='history'").fetchone():
+            return 0, 0
+        t_min, t_max = conn.execute("SELECT MIN(t), MAX(t) FROM history").fetchone()
+        if t_min is None:
+            return 0, 0
+
+        index = day_index(conn)
+        partitions = rows = 0
+        verified = [] # (device_type, start, end) of complete days fully on disk
+        for date, start, end in utc_days(t_min, t_max, EXPORT_INCLUDE_TODAY):
+            complete = end <= datetime.now(tz=timezone.utc).timestamp() # A running day is never pruned
+            for device_type in COLUMNS:
+                path = output_dir / f"device_type={device_type}" / f"date={date}" / f"{site_id}.parquet"
+                expected = count_rows(conn, index, device_type, start, end)
+                if not expected:
+                    continue
+                if path.exists() and not EXPORT_OVERWRITE and pq.read_metadata(path).num_rows >= expected:
+                    on_disk = True # Nothing new since it was written
+                else:
+                    written = export_partition(conn, site_id, device_type, start, end, path, index)
+                    partitions += 1
+                    rows += written
+                    on_disk = written >= expected
+                    print(f"✅ {path.relative_to(output_dir)}: {written} rows")
+                if complete and on_disk:
+                    verified.append((device_type, start, end))
+    finally:
+        conn.close()
+
+    if EXPORT_PRUNE and verified:
+        with sqlite3.connect(db_path) as conn:
+            deleted = sum(
+                conn.execute("DELETE FROM history WHERE device_type = ? AND t >= ? AND t < ?", day).rowcount
+                for day in verified
+            )
+        print(f"🧹 [{site_id}] pruned {deleted} exported history rows")
+    return partitions, rows
+
+
+def main():
+    print("\n" + "="*60)
+    print("📦 TELEMETRY HISTORY EXPORT (Parquet)")
+    print("="*60 + "\n")
+
+    start = time.perf_counter()
+    registry = SiteRegistry(ROOT / "data")
+    total_partitions = total_rows = 0
+    for site_id, config in registry.sites.items():
+        db_path = config.dynamic_dir / SQLITE_FILENAME
+        if not db_path.exists():
+            print(f"ℹ️  [{site_id}] no {SQLITE_FILENAME} (history needs STORAGE_BACKEND=sqlite)")
+            continue
+        partitions, rows = export_site(site_id, db_path, EXPORT_DIR)
+        total_partitions += partitions
+        total_rows += rows
+
+    print(f"\n✅ {total_rows} rows in {total_partitions} partitions written to {EXPORT_DIR} "
+          f"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
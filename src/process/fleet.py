@@ -0,0 +1,269 @@
+# src/process/fleet.py
+"""
+Fleet Simulator
+Responsibilities:
+- Simulate thousands of helmets and stations in one process (NumPy arrays, see model/fleet.py)
+- Advance every device that is due in one vectorized step per tick
+- Publish info / telemetry / heartbeats through a small shared connection pool
+- Apply manager commands (set_led, set_interval) to the fleet arrays
+
+Same topics and payloads as helmet.py and station.py, so the manager cannot tell
+simulated fleets from the per-device processes. Meant for stress tests.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+import numpy as np
+from model.fleet import HelmetFleet, StationFleet, random_points_in_polygon
+from model.projection import LocalProjection
+from model.gps import GPS
+from utils.deadband import VectorDeadband
+from utils.mqtt_pool import MqttClientPool
+from utils.profiling import setup_profiling
+from utils.logger import setup_logging, get_logger
+
+load_dotenv()
+
+# FIXED VARIABLES
+BROKER_ADDRESS = os.getenv("BROKER_ADDRESS")
+BROKER_PORT = int(os.getenv("BROKER_PORT"))
+MQTT_USERNAME = os.getenv("MQTT_USERNAME")
+MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
+MQTT_BASIC_TOPIC = os.getenv("MQTT_BASIC_TOPIC") + MQTT_USERNAME
+TIME_BETWEEN_MESSAGE = int(os.getenv("TIME_BETWEEN_MESSAGE"))
+TOPIC_HELMET = os.getenv("TOPIC_HELMET")
+TOPIC_STATION = os.getenv("TOPIC_STATION")
+TOPIC_MANAGER = os.getenv("TOPIC_MANAGER")
+
+# Fleet size and pacing
+FLEET_HELMETS = int(os.getenv("FLEET_HELMETS", 1000))
+FLEET_STATIONS = int(os.getenv("FLEET_STATIONS", 100))
+FLEET_TICK = float(os.getenv("FLEET_TICK", 0.5)) # Seconds between vectorized steps
+FLEET_CONNECTIONS = int(os.getenv("FLEET_CONNECTIONS", 4)) # Shared MQTT connections
+FLEET_SEED = os.getenv("FLEET_SEED") # Optional, reproducible positions and walks
+FLEET_STATS_INTERVAL = float(os.getenv("FLEET_STATS_INTERVAL", 10))
+
+# Same knobs as helmet.py / station.py
+HELMET_INTERVAL_MIN = float(os.getenv("HELMET_INTERVAL_MIN", 0.5))
+HELMET_INTERVAL_MAX = float(os.getenv("HELMET_INTERVAL_MAX", 60))
+TELEMETRY_DEADBAND = os.getenv("TELEMETRY_DEADBAND", "1").lower() in ("1", "true", "yes")
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", 30))
+TELEMETRY_REFRESH_INTERVAL = float(os.getenv("TELEMETRY_REFRESH_INTERVAL", 300))
+HELMET_DEADBAND_POSITION = float(os.getenv("HELMET_DEADBAND_POSITION", 2.0))
+HELMET_DEADBAND_BATTERY = float(os.getenv("HELMET_DEADBAND_BATTERY", 5))
+STATION_DEADBAND_POSITION = float(os.getenv("STATION_DEADBAND_POSITION", 1.0))
+STATION_DEADBAND_DUST = float(os.getenv("STATION_DEADBAND_DUST", 2.0))
+STATION_DEADBAND_NOISE = float(os.getenv("STATION_DEADBAND_NOISE", 2.0))
+STATION_DEADBAND_GAS = float(os.getenv("STATION_DEADBAND_GAS", 0.05))
+BATTERY_LOW_LIMIT = int(os.getenv("BATTERY_LOW_LIMIT", 10))
+BATTERY_FULL_LIMIT = int(os.getenv("BATTERY_FULL_LIMIT", 100))
+DUST_LIMIT = float(os.getenv("DUST_LIMIT", 50.0))
+NOISE_LIMIT = float(os.getenv("NOISE_LIMIT", 50.0))
+GAS_LIMIT = float(os.getenv("GAS_LIMIT", 1.0))
+
+SITE_CSV_PATH = ROOT / "data" / "static" / "site.csv"
+
+LOG = get_logger("fleet")
+
+
+class FleetGroup:
+    """One device type of the fleet: state arrays, per-device schedule, deadband and topics"""
+
+    def __init__(self, device_type, fleet, interval, deadband=None):
+        self.device_type = device_type
+        self.fleet = fleet
+        self.interval = np.full(len(fleet), float(interval)) # Seconds between samples, per device
+        # Spread the first samples over one interval so the fleet does not publish in lockstep
+        self.next_due = time.monotonic() + fleet.rng.uniform(0, interval, len(fleet))
+        self.deadband = deadband
+        base = f"{MQTT_BASIC_TOPIC}/{device_type}"
+        self.info_topics = [f"{base}/{device_id}/info" for device_id in fleet.ids]
+        self.telemetry_topics = [f"{base}/{device_id}/telemetry" for device_id in fleet.ids]
+        self.heartbeat_topics = [f"{base}/{device_id}/heartbeat" for device_id in fleet.ids]
+        self.key_offset = 0 # Pool key of device 0 (helmets and stations share the pool)
+
+    def sample_values(self):
+        fleet = self.fleet
+        if isinstance(fleet, HelmetFleet):
+            return {"battery": fleet.battery, "led": fleet.led}
+        return {"dust": fleet.dust, "noise": fleet.noise, "gas": fleet.gas}
+
+
+def load_site_polygon(csv_path):
+    """Site vertices as (lat, lon) tuples"""
+    with open(csv_path, newline="") as f:
+        return [(float(row["latitude"]), float(row["longitude"])) for row in csv.DictReader(f)]
+
+
+def build_groups(polygon, rng):
+    projection = LocalProjection.for_points([GPS(lat, lon) for lat, lon in polygon])
+
+    lat, lon = random_points_in_polygon(FLEET_HELMETS, polygon, rng)
+    helmets = HelmetFleet([f"sim-h{i:05d}" for i in range(FLEET_HELMETS)], lat, lon, polygon, rng)
+    helmet_deadband = None
+    if TELEMETRY_DEADBAND:
+        helmet_deadband = VectorDeadband(
+            len(helmets), projection,
+            position_m=HELMET_DEADBAND_POSITION,
+            deltas={"battery": HELMET_DEADBAND_BATTERY, "led": 0},
+            limits={"battery": [BATTERY_LOW_LIMIT, BATTERY_FULL_LIMIT]},
+            heartbeat_s=HEARTBEAT_INTERVAL,
+            refresh_s=TELEMETRY_REFRESH_INTERVAL
+        )
+
+    lat, lon = random_points_in_polygon(FLEET_STATIONS, polygon, rng)
+    stations = StationFleet([f"sim-s{i:05d}" for i in range(FLEET_STATIONS)], lat, lon, rng)
+    station_deadband = None
+    if TELEMETRY_DEADBAND:
+        station_deadband = VectorDeadband(
+            len(stations), projection,
+            position_m=STATION_DEADBAND_POSITION,
+            deltas={"dust": STATION_DEADBAND_DUST, "noise": STATION_DEADBAND_NOISE, "gas": STATION_DEADBAND_GAS},
+            limits={"dust": [DUST_LIMIT], "noise": [NOISE_LIMIT], "gas": [GAS_LIMIT]},
+            heartbeat_s=HEARTBEAT_INTERVAL,
+            refresh_s=TELEMETRY_REFRESH_INTERVAL
+        )
+
+    helmet_group = FleetGroup(TOPIC_HELMET, helmets, TIME_BETWEEN_MESSAGE, helmet_deadband)
+    station_group = FleetGroup(TOPIC_STATION, stations, TIME_BETWEEN_MESSAGE, station_deadband)
+    station_group.key_offset = len(helmets)
+    return helmet_group, station_group
+
+
+def publish_info(pool, group):
+    """Retained info for every device (QoS 1: at fleet scale the QoS 2 handshake only adds load)"""
+    reporting = group.deadband.settings() if group.deadband else None
+    for i, topic in enumerate(group.info_topics):
+        pool.publish(group.key_offset + i, topic, group.fleet.device_info(i, reporting), qos=1, retain=True)
+    if group.deadband:
+        group.deadband.reset() # Full telemetry right after (re)connecting
+
+
+def on_connect(client, userdata, flags, rc):
+    if rc != 0:
+        LOG.warning("⚠️  Fleet connection refused", extra={"fields": {"rc": rc}})
+    else:
+        command_pattern = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_HELMET}/+/command"
+        client.subscribe(command_pattern, qos=2)
+        LOG.info("✅ Fleet connected", extra={"fields": {"rc": rc, "subscribed": command_pattern}})
+        userdata['connected'].set()
+
+
+def on_message(client, userdata, message):
+    """Manager commands for simulated helmets, applied to the fleet arrays"""
+    group = userdata['helmets']
+    try:
+        helmet_id = message.topic.split('/')[-2]
+        i = group.fleet.index.get(helmet_id)
+        if i is None:
+            return
+        payload = json.loads(message.payload.decode("utf-8"))
+        command = payload.get('command')
+
+        with userdata['lock']:
+            if command == 'set_led' and payload.get('led') is not None:
+                group.fleet.led[i] = payload['led']
+            elif command == 'set_interval' and payload.get('interval') is not None:
+                interval = max(HELMET_INTERVAL_MIN, min(HELMET_INTERVAL_MAX, float(payload['interval'])))
+                if interval < group.interval[i]:
+                    group.next_due[i] = min(group.next_due[i], time.monotonic()) # Faster rate applies now
+                group.interval[i] = interval
+        userdata['commands'] += 1
+    except Exception:
+        LOG.exception("❌ Error processing command", extra={"fields": {"topic": message.topic}})
+
+
+def run_fleet_cycle(pool, group, now, timestamp):
+    """Step every due device of a group at once, then publish its telemetry or heartbeats"""
+    due = np.flatnonzero(group.next_due <= now)
+    if not due.size:
+        return 0, 0
+    group.fleet.step(due if due.size < len(group.fleet) else None)
+    group.next_due[due] = now + group.interval[due]
+
+    if group.deadband is not None:
+        telemetry, heartbeat = group.deadband.decide(
+            due, group.fleet.latitude, group.fleet.longitude, group.sample_values(), now=timestamp)
+    else:
+        telemetry, heartbeat = due, due[:0]
+
+    offset = group.key_offset
+    for i, payload in zip(telemetry.tolist(), group.fleet.to_senml(telemetry, timestamp)):
+        pool.publish(offset + i, group.telemetry_topics[i], payload, 1, False)
+    if heartbeat.size:
+        beat = json.dumps({"t": timestamp})
+        for i in heartbeat.tolist():
+            pool.publish(offset + i, group.heartbeat_topics[i], beat, 0, False)
+    return int(telemetry.size), int(heartbeat.size)
+
+
+def main():
+    setup_logging()
+
+    print("\n" + "="*60)
+    print(f"🚜 STARTING FLEET SIMULATOR ({FLEET_HELMETS} helmets, {FLEET_STATIONS} stations)")
+    print("="*60 + "\n")
+
+    rng = np.random.default_rng(int(FLEET_SEED) if FLEET_SEED else None)
+    helmets, stations = build_groups(load_site_polygon(SITE_CSV_PATH), rng)
+
+    userdata = {'helmets': helmets, 'lock': threading.Lock(), 'commands': 0, 'connected': threading.Event()}
+    pool = MqttClientPool(
+        FLEET_CONNECTIONS, f"python-fleet-{MQTT_USERNAME}", MQTT_USERNAME, MQTT_PASSWORD,
+        userdata=userdata, on_connect=on_connect, on_message=on_message
+    )
+    print(f"Connecting {len(pool)} fleet connections to {BROKER_ADDRESS}:{BROKER_PORT}")
+    pool.connect(BROKER_ADDRESS, BROKER_PORT)
+    userdata['connected'].wait(10)
+
+    for group in (helmets, stations):
+        publish_info(pool, group)
+    print(f"✅ Published info for {len(helmets.fleet) + len(stations.fleet)} devices")
+
+    # Opt-in profiling (PROFILING_ENABLED=1): the vectorized cycle is the cProfile target
+    profiler = setup_profiling("fleet", targets=[(sys.modules[__name__], "run_fleet_cycle")])
+    if profiler:
+        profiler.attach_mqtt(pool.primary, f"{MQTT_BASIC_TOPIC}/control/profile/fleet")
+
+    sent = beats = 0
+    step_seconds = 0.0
+    stats_at = time.monotonic()
+    try:
+        while True:
+            start = time.monotonic()
+            timestamp = time.time()
+            with userdata['lock']:
+                for group in (helmets, stations):
+                    t, h = run_fleet_cycle(pool, group, start, timestamp)
+                    sent += t
+                    beats += h
+            step_seconds += time.monotonic() - start
+
+            if start - stats_at >= FLEET_STATS_INTERVAL:
+                elapsed = start - stats_at
+                LOG.info("📊 Fleet stats", extra={"fields": {
+                    "telemetry_per_s": round(sent / elapsed), "heartbeats_per_s": round(beats / elapsed),
+                    "busy_pct": round(100 * step_seconds / elapsed, 1), "commands": userdata['commands']}})
+                sent = beats = 0
+                step_seconds = 0.0
+                stats_at = start
+
+            time.sleep(max(0.0, FLEET_TICK - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down fleet...")
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,12 @@ sys.path.append(str(ROOT))
 
 from model.worker_smart_helmet import WorkerSmartHelmet
 from model.gps import GPS
+from model.site_registry import SiteRegistry, DEFAULT_SITE_ID, site_topic
+from utils.deadband import Deadband, HEARTBEAT
+from utils.sim_clock import clock
+from utils.profiling import setup_profiling
+from utils.logger import setup_logging, get_logger
+import logging
 
 load_dotenv()
 
@@ -32,9 +38,30 @@ TIME_BETWEEN_MESSAGE = int(os.getenv("TIME_BETWEEN_MESSAGE"))
 TOPIC_HELMET = os.getenv("TOPIC_HELMET")
 TOPIC_MANAGER = os.getenv("TOPIC_MANAGER")
 
+# Bounds for manager-driven reporting intervals (set_interval command)
+HELMET_INTERVAL_MIN = float(os.getenv("HELMET_INTERVAL_MIN", 0.5))
+HELMET_INTERVAL_MAX = float(os.getenv("HELMET_INTERVAL_MAX", 60))
+
+# Report-by-exception: publish telemetry only on meaningful changes, heartbeats otherwise
+TELEMETRY_DEADBAND = os.getenv("TELEMETRY_DEADBAND", "1").lower() in ("1", "true", "yes")
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", 30))
+TELEMETRY_REFRESH_INTERVAL = float(os.getenv("TELEMETRY_REFRESH_INTERVAL", 300))
+HELMET_DEADBAND_POSITION = float(os.getenv("HELMET_DEADBAND_POSITION", 2.0)) # Meters
+HELMET_DEADBAND_BATTERY = float(os.getenv("HELMET_DEADBAND_BATTERY", 5)) # Percent points
+BATTERY_LOW_LIMIT = int(os.getenv("BATTERY_LOW_LIMIT", 10))
+BATTERY_FULL_LIMIT = int(os.getenv("BATTERY_FULL_LIMIT", 100))
+
+# Site the helmets of this process work on (data/static/sites.csv); announced in their info
+SITE_ID = os.getenv("SITE_ID", DEFAULT_SITE_ID)
+
+# Retained danger map published by the manager for that site (edge geofencing)
+DANGER_MAP_TOPIC = f"{site_topic(f'{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}', SITE_ID)}/danger_map"
+
 CSV_PATH = ROOT / "data" / "static" / "helmets.csv"
 SITE_CSV_PATH = ROOT / "data" / "static" / "site.csv"
 
+LOG = get_logger("helmet")
+
 
 def load_site_boundaries(csv_path):
     """Load site boundaries from CSV and return polygon vertices"""
@@ -53,12 +80,15 @@ def on_connect(client, userdata, flags, rc):
     """Callback when helmet connects to broker"""
     helmet_id = userdata['helmet_id']
     helmet = userdata['helmet']
+    deadband = userdata.get('deadband')
     print(f"Helmet {helmet_id} connected with result code {rc}")
     
     if rc == 0:
         # Publish device info (Retained, QoS 2)
         info_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_HELMET}/{helmet_id}/info"
-        info_payload = helmet.device_info()
+        info_payload = helmet.device_info(deadband.settings() if deadband else None, SITE_ID)
+        if deadband:
+            deadband.reset() # Full telemetry right after (re)connecting
         client.publish(info_topic, info_payload, qos=2, retain=True)
         print(f"✅ Helmet {helmet_id} published info to: {info_topic}")
 
@@ -67,74 +97,186 @@ def on_connect(client, userdata, flags, rc):
         client.subscribe(command_topic, qos=2)
         print(f"✅ Helmet {helmet_id} subscribed to: {command_topic}")
 
+        # Retained danger map for local geofencing
+        client.subscribe(DANGER_MAP_TOPIC, qos=1)
+        print(f"✅ Helmet {helmet_id} subscribed to: {DANGER_MAP_TOPIC}")
+
+        # Only one helmet per process listens for profiling commands
+        profiler = userdata.get('profiler')
+        if profiler:
+            profiler.attach_mqtt(client, f"{MQTT_BASIC_TOPIC}/control/profile/helmet")
+
+
+def publish_danger_event(client, helmet, event_topic, resync=False):
+    """
+    Local geofencing: publish danger entry/exit as soon as the helmet detects it.
+    resync: publish the current state even if unchanged (the manager may have lost it)
+    """
+    was_in_danger = helmet.in_danger
+    event = helmet.update_danger_state(resync)
+    if event is None:
+        return
+    resync = (event == "danger_enter") == was_in_danger # State unchanged, sent again
+    payload = {
+        "event": event,
+        "cell": list(helmet.danger_cell) if helmet.danger_cell else None,
+        "map_seq": helmet.danger_map["seq"],
+        "grid": helmet.danger_map["grid"],
+        "resync": resync,
+        "timestamp": clock.time()
+    }
+    client.publish(event_topic, json.dumps(payload), qos=1, retain=False)
+    if resync:
+        LOG.info("🔁 Danger state re-sent", extra={"fields": {"id": helmet.id, "event": event}})
+    elif event == "danger_enter":
+        LOG.warning("🚨 Entered DANGEROUS sector (local check)", extra={"fields": {"id": helmet.id, "cell": payload["cell"]}})
+    else:
+        LOG.info("✅ Left dangerous sector (local check)", extra={"fields": {"id": helmet.id}})
+
 
 def on_message(client, userdata, message):
-    """Callback when helmet receives a command from manager"""
+    """Callback when helmet receives a command or the danger map from manager"""
     helmet = userdata['helmet']
     helmet_id = userdata['helmet_id']
     
     try:
         topic = message.topic
         payload = json.loads(message.payload.decode("utf-8"))
-        
-        print(f"\n{'='*50}")
-        print(f"📨 Helmet {helmet_id} received command")
-        print(f"   Topic: {topic}")
-        print(f"   Payload: {payload}")
+
+        if topic == DANGER_MAP_TOPIC:
+            resync = helmet.set_danger_map(payload)
+            publish_danger_event(client, helmet, userdata['event_topic'], resync) # Zones changed under a standing worker
+            return
         
         # Process command
         command = payload.get('command')
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("📨 Command received", extra={"fields": {"id": helmet_id, "topic": topic, "payload": payload}})
         
         if command == 'set_led':
             new_led_status = payload.get('led')
             if new_led_status is not None:
                 helmet.set_led(new_led_status)
-                print(f"✅ LED status updated: {new_led_status}")
-                if new_led_status == 1:
-                    print(f"🔋 Helmet {helmet_id} entering CHARGING mode")
-                else:
-                    print(f"⚒️  Helmet {helmet_id} entering WORK mode")
+                mode = "🔋 CHARGING" if new_led_status == 1 else "⚒️  WORK"
+                LOG.info(f"✅ LED status updated -> {mode} mode", extra={"fields": {"id": helmet_id, "led": new_led_status}})
+        
+        elif command == 'set_interval':
+            interval = payload.get('interval')
+            if interval is not None:
+                previous = helmet.report_interval
+                interval = helmet.set_report_interval(interval, HELMET_INTERVAL_MIN, HELMET_INTERVAL_MAX)
+                if previous is None or interval < previous:
+                    userdata['wake'].set() # Faster rate: don't wait out the old, longer sleep
+                LOG.info("⏱️  Reporting interval updated", extra={"fields": {"id": helmet_id, "interval": interval}})
         
         elif command == 'alert':
             alert_message = payload.get('message', 'Alert!')
-            print(f"🚨 ALERT received: {alert_message}")
+            LOG.warning("🚨 ALERT received", extra={"fields": {"id": helmet_id, "message": alert_message}})
             # TODO: Implement alert handling (buzzer, vibration, etc.)
         
         else:
-            print(f"⚠️  Unknown command: {command}")
-        
-        print(f"{'='*50}\n")
+            LOG.warning("⚠️  Unknown command", extra={"fields": {"id": helmet_id, "command": command}})
         
     except json.JSONDecodeError as e:
-        print(f"❌ JSON decode error: {e}")
+        LOG.error("❌ JSON decode error", extra={"fields": {"id": helmet_id, "error": e}})
     except Exception as e:
-        print(f"❌ Error processing command: {e}")
+        LOG.exception("❌ Error processing command", extra={"fields": {"id": helmet_id}})
+
+
+def run_helmet_cycle(mqtt_client, helmet, telemetry_topic, deadband=None, heartbeat_topic=None, event_topic=None):
+    """Simulate one step of helmet behavior and publish its telemetry (or a heartbeat)"""
+    # LED = 0 -> WORK mode (moving, battery decreasing)
+    # LED = 1 -> CHARGING mode (stationary, battery increasing)
+    if helmet.led == 0:
+        # WORK MODE
+        helmet.move()
+        helmet.descrease_battery_level(random.randint(1, 10))  # Slower drain
+    else:
+        # CHARGING MODE
+        helmet.recharge_battery(random.randint(5, 10))  # Faster charge
+
+    if event_topic is not None:
+        publish_danger_event(mqtt_client, helmet, event_topic)
+    
+    if deadband is not None:
+        decision = deadband.decide(
+            helmet.position.latitude, helmet.position.longitude, {"battery": helmet.battery, "led": helmet.led})
+        if decision is None:
+            return
+        if decision == HEARTBEAT:
+            mqtt_client.publish(heartbeat_topic, json.dumps({"t": clock.time()}), 0, False)
+            return
+
+    # Publish telemetry (SenML)
+    payload = helmet.to_senml()
+    mqtt_client.publish(telemetry_topic, payload, 1, False)
+    
+    if LOG.isEnabledFor(logging.DEBUG):
+        LOG.debug("📤 SENT", extra={"fields": {
+            "id": helmet.id, "battery": helmet.battery, "led": helmet.led,
+            "lat": round(helmet.position.latitude, 6), "lon": round(helmet.position.longitude, 6)}})
 
 
-def start_helmet_device(helmet_id, latitude, longitude, boundaries):
+def setup_helmet_device(mqtt_client, helmet_id, latitude, longitude, boundaries, wake, profiler=None):
     """
-    Start a helmet device that:
-    1. Publishes telemetry
-    2. Subscribes to manager commands
-    3. Reacts to commands by changing state
+    Create a helmet and wire it to an MQTT client (callbacks + user data).
+    wake: object with set(), called when a faster reporting interval must apply now.
+    Returns the user data (helmet, deadband, topics) used to run its cycles.
     """
-    # Setup client MQTT with unique ID
-    client_id = f"python-helmet-{helmet_id}-{MQTT_USERNAME}"
-    mqtt_client = mqtt.Client(client_id)
-    
     # Create helmet instance
     position = GPS(latitude, longitude)
     helmet = WorkerSmartHelmet(helmet_id, position, boundaries)
+    helmet.set_report_interval(TIME_BETWEEN_MESSAGE, HELMET_INTERVAL_MIN, HELMET_INTERVAL_MAX)
+    event_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_HELMET}/{helmet_id}/event" # Local danger entry/exit
+    deadband = None
+    if TELEMETRY_DEADBAND:
+        deadband = Deadband(
+            position_m=HELMET_DEADBAND_POSITION,
+            deltas={"battery": HELMET_DEADBAND_BATTERY, "led": 0},
+            limits={"battery": [BATTERY_LOW_LIMIT, BATTERY_FULL_LIMIT]},
+            heartbeat_s=HEARTBEAT_INTERVAL,
+            refresh_s=TELEMETRY_REFRESH_INTERVAL
+        )
     
     # Set user data (shared between callbacks)
-    mqtt_client.user_data_set({
+    userdata = {
         'helmet_id': helmet_id,
-        'helmet': helmet
-    })
+        'helmet': helmet,
+        'profiler': profiler,
+        'wake': wake,
+        'deadband': deadband,
+        'telemetry_topic': f"{MQTT_BASIC_TOPIC}/{TOPIC_HELMET}/{helmet_id}/telemetry",
+        'heartbeat_topic': f"{MQTT_BASIC_TOPIC}/{TOPIC_HELMET}/{helmet_id}/heartbeat",
+        'event_topic': event_topic
+    }
+    mqtt_client.user_data_set(userdata)
     
     # Set callbacks
     mqtt_client.on_connect = on_connect
     mqtt_client.on_message = on_message
+    return userdata
+
+
+def run_helmet_step(mqtt_client, userdata):
+    """One cycle of a helmet created by setup_helmet_device"""
+    run_helmet_cycle(
+        mqtt_client, userdata['helmet'], userdata['telemetry_topic'],
+        userdata['deadband'], userdata['heartbeat_topic'], userdata['event_topic'])
+
+
+def start_helmet_device(helmet_id, latitude, longitude, boundaries, profiler=None):
+    """
+    Start a helmet device that:
+    1. Publishes telemetry
+    2. Subscribes to manager commands
+    3. Reacts to commands by changing state
+    """
+    # Setup client MQTT with unique ID
+    client_id = f"python-helmet-{helmet_id}-{MQTT_USERNAME}"
+    mqtt_client = mqtt.Client(client_id)
+    wake = threading.Event() # Set by set_interval to cut the current sleep short
+    userdata = setup_helmet_device(mqtt_client, helmet_id, latitude, longitude, boundaries, wake, profiler)
+    helmet = userdata['helmet']
     
     # Set credentials
     mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
@@ -146,36 +288,11 @@ def start_helmet_device(helmet_id, latitude, longitude, boundaries):
     mqtt_client.loop_start()
     
     # Telemetry publishing loop
-    telemetry_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_HELMET}/{helmet_id}/telemetry"
-    
     # for message_id in range(MESSAGE_LIMIT):
     while True:
-        # Simulate helmet behavior based on LED status
-        # LED = 0 -> WORK mode (moving, battery decreasing)
-        # LED = 1 -> CHARGING mode (stationary, battery increasing)
-        
-        if helmet.led == 0:
-            # WORK MODE
-            helmet.move()
-            helmet.descrease_battery_level(random.randint(1, 10))  # Slower drain
-        else:
-            # CHARGING MODE
-            helmet.recharge_battery(random.randint(5, 10))  # Faster charge
-        
-        # Publish telemetry (SenML)
-        payload = helmet.to_senml()
-        mqtt_client.publish(telemetry_topic, payload, 1, False)
-        
-        # Clean Logic
-        log_msg = (
-            f"[HLM-{helmet_id}] 📤 SENT | "
-            f"Bat: {helmet.battery:3d}% | "
-            f"LED: {helmet.led} | "
-            f"Pos: ({helmet.position.latitude:.5f}, {helmet.position.longitude:.5f})"
-        )
-        print(log_msg)
-        
-        time.sleep(TIME_BETWEEN_MESSAGE)
+        run_helmet_step(mqtt_client, userdata)
+        wake.wait(helmet.report_interval)
+        wake.clear()
     
     # Cleanup
     mqtt_client.loop_stop()
@@ -196,18 +313,27 @@ def load_helmets(csv_path):
 
 
 def main():
+    setup_logging()
+
     print("\n" + "="*60)
     print("⛑️  STARTING SMART HELMETS")
     print("="*60 + "\n")
     
-    helmets = load_helmets(CSV_PATH)
-    boundaries = load_site_boundaries(SITE_CSV_PATH)
+    site = SiteRegistry(ROOT / "data").get(SITE_ID)
+    if site is None:
+        print(f"❌ Unknown site '{SITE_ID}' (see data/static/sites.csv)")
+        return
+    helmets = load_helmets(site.static_dir / "helmets.csv")
+    boundaries = {"polygon": list(site.vertices)}
     threads = []
+
+    # Opt-in profiling (PROFILING_ENABLED=1): the simulation cycle is the cProfile target
+    profiler = setup_profiling("helmet", targets=[(sys.modules[__name__], "run_helmet_cycle")])
     
-    for helmet in helmets:
+    for i, helmet in enumerate(helmets):
         t = threading.Thread(
             target=start_helmet_device,
-            args=(*helmet, boundaries),
+            args=(*helmet, boundaries, profiler if i == 0 else None),
             daemon=True
         )
         t.start()
@@ -5,6 +5,7 @@ Responsibilities:
 - Subscribe to helmet telemetry
 - Analyze helmet data
 - Publish commands to helmets (LED control)
+- Host many sites (site registry), routing messages by topic or device assignment
 """
 
 import paho.mqtt.client as mqtt
@@ -14,15 +15,33 @@ import sys
 from pathlib import Path
 import json
 import time
+import base64
 import random
 import csv
+import threading
 
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
 from model.site import Site, Sector
+from model.site_registry import SiteRegistry, SiteConfig, site_topic
 from model.gps import AreaVertices, GPS
+from model.site_state import SiteStatePublisher
+from model.danger_field import DangerDistanceField
+from model.sector_exposure import SectorExposure, NO_SECTOR
+from model.worker_dose import WorkerDose
+from model.hazard_field import HazardField
+from utils.sim_clock import clock
+from utils.command_publisher import CommandPublisher, PublishPolicy, parse_policy, LANE_LOW
+from utils.inbound_queue import ConflatingQueue, RateLimiter, QUEUED
+from utils.checkpoint import write_checkpoint, load_latest_checkpoint
+from utils.storage import open_storage
+from utils.metrics import REGISTRY, start_metrics_server
+from utils.profiling import setup_profiling
+from utils.logger import setup_logging, get_logger
+import logging
 import math
+import numpy as np
 
 load_dotenv()
 
@@ -40,6 +59,7 @@ TOPIC_HELMET = os.getenv("TOPIC_HELMET")
 TOPIC_MANAGER = os.getenv("TOPIC_MANAGER")
 TOPIC_STATION = os.getenv("TOPIC_STATION")
 TOPIC_ALARM = os.getenv("TOPIC_ALARM")
+TOPIC_SITES = os.getenv("TOPIC_SITES", "sites") # {base}/{TOPIC_SITES}/{site_id}/{type}/{id}/{msg}
 
 # Battery limits
 BATTERY_LOW_LIMIT = int(os.getenv("BATTERY_LOW_LIMIT", 10))
@@ -52,144 +72,327 @@ GAS_LIMIT = float(os.getenv("GAS_LIMIT", 1.0)) # Presence of gas
 
 # Grid Configuration
 SECTOR_SIZE_METERS = float(os.getenv("SECTOR_SIZE_METERS", 10.0))
+DANGER_WARNING_DISTANCE = float(os.getenv("DANGER_WARNING_DISTANCE", 10.0)) # Meters, 0 disables early warnings
 
+# Adaptive helmet reporting rate (seconds between telemetry), chosen by the manager
+ADAPTIVE_RATE = os.getenv("ADAPTIVE_RATE", "1").lower() in ("1", "true", "yes")
+HELMET_INTERVAL_FAST = float(os.getenv("HELMET_INTERVAL_FAST", 1)) # Near/inside danger
+HELMET_INTERVAL_NORMAL = float(os.getenv("HELMET_INTERVAL_NORMAL", os.getenv("TIME_BETWEEN_MESSAGE", 3))) # Low battery
+HELMET_INTERVAL_SLOW = float(os.getenv("HELMET_INTERVAL_SLOW", 15)) # Far from danger, or charging
+HELMET_FAST_DISTANCE = float(os.getenv("HELMET_FAST_DISTANCE", 20.0)) # Meters from danger for the fast rate
+# Edge geofencing: retained danger map for helmets, which report entry/exit events
+DANGER_MAP_INTERVAL = float(os.getenv("DANGER_MAP_INTERVAL", 1.0)) # Min seconds between danger-map publications
+EDGE_GEOFENCE = os.getenv("EDGE_GEOFENCE", "1").lower() in ("1", "true", "yes")
+GRID_CACHE_DIR = Path(os.getenv("GRID_CACHE_DIR") or ROOT / "data" / "cache")
+if not GRID_CACHE_DIR.is_absolute():
+    GRID_CACHE_DIR = ROOT / GRID_CACHE_DIR # Relative to src/, not to the working directory
 
-class DataCollectorManager:
-    """Main manager class for helmet monitoring and control"""
+# Aggregated site-state topic (seconds)
+SITE_STATE_INTERVAL = float(os.getenv("SITE_STATE_INTERVAL", 1.0)) # Min time between deltas
+SITE_STATE_FULL_INTERVAL = float(os.getenv("SITE_STATE_FULL_INTERVAL", 10.0)) # Retained full snapshots
+MANAGER_TICK_INTERVAL = float(os.getenv("MANAGER_TICK_INTERVAL", 0.25)) # Periodic housekeeping
+
+# Multi-site: unload a site after this many seconds without messages (0 = never)
+SITE_IDLE_TIMEOUT = float(os.getenv("SITE_IDLE_TIMEOUT", 900))
+
+# Command publishing: per-command QoS and lane ("command=value" lists, see utils/command_publisher.py)
+PUBLISH_QOS = os.getenv("PUBLISH_QOS", "") # e.g. "set_led=1,turn_siren_on=2"
+PUBLISH_LANES = os.getenv("PUBLISH_LANES", "") # high | normal | low, e.g. "set_led=low"
+PUBLISH_LOW_BATCH = int(os.getenv("PUBLISH_LOW_BATCH", 500)) # Max low-lane messages per tick
+PRIORITY_CONNECTION = os.getenv("PRIORITY_CONNECTION", "1").lower() in ("1", "true", "yes") # Own connection for the high lane
+
+# Inbound pipeline: bounded queue between the MQTT thread and a worker thread
+INBOUND_QUEUE_SIZE = int(os.getenv("INBOUND_QUEUE_SIZE", 10000)) # 0 = process on the MQTT thread
+INBOUND_RATE = float(os.getenv("INBOUND_RATE", 20)) # Max messages/s per device (0 = no limit)
+INBOUND_BURST = float(os.getenv("INBOUND_BURST", 50))
+# Latest-value messages: a newer one replaces the one still waiting (events are never conflated)
+CONFLATED_MSG_TYPES = ("telemetry", "heartbeat", "info", "resync")
+# Safety messages: never rate-limited, evicted or dropped (danger entry/exit, alarm resync,
+# device info, which tells whether a helmet's danger events are accepted)
+ESSENTIAL_MSG_TYPES = ("event", "resync", "info")
+
+# Live state storage for the web UI: "csv" (data/dynamic/*.csv) or "sqlite" (data/dynamic/state.db, WAL)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv").lower()
+STORAGE_HISTORY = os.getenv("STORAGE_HISTORY", "1").lower() in ("1", "true", "yes") # Telemetry history (sqlite only)
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", 7)) # Older history rows are deleted, 0 keeps all
+
+# Warm restart: periodic binary checkpoints of each site's in-memory state
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", 5)) # Seconds, 0 disables checkpoints
+CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR") or ROOT / "data" / "checkpoints")
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", 3)) # Newest checkpoints kept per site
+CHECKPOINT_MAX_AGE = float(os.getenv("CHECKPOINT_MAX_AGE", 600)) # Older checkpoints are not restored (0 = any age)
+# Danger/warning state is restored only for helmets heard from this recently (a few heartbeat intervals)
+CHECKPOINT_DANGER_MAX_AGE = float(os.getenv("CHECKPOINT_DANGER_MAX_AGE", 90))
+CHECKPOINT_VERSION = 1
+
+# Sector exposure heatmap (worker-minutes per sector, and while dangerous)
+EXPOSURE_MAX_GAP = float(os.getenv("EXPOSURE_MAX_GAP", 60)) # Longest interval credited between two helmet messages
+EXPOSURE_FLUSH_INTERVAL = float(os.getenv("EXPOSURE_FLUSH_INTERVAL", 10)) # Seconds between heatmap writes
+
+# Per-worker noise dose and dust exposure (station readings interpolated at each helmet)
+DOSE_INTERVAL = float(os.getenv("DOSE_INTERVAL", 5)) # Seconds between integration steps, 0 disables doses
+DOSE_RADIUS = float(os.getenv("DOSE_RADIUS", 50)) # Meters: stations farther from a helmet are ignored
+IDW_POWER = float(os.getenv("IDW_POWER", 2)) # Inverse-distance weighting exponent
+IDW_MIN_DISTANCE = float(os.getenv("IDW_MIN_DISTANCE", 1)) # Meters, caps the weight next to a station
+NOISE_DOSE_CRITERION = float(os.getenv("NOISE_DOSE_CRITERION", 85)) # dB(A) allowed for a whole shift
+NOISE_EXCHANGE_RATE = float(os.getenv("NOISE_EXCHANGE_RATE", 3)) # dB that halve the allowed time
+DUST_TWA_LIMIT = float(os.getenv("DUST_TWA_LIMIT", DUST_LIMIT)) # Shift time-weighted average dust limit
+DOSE_SHIFT_HOURS = float(os.getenv("DOSE_SHIFT_HOURS", 8))
+DOSE_RESET_HOUR = int(os.getenv("DOSE_RESET_HOUR", 0)) # UTC hour at which doses start over
+
+# Interpolated hazard field (IDW of every station's readings over the sector grid)
+HAZARD_RADIUS = float(os.getenv("HAZARD_RADIUS", 0)) # Meters a station reaches, 0 = every sector
+HAZARD_FLUSH_INTERVAL = float(os.getenv("HAZARD_FLUSH_INTERVAL", 2)) # Seconds between hazard layer writes
+HAZARD_DANGER_LEVEL = float(os.getenv("HAZARD_DANGER_LEVEL", 1.0)) # Hazard index (max level / limit) that makes a sector dangerous
+DANGER_CRITERIA = ("station", "hazard", "both") # station: radius around a dangerous station
+DANGER_CRITERION = os.getenv("DANGER_CRITERION", "station").strip().lower()
+if DANGER_CRITERION not in DANGER_CRITERIA: # A safety setting: never fall back silently
+    raise ValueError(f"Unknown DANGER_CRITERION '{DANGER_CRITERION}' (expected one of {', '.join(DANGER_CRITERIA)})")
+
+# Metrics endpoint (Prometheus text format), 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# Instrumentation
+MESSAGES_TOTAL = REGISTRY.counter(
+    "manager_messages_total", "MQTT messages received by the manager", ["device_type", "msg_type"])
+MESSAGE_ERRORS_TOTAL = REGISTRY.counter(
+    "manager_message_errors_total", "Messages that failed decoding or processing", ["reason"])
+DECODE_SECONDS = REGISTRY.histogram(
+    "manager_decode_seconds", "Time spent decoding JSON/SenML payloads")
+GEOFENCE_SECONDS = REGISTRY.histogram(
+    "manager_geofence_seconds", "Time spent locating a helmet and evaluating its safety")
+DANGER_ZONE_SECONDS = REGISTRY.histogram(
+    "manager_danger_zone_seconds", "Time spent recomputing a station's danger zone")
+PERSISTENCE_SECONDS = REGISTRY.histogram(
+    "manager_persistence_seconds", "Time spent writing live state and checkpoints", ["file"])
+FLEET_SIZE = REGISTRY.gauge(
+    "manager_fleet_size", "Number of known devices", ["device_type"])
+DANGEROUS_SECTORS = REGISTRY.gauge(
+    "manager_dangerous_sectors", "Number of sectors currently marked dangerous")
+WORKERS_IN_DANGER = REGISTRY.gauge(
+    "manager_workers_in_danger", "Number of workers currently inside a dangerous sector")
+DANGER_WARNINGS_TOTAL = REGISTRY.counter(
+    "manager_danger_warnings_total", "Early warnings sent to workers approaching a dangerous sector")
+DOSE_SECONDS = REGISTRY.histogram(
+    "manager_dose_seconds", "Time spent interpolating station readings at every helmet and integrating doses")
+DOSE_LIMITS_TOTAL = REGISTRY.counter(
+    "manager_dose_limits_total", "Workers who reached a shift dose limit", ["quantity"])
+SITES_LOADED = REGISTRY.gauge(
+    "manager_sites_loaded", "Sites currently loaded in memory")
+QUEUE_DEPTH = REGISTRY.gauge(
+    "manager_queue_depth", "Messages waiting in the manager queues", ["queue"])
+INBOUND_DROPPED_TOTAL = REGISTRY.counter(
+    "manager_inbound_dropped_total", "Inbound messages not processed (conflated, evicted, dropped, rate_limited)", ["reason"])
+INBOUND_WAIT_SECONDS = REGISTRY.histogram(
+    "manager_inbound_wait_seconds", "Time messages spent in the inbound queue")
+
+# Loggers (per category, see utils/logger.py)
+LOG = get_logger("manager")
+LOG_HELMET = get_logger("manager.helmet")
+LOG_STATION = get_logger("manager.station")
+LOG_ALARM = get_logger("manager.alarm")
+LOG_STORAGE = get_logger("manager.storage")
+
+
+class SiteManager:
+    """State and safety logic of one construction site (grid, devices, danger zones, alarm)"""
     
-    def __init__(self, mqtt_client):
+    def __init__(self, mqtt_client, config: SiteConfig, publisher: CommandPublisher = None):
         self.mqtt_client = mqtt_client
+        self.publisher = publisher if publisher is not None else CommandPublisher(mqtt_client) # Device commands (QoS and lane per command)
+        self.config = config
+        self.site_id = config.site_id
+        self.alarm_id = config.alarm_id
+        self.last_activity = clock.monotonic() # For idle eviction
+        # Held by the inbound worker while it handles a message and by tick(): all state below
+        # is mutated from both threads (reentrant: checkpoints are also taken during eviction)
+        self.lock = threading.RLock()
+        self.unloaded = False # Set under the lock when the site is evicted
         
         # Track helmet states
         self.helmet_states = {}  # {helmet_id: {'battery': int, 'led': int, 'position': tuple}}
         self.station_states = {} # {station_id: {...}}
         
-        # Load Site Vertices from Static CSV
-        site_csv_path = ROOT / "data" / "static" / "site.csv"
-        vertices = []
-        try:
-            with open(site_csv_path, newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    vertices.append(GPS(float(row["latitude"]), float(row["longitude"])))
-            
-            if len(vertices) != 4:
-                print("⚠️  Warning: site.csv does not have exactly 4 vertices. Using default hardcoded area.")
-                raise ValueError("Valid site.csv not found")
-                
-            print(f"✅ Loaded {len(vertices)} site vertices from {site_csv_path}")
-            self.site = Site(AreaVertices(vertices))
-            
-        except Exception as e:
-            print(f"⚠️  Failed to load site.csv: {e}. Using default values.")
-            # Fallback to hardcoded (100x100m approximate area)
-            # Try to get from env or use defaults
-            fallback_lat = float(os.getenv("SITE_ORIGIN_LAT", 45.156))
-            fallback_lon = float(os.getenv("SITE_ORIGIN_LON", 10.791))
-            
-            p1 = GPS(fallback_lat, fallback_lon)
-            p2 = GPS(fallback_lat, fallback_lon + 0.0012)
-            p3 = GPS(fallback_lat + 0.0009, fallback_lon + 0.0012)
-            p4 = GPS(fallback_lat + 0.0009, fallback_lon)
-            self.site = Site(AreaVertices([p1, p2, p3, p4]))
+        self.site = Site(AreaVertices(config.gps_vertices()))
 
-        self.site.create_grid(sector_size_meters=SECTOR_SIZE_METERS)
+        start = time.perf_counter()
+        cache_hit = self.site.load_or_create_grid(sector_size_meters=SECTOR_SIZE_METERS, cache_dir=GRID_CACHE_DIR)
+        print(
+            f"✅ Grid ready [{self.site_id}]: {len(self.site.grid)} sectors in {(time.perf_counter() - start) * 1000:.1f} ms "
+            f"({'cache hit' if cache_hit else 'computed'})"
+        )
+        self.grid_key = self.site.grid_cache_key(self.site.sector_size_meters) # Geometry + sector size: names this grid on the wire
         
         # Internal States for Tracking
         self.helmet_states = {} # {id: {latitude, longitude, battery, ...}}
         self.station_states = {} # {id: {latitude, longitude, is_dangerous, ...}}
-        self.station_danger_zones = {} # {station_id: [sector_id, ...]}
-        self.current_dangerous_sector_ids = set() # Set of sector IDs currently dangerous
+        # Danger state per sector index (see Site.sector_index); names only at display edges
+        n_sectors = len(self.site.grid)
+        self.station_danger_zones = {} # {station_id: np.array of sector indices}
+        self.danger_refcount = np.zeros(n_sectors, dtype=np.int32) # Dangerous stations covering each sector
+        self.danger_mask = np.zeros(n_sectors, dtype=bool) # Sectors currently dangerous
+        self.field_mask = np.zeros(n_sectors, dtype=bool) # Sectors applied to the danger field
         self.workers_in_danger = set() # Set of helmet_ids currently in danger
-        self.last_sent_zones = None # For optimization
+        self.last_sent_mask = np.zeros(n_sectors, dtype=bool) # Sectors the alarm display currently shows
+
+        # Distance (grid cells) to the nearest dangerous cell, for early warnings and reporting rates
+        cells = lambda meters: math.ceil(meters / self.site.sector_size_meters) if self.site.sector_size_meters else 0
+        self.warning_cells = cells(DANGER_WARNING_DISTANCE)
+        self.fast_rate_cells = cells(HELMET_FAST_DISTANCE) if ADAPTIVE_RATE else 0
+        self.danger_field = DangerDistanceField(*self.site.grid_shape, max_distance=max(self.warning_cells, self.fast_rate_cells))
+        self.workers_warned = set() # helmet_ids already warned while approaching danger
+        self.helmet_cells = {} # {helmet_id: (row, col) or None}, last known grid cell
+        self.helmet_intervals = {} # {helmet_id: seconds}, last reporting interval sent
+        self.last_seen = {} # {(device_type, device_id): time of the last telemetry or heartbeat}
+        self.edge_helmets = set() # helmet_ids geofencing themselves on the danger map (events, no sector lookup here)
+        self.danger_map_seq = 0
+        self.danger_map_dirty = True # Published from tick(), at most every DANGER_MAP_INTERVAL
+        self.danger_map_sent_at = 0.0
+        self.display_seq = 0 # Sequence number of the last display delta sent
+        self.display_dirty = False # Display changes waiting for tick() (low lane: one merged delta per tick)
         self.siren_active = False # To avoid redundant siren commands
+        self.exposure = SectorExposure(n_sectors, max_gap=EXPOSURE_MAX_GAP) # Heatmap accumulators
+        self.exposure_flushed_at = clock.monotonic()
+        self.dose = WorkerDose(
+            radius=DOSE_RADIUS, power=IDW_POWER, min_distance=IDW_MIN_DISTANCE,
+            noise_criterion=NOISE_DOSE_CRITERION, exchange_rate=NOISE_EXCHANGE_RATE,
+            dust_limit=DUST_TWA_LIMIT, shift_hours=DOSE_SHIFT_HOURS, max_step=EXPOSURE_MAX_GAP
+        )
+        self.dose_at = clock.monotonic()
+        bboxes = self.site.sector_bboxes
+        self.hazard = HazardField(
+            np.column_stack([(bboxes[:, 0] + bboxes[:, 2]) / 2, (bboxes[:, 1] + bboxes[:, 3]) / 2]),
+            {"dust": DUST_LIMIT, "noise": NOISE_LIMIT, "gas": GAS_LIMIT},
+            radius=HAZARD_RADIUS, power=IDW_POWER, min_distance=IDW_MIN_DISTANCE
+        )
+        self.hazard_flushed_at = clock.monotonic()
+
+        # Aggregated state for dashboards/tools (manager/site/state, manager/site/{site_id}/state)
+        topic = site_topic(f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}", self.site_id)
+        self.site_state_topic = f"{topic}/state"
+        self.sector_catalog_topic = f"{topic}/sectors"
+        self.danger_map_topic = f"{topic}/danger_map"
+        self.site_state = SiteStatePublisher(
+            lambda payload, retain: self.mqtt_client.publish(self.site_state_topic, payload, qos=1, retain=retain),
+            min_interval=SITE_STATE_INTERVAL,
+            full_interval=SITE_STATE_FULL_INTERVAL
+        )
         
+        # Buffered writes, flushed in one batch per tick
+        self.storage = open_storage(STORAGE_BACKEND, self.config.dynamic_dir, self.config.persist, history=STORAGE_HISTORY,
+                                    history_retention=HISTORY_RETENTION_DAYS * 86400)
         self._load_helmets_from_csv()
         self._load_stations_from_csv()
-        self.update_sectors_csv() # Initial save
-        self.update_helmets_csv() # Initial save with header
-        self.update_stations_csv() # Initial save with header
-        self.update_alarm_status_csv() # Initial save with header
-    
-    def on_connect(self, client, userdata, flags, rc):
-        """Callback when connected to MQTT broker"""
-        print(f"Manager connected with result code {rc}")
-        
-        if rc == 0:
-            # Subscribe to all device info (Retained, QoS 2)
-            info_pattern = f"{MQTT_BASIC_TOPIC}/+/+/info"
-            client.subscribe(info_pattern, qos=2)
-            print(f"✅ Subscribed to: {info_pattern}")
-
-            # Subscribe to all telemetry
-            telemetry_pattern = f"{MQTT_BASIC_TOPIC}/+/+/telemetry"
-            client.subscribe(telemetry_pattern, qos=1)
-            print(f"✅ Subscribed to: {telemetry_pattern}")
-        else:
-            print(f"❌ Connection failed with code {rc}")
-    
-    def on_message(self, client, userdata, message):
-        """Callback when message is received"""
-        try:
-            topic = message.topic
-            payload = json.loads(message.payload.decode("utf-8"))
-            
-            # Route message based on topic pattern
-            parts = topic.split('/')
-            if len(parts) < 3:
-                return
+        self.checkpoint_at = clock.monotonic() # Last checkpoint (or restore)
+        self.restored_from = None # Path of the checkpoint restored at startup
+        if CHECKPOINT_INTERVAL > 0 and self.config.persist:
+            self._restore_checkpoint()
+        for helmet_id, state in self.helmet_states.items():
+            self.site_state.update_helmet(helmet_id, state['latitude'], state['longitude'], state['battery'], state['led'])
+        # Initial save
+        now = clock.time()
+        self.storage.save_sectors(self.site.grid, self.danger_mask)
+        for helmet_id, state in self.helmet_states.items():
+            self.storage.upsert_helmet(helmet_id, state, now)
+        for station_id, state in self.station_states.items():
+            self.storage.upsert_station(station_id, state, now)
+        self.storage.set_alarm(self.alarm_id, self.siren_active, now)
+        self.flush_storage()
 
-            device_type = parts[-3]
-            device_id = parts[-2]
-            msg_type = parts[-1]
-
-            if msg_type == "info":
-                self._handle_info_message(device_type, device_id, payload)
-            elif msg_type == "telemetry":
-                # Parse SenML payload
-                data = self._parse_senml(payload)
-                data['id'] = device_id # Add ID for handler
-
-                if device_type == TOPIC_HELMET:
-                    self._handle_helmet_message(topic, data)
-                    self.update_helmets_csv()
-                elif device_type == TOPIC_STATION:
-                    self._handle_station_message(topic, data)
-                    self.update_stations_csv()
-            
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON decode error: {e}")
-        except Exception as e:
-            print(f"❌ Error processing message: {e}")
+        self._publish_sector_catalog()
 
-    def _parse_senml(self, payload):
-        """Extract name-value pairs from SenML list (handling hierarchical names)"""
-        data = {}
-        if isinstance(payload, list):
-            for entry in payload:
-                name = entry.get('n', '')
-                value = entry.get('v')
-                if not name: continue
+    def _publish_sector_catalog(self):
+        """
+        Retained index -> sector ID table. Zone lists on the wire are sector indices;
+        consumers use this catalog to show names.
+        """
+        payload = {
+            "grid": self.grid_key,
+            "sectors": [sector.id for sector in self.site.grid]
+        }
+        self.mqtt_client.publish(self.sector_catalog_topic, json.dumps(payload, separators=(",", ":")), qos=1, retain=True)
+        print(f"✅ Sector catalog ({len(self.site.grid)} sectors) published to: {self.sector_catalog_topic}")
 
-                # Map hierarchical names back to flat keys for internal handlers
-                if 'gps.lat' in name: data['latitude'] = value
-                elif 'gps.lon' in name: data['longitude'] = value
-                elif 'sensor.battery' in name: data['battery'] = value
-                elif 'actuator.led' in name: data['led'] = value
-                elif 'sensor.dust' in name: data['dust'] = value
-                elif 'sensor.noise' in name: data['noise'] = value
-                elif 'sensor.gas' in name: data['gas'] = value
-                else: data[name] = value # Fallback
-        return data
+    def _publish_danger_map(self):
+        """
+        Retained compact danger map: grid geometry (local frame + projection) and one bit
+        per grid cell (row-major, MSB first), so helmets can geofence with O(1) math.
+        """
+        site = self.site
+        self.danger_map_dirty = False # Before the snapshot: a change made meanwhile marks it dirty again
+        self.danger_map_seq += 1
+        payload = {
+            "seq": self.danger_map_seq,
+            "grid": self.grid_key,
+            "origin": list(site.projection.params()),
+            "m_per_deg": [site.projection.m_per_deg_lat, site.projection.m_per_deg_lon],
+            "grid_origin": list(site.grid_origin),
+            "step": list(site.grid_step),
+            "shape": list(site.grid_shape),
+            "bits": base64.b64encode(np.packbits(self.danger_field.dangerous.ravel()).tobytes()).decode("ascii"),
+            "timestamp": clock.time()
+        }
+        self.mqtt_client.publish(self.danger_map_topic, json.dumps(payload, separators=(",", ":")), qos=1, retain=True)
+        self.danger_map_sent_at = clock.monotonic()
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("🗺️  Danger map published", extra={"fields": {"site": self.site_id, "seq": self.danger_map_seq}})
 
-    def _handle_info_message(self, device_type, device_id, payload):
-        """Track active devices and their metadata (Discovery)"""
-        if not hasattr(self, 'discovered_devices'):
-            self.discovered_devices = {}
-        
-        self.discovered_devices[device_id] = payload
-        print(f"[MGR] 🚀 DEVICE DISCOVERED | ID: {device_id} | Type: {device_type} | SW: {payload.get('software_version')}")
+    def handle_telemetry(self, device_type, topic, data):
+        """Route decoded telemetry of a device of this site"""
+        self.last_activity = clock.monotonic()
+        self.last_seen[(device_type, data.get('id'))] = clock.time()
+        device_id = data.get('id')
+        self.storage.record_telemetry(device_type, device_id, clock.time(), data)
+        if device_type == TOPIC_HELMET:
+            self._handle_helmet_message(topic, data)
+            if device_id in self.helmet_states:
+                self.storage.upsert_helmet(device_id, self.helmet_states[device_id], clock.time())
+        elif device_type == TOPIC_STATION:
+            self._handle_station_message(topic, data)
+            if device_id in self.station_states:
+                self.storage.upsert_station(device_id, self.station_states[device_id], clock.time())
+
+    def handle_heartbeat(self, device_type, device_id):
+        """Device alive, readings unchanged since its last telemetry: no geofence/danger work"""
+        self.last_activity = clock.monotonic()
+        self.last_seen[(device_type, device_id)] = clock.time()
+        if device_type == TOPIC_HELMET:
+            self.exposure.heartbeat(device_id, clock.time(), self.danger_mask)
 
+    def handle_info(self, device_type, device_id, payload):
+        """Device (re)announced itself on this site"""
+        self.last_activity = clock.monotonic()
+        if device_type == TOPIC_ALARM:
+            # (Re)started alarm: bring its display (and a siren restored from a checkpoint) in sync
+            self._send_alarm_display_full(device_id)
+            if self.siren_active:
+                self._send_alarm_command(device_id, "turn_siren_on")
+        elif device_type == TOPIC_HELMET:
+            # (Re)started helmet reports at its default rate until told otherwise
+            self.helmet_intervals.pop(device_id, None)
+            if "edge_geofence" in payload.get("capabilities", ()):
+                self.edge_helmets.add(device_id)
+            else:
+                self.edge_helmets.discard(device_id)
+
+    def handle_event(self, device_type, device_id, payload):
+        """Events evaluated on the device (edge geofencing: danger_enter / danger_exit)"""
+        self.last_activity = clock.monotonic()
+        event = payload.get("event")
+        if device_type != TOPIC_HELMET or event not in ("danger_enter", "danger_exit"):
+            return
+        if not EDGE_GEOFENCE or device_id not in self.edge_helmets:
+            return # Geofenced here from its telemetry
+        if payload.get("grid") != self.grid_key:
+            # Decided on another site's map (or another grid): its cells mean nothing here.
+            # Geofence this helmet from its telemetry until it announces itself again.
+            self.edge_helmets.discard(device_id)
+            MESSAGE_ERRORS_TOTAL.inc("grid_mismatch")
+            LOG_HELMET.warning("⚠️  Danger event for another grid ignored", extra={"fields": {
+                "id": device_id, "site": self.site_id, "grid": payload.get("grid")}})
+            return
+        self._set_worker_danger(device_id, event == "danger_enter", payload.get("cell"))
+        self._update_siren()
     def _handle_station_message(self, topic, payload):
         """Process station telemetry"""
         station_id = payload.get('id')
@@ -206,18 +409,7 @@ class DataCollectorManager:
         lon = float(payload.get('longitude', 0))
 
         # Check thresholds
-        is_dangerous = False
-        danger_reasons = []
-        
-        if dust > DUST_LIMIT:
-            is_dangerous = True
-            danger_reasons.append(f"Dust ({dust})")
-        if noise > NOISE_LIMIT:
-            is_dangerous = True
-            danger_reasons.append(f"Noise ({noise})")
-        if gas > GAS_LIMIT:
-            is_dangerous = True
-            danger_reasons.append(f"Gas ({gas})")
+        is_dangerous = dust > DUST_LIMIT or noise > NOISE_LIMIT or gas > GAS_LIMIT
 
         # Dynamic Grid Update
         if station_id not in self.station_states:
@@ -232,17 +424,25 @@ class DataCollectorManager:
             'is_dangerous': is_dangerous
         })
         
-        self._update_station_danger_zone(station_id, lat, lon, is_dangerous)
+        east, north = self.site.to_local(lat, lon)
+        with DANGER_ZONE_SECONDS.time():
+            self.hazard.update_station(station_id, east, north, {"dust": dust, "noise": noise, "gas": gas})
+            self._update_station_danger_zone(station_id, lat, lon, is_dangerous)
+        self.dose.update_station(station_id, east, north, dust, noise)
+        self.site_state.update_station(station_id, lat, lon, dust, noise, gas, is_dangerous)
 
-        status_icon = "🟢" if not is_dangerous else "🔴"
-        print(
-            f"[MGR] 📥 RECV Station {station_id} | "
-            f"{status_icon} Status | "
-            f"Dust: {dust:5.1f}, Noise: {noise:5.1f}, Gas: {gas:4.2f}"
-        )
+        if LOG_STATION.isEnabledFor(logging.DEBUG):
+            LOG_STATION.debug("📥 RECV Station", extra={"fields": {
+                "id": station_id, "dangerous": is_dangerous,
+                "dust": round(dust, 1), "noise": round(noise, 1), "gas": round(gas, 2)}})
 
-        if is_dangerous:
-             print(f"    ⚠️  DANGER DETAIL: {', '.join(danger_reasons)}")
+        if is_dangerous and LOG_STATION.isEnabledFor(logging.DEBUG):
+            danger_reasons = [
+                name for name, value, limit in (
+                    ("dust", dust, DUST_LIMIT), ("noise", noise, NOISE_LIMIT), ("gas", gas, GAS_LIMIT))
+                if value > limit
+            ]
+            LOG_STATION.debug("⚠️  DANGER DETAIL", extra={"fields": {"id": station_id, "reasons": ",".join(danger_reasons)}})
 
     def _update_station_danger_zone(self, station_id, lat, lon, is_dangerous):
         """
@@ -252,52 +452,125 @@ class DataCollectorManager:
         If new readings are dangerous, we mark sectors within 10m radius.
         """
         # 1. Clear previous danger zones for this station
-        if station_id in self.station_danger_zones:
-            old_sector_ids = self.station_danger_zones[station_id]
-            for s_id in old_sector_ids:
-                if s_id in self.current_dangerous_sector_ids:
-                    self.current_dangerous_sector_ids.remove(s_id)
-            del self.station_danger_zones[station_id]
+        old_indices = self.station_danger_zones.pop(station_id, None)
+        if old_indices is not None:
+            self.danger_refcount[old_indices] -= 1
+        if (old_indices is not None) != is_dangerous:
+            self.storage.record_event(clock.time(), "station_danger" if is_dangerous else "station_clear", station_id)
 
         # 2. If dangerous, calculate new sectors and mark them
         if is_dangerous:
             affected_sectors = self.site.get_sectors_in_radius(lat, lon, float(MONITORING_STATION_RANGE))
-            affected_ids = []
-            
-            for sector in affected_sectors:
-                self.current_dangerous_sector_ids.add(sector.id)
-                affected_ids.append(sector.id)
-            
-            self.station_danger_zones[station_id] = affected_ids
+            indices = np.fromiter((sector.index for sector in affected_sectors), dtype=np.intp)
+            self.danger_refcount[indices] += 1 # Indices are unique per station
+            self.station_danger_zones[station_id] = indices
+
+        self._compute_danger_mask()
         
-        # 3. Send updated list of dangerous zones to Alarm Display ONLY if changed
-        all_dangerous_zones = sorted(list(self.current_dangerous_sector_ids))
+        # 3. Propagate the changes (field, helmets, site state, alarm display)
+        changed = self.danger_mask ^ self.field_mask
         
-        # Compare with last sent
-        if self.last_sent_zones != all_dangerous_zones:
-            self.last_sent_zones = all_dangerous_zones
-            self._send_alarm_display_update("alarm_001", all_dangerous_zones)
-            self.update_sectors_csv() # Update CSV on change
+        if changed.any():
+            to_add = np.flatnonzero(changed & self.danger_mask).tolist()
+            to_remove = np.flatnonzero(changed & self.field_mask).tolist()
+            self.field_mask[:] = self.danger_mask
+            self._update_danger_field(to_add, to_remove)
+            self.danger_map_dirty = True
+            # Helmets that are now closer to / farther from danger change rate without waiting for their next report
+            for helmet_id in list(self.helmet_cells):
+                self._update_report_interval(helmet_id)
+            self.site_state.set_zones(np.flatnonzero(self.danger_mask).tolist())
+            if self.publisher.lane("update_display_delta") == LANE_LOW:
+                self.display_dirty = True # Merged with other changes until the next tick
+            else:
+                self._flush_alarm_display()
+            self.storage.update_sectors(np.flatnonzero(changed), self.danger_mask)
         else:
             # print(f"    [MGR] ℹ️  Zones unchanged, skipping update")
             pass
 
-    def _send_alarm_display_update(self, alarm_id, zones):
+    def _compute_danger_mask(self):
+        """
+        DANGER_CRITERION station: a sector is dangerous while at least one dangerous station covers it.
+        hazard: while its interpolated hazard index is at least HAZARD_DANGER_LEVEL. both: either.
+        """
+        if DANGER_CRITERION == "hazard":
+            np.greater_equal(self.hazard.index, HAZARD_DANGER_LEVEL, out=self.danger_mask)
+            return
+        np.greater(self.danger_refcount, 0, out=self.danger_mask)
+        if DANGER_CRITERION == "both":
+            self.danger_mask |= self.hazard.index >= HAZARD_DANGER_LEVEL
+
+    def _update_danger_field(self, added_sectors, removed_sectors):
+        """
+        Propagate sector danger changes to the grid cells of the distance field.
+        A cell is dangerous while any sector clipped from it is dangerous.
+        """
+        rows, cols = self.site.sector_rows, self.site.sector_cols
+        removed = [
+            (r, c) for r, c in set(zip(rows[removed_sectors].tolist(), cols[removed_sectors].tolist()))
+            if not any(self.danger_mask[s.index] for s in self.site.cell_sectors[(r, c)])
+        ]
+        self.danger_field.update(
+            (rows[added_sectors], cols[added_sectors]),
+            ([r for r, _ in removed], [c for _, c in removed])
+        )
+
+    def _flush_alarm_display(self):
+        """Send what changed since the display was last updated as a single delta"""
+        self.display_dirty = False
+        changed = self.danger_mask ^ self.last_sent_mask
+        if not changed.any():
+            return # Changes cancelled each other out
+        to_add = np.flatnonzero(changed & self.danger_mask).tolist()
+        to_remove = np.flatnonzero(changed & self.last_sent_mask).tolist()
+        self.last_sent_mask[:] = self.danger_mask
+        self._send_alarm_display_delta(self.alarm_id, to_add, to_remove)
+
+    def _send_alarm_display_delta(self, alarm_id, to_add, to_remove):
         """
-        Send list of dangerous zones to alarm display
+        Send the sector indices added/removed since the previous update.
+        seq increases by one per delta, so the alarm can detect a gap and ask for a resync.
         """
         command_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_ALARM}/{alarm_id}/command"
+        self.display_seq += 1
+        
+        payload = {
+            "command": "update_display_delta",
+            "seq": self.display_seq,
+            "add": to_add,
+            "remove": to_remove,
+            "timestamp": clock.time()
+        }
+        
+        payload_json = json.dumps(payload)
+        
+        self.publisher.publish(command_topic, payload_json, "update_display_delta")
+        if LOG_ALARM.isEnabledFor(logging.INFO):
+            LOG_ALARM.info("📤 CMD SENT update_display_delta", extra={"fields": {
+                "alarm": alarm_id, "seq": self.display_seq, "add": len(to_add), "remove": len(to_remove)}})
+
+    def _send_alarm_display_full(self, alarm_id):
+        """
+        Send the full list of dangerous sector indices (resync).
+        Carries the current seq: the next delta will be seq + 1.
+        """
+        command_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_ALARM}/{alarm_id}/command"
+        zones = np.flatnonzero(self.last_sent_mask).tolist()
         
         payload = {
             "command": "update_display",
+            "seq": self.display_seq,
             "zones": zones,
-            "timestamp": time.time()
+            "timestamp": clock.time()
         }
         
         payload_json = json.dumps(payload)
         
-        self.mqtt_client.publish(command_topic, payload_json, qos=2, retain=False)
-        print(f"    [MGR] 📤 CMD SENT to Alarm {alarm_id} | Update Zones: {zones}")
+        self.publisher.publish(command_topic, payload_json, "update_display")
+        if LOG_ALARM.isEnabledFor(logging.INFO):
+            LOG_ALARM.info("📤 CMD SENT update_display (resync)", extra={"fields": {
+                "alarm": alarm_id, "seq": self.display_seq, "zones": len(zones)}})
 
 
     def _send_alarm_command(self, alarm_id, command):
@@ -309,17 +582,17 @@ class DataCollectorManager:
         
         payload = {
             "command": command,
-            "timestamp": time.time()
+            "timestamp": clock.time()
         }
         
         payload_json = json.dumps(payload)
         
-        result = self.mqtt_client.publish(command_topic, payload_json, qos=2, retain=False)
+        result = self.publisher.publish(command_topic, payload_json, command)
         
         if result.rc == 0:
             pass # print(f"🚨 Command sent to alarm {alarm_id}: {command}")
         else:
-            print(f"❌ Failed to send command to alarm {alarm_id}")
+            LOG_ALARM.error("❌ Failed to send command to alarm", extra={"fields": {"alarm": alarm_id, "command": command}})
 
     def _handle_helmet_message(self, topic, payload):
         """Process helmet telemetry and apply business logic"""
@@ -343,55 +616,166 @@ class DataCollectorManager:
             'longitude': lon
         })
         
+        self.site_state.update_helmet(helmet_id, lat, lon, battery, led_status)
+
         # Apply business logic
         self._check_helmet_battery(helmet_id, battery, led_status)
-        self._check_worker_safety(helmet_id, lat, lon)
+        with GEOFENCE_SECONDS.time():
+            sector = self._check_worker_safety(helmet_id, lat, lon)
+        self._update_report_interval(helmet_id)
 
-        print(
-            f"[MGR] 📥 RECV Helmet  {helmet_id} | "
-            f"Bat: {battery:3d}% | "
-            f"LED: {led_status} | "
-            f"Pos: ({lat:.5f}, {lon:.5f})"
-        )
+        # Heatmap: a charging helmet is not on a worker
+        if led_status == 1:
+            sector = NO_SECTOR
+        self.exposure.observe(helmet_id, clock.time(), sector, sector != NO_SECTOR and self.danger_mask[sector])
+
+        if LOG_HELMET.isEnabledFor(logging.DEBUG):
+            LOG_HELMET.debug("📥 RECV Helmet", extra={"fields": {
+                "id": helmet_id, "battery": battery, "led": led_status, "lat": lat, "lon": lon}})
 
     def _check_worker_safety(self, helmet_id, lat, lon):
         """
-        Check if worker is in a dangerous sector
+        Check if worker is in a dangerous sector.
+        Returns the index of the sector the helmet is in (NO_SECTOR outside the site).
         """
         if lat is None or lon is None:
-            return
+            return NO_SECTOR
 
-        if lat is None or lon is None:
-            return
+        east, north = self.site.to_local(lat, lon) # Projected once, reused below
+        cell = self.site.cell_at(east, north)
+        self.helmet_cells[helmet_id] = cell
 
-        sector = self.site.get_sector_by_coords(lat, lon)
-        in_danger = False
-        
-        if sector and sector.id in self.current_dangerous_sector_ids:
-            in_danger = True
+        if EDGE_GEOFENCE and helmet_id in self.edge_helmets:
+            # The helmet checks its own cell on the danger map and reports entry/exit events
             if helmet_id not in self.workers_in_danger:
-                print(f"🚨 ALERT: Worker {helmet_id} entered DANGEROUS Sector ({sector.id})!")
-                self.workers_in_danger.add(helmet_id)
+                self._check_worker_proximity(helmet_id, cell)
+            return self.site.sector_index_at(east, north)
+
+        sector = self.site.get_sector_at(east, north)
+        if sector and self.danger_mask[sector.index]:
+            self._set_worker_danger(helmet_id, True, sector.id)
         else:
-            if helmet_id in self.workers_in_danger:
-                 print(f"✅ Worker {helmet_id} left dangerous sector")
-                 self.workers_in_danger.remove(helmet_id)
+            self._set_worker_danger(helmet_id, False)
+            self._check_worker_proximity(helmet_id, cell)
+        self._update_siren()
+        return sector.index if sector else NO_SECTOR
+
+    def _set_worker_danger(self, helmet_id, in_danger, where=None):
+        if in_danger:
+            self.workers_warned.add(helmet_id) # No "approaching" warning while inside
+            if helmet_id not in self.workers_in_danger:
+                LOG_HELMET.warning("🚨 ALERT: Worker entered DANGEROUS sector", extra={"fields": {"id": helmet_id, "sector": where}})
+                self.workers_in_danger.add(helmet_id)
+                self.storage.record_event(clock.time(), "danger_enter", helmet_id, {"sector": where} if where else None)
+        elif helmet_id in self.workers_in_danger:
+            LOG_HELMET.info("✅ Worker left dangerous sector", extra={"fields": {"id": helmet_id}})
+            self.workers_in_danger.remove(helmet_id)
+            self.storage.record_event(clock.time(), "danger_exit", helmet_id)
 
-        # Update Siren State based on global danger
+    def _update_siren(self):
+        """Siren on while at least one worker is in danger"""
         should_siren_be_on = len(self.workers_in_danger) > 0
         
         if should_siren_be_on and not self.siren_active:
-            print(f"📢 DANGER ACTIVE (Workers: {len(self.workers_in_danger)}) -> SIREN ON")
-            self._send_alarm_command("alarm_001", "turn_siren_on")
+            LOG_ALARM.warning("📢 DANGER ACTIVE -> SIREN ON", extra={"fields": {"workers": len(self.workers_in_danger)}})
+            self._send_alarm_command(self.alarm_id, "turn_siren_on")
             self.siren_active = True
-            self.update_alarm_status_csv()  # Update alarm status file
+            self.storage.set_alarm(self.alarm_id, True, clock.time())
+            self.storage.record_event(clock.time(), "siren_on", self.alarm_id, {"workers": len(self.workers_in_danger)})
             
         elif not should_siren_be_on and self.siren_active:
-            print(f"🟢 ALL CLEAR -> SIREN OFF")
-            self._send_alarm_command("alarm_001", "turn_siren_off")
+            LOG_ALARM.info("🟢 ALL CLEAR -> SIREN OFF")
+            self._send_alarm_command(self.alarm_id, "turn_siren_off")
             self.siren_active = False
-            self.update_alarm_status_csv()  # Update alarm status file
+            self.storage.set_alarm(self.alarm_id, False, clock.time())
+            self.storage.record_event(clock.time(), "siren_off", self.alarm_id)
+
+        self.site_state.set_siren(self.siren_active, len(self.workers_in_danger))
     
+    def _check_worker_proximity(self, helmet_id, cell):
+        """
+        Early warning: alert the helmet once when it gets within
+        DANGER_WARNING_DISTANCE of a dangerous sector (O(1) field lookup)
+        """
+        field = self.danger_field
+        if self.warning_cells == 0:
+            return
+
+        distance = field.distance_at(*cell) if cell else field.far
+        if distance > self.warning_cells:
+            self.workers_warned.discard(helmet_id) # Out of range: warn again next time
+            return
+
+        if helmet_id not in self.workers_warned:
+            self.workers_warned.add(helmet_id)
+            distance_m = distance * self.site.sector_size_meters
+            LOG_HELMET.warning("⚠️  Worker approaching DANGEROUS sector", extra={"fields": {"id": helmet_id, "distance_m": distance_m}})
+            self._send_helmet_alert(helmet_id, f"Dangerous area within {distance_m:g} m", distance_m)
+            self.storage.record_event(clock.time(), "warning", helmet_id, {"distance_m": distance_m})
+
+    def _choose_report_interval(self, helmet_id):
+        """
+        Reporting interval for a helmet:
+        - FAST inside or within HELMET_FAST_DISTANCE of a dangerous sector
+        - SLOW while charging (stationary at the charger)
+        - NORMAL when the battery is getting low
+        - SLOW otherwise
+        """
+        cell = self.helmet_cells.get(helmet_id)
+        distance = self.danger_field.distance_at(*cell) if cell else self.danger_field.far
+        if helmet_id in self.workers_in_danger or distance <= self.fast_rate_cells:
+            return HELMET_INTERVAL_FAST
+
+        state = self.helmet_states.get(helmet_id, {})
+        if state.get('led') == 1:
+            return HELMET_INTERVAL_SLOW
+        battery = state.get('battery')
+        if battery is not None and battery <= 2 * BATTERY_LOW_LIMIT:
+            return HELMET_INTERVAL_NORMAL
+        return HELMET_INTERVAL_SLOW
+
+    def _update_report_interval(self, helmet_id):
+        """Send set_interval when the helmet's reporting interval should change"""
+        if not ADAPTIVE_RATE:
+            return
+        interval = self._choose_report_interval(helmet_id)
+        if self.helmet_intervals.get(helmet_id) == interval:
+            return
+
+        command_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_HELMET}/{helmet_id}/command"
+        payload = {
+            "command": "set_interval",
+            "interval": interval,
+            "timestamp": clock.time()
+        }
+        # Only the latest interval matters: a queued one is replaced, not sent twice
+        result = self.publisher.publish(command_topic, json.dumps(payload), "set_interval", conflate=True)
+        if result.rc == 0:
+            self.helmet_intervals[helmet_id] = interval
+            if LOG_HELMET.isEnabledFor(logging.DEBUG):
+                LOG_HELMET.debug("📤 CMD SENT set_interval", extra={"fields": {"id": helmet_id, "interval": interval}})
+        else:
+            LOG_HELMET.error("❌ Failed to send set_interval to helmet", extra={"fields": {"id": helmet_id}})
+
+    def _send_helmet_alert(self, helmet_id, message, distance_m):
+        """Send an alert command (early warning) to a specific helmet"""
+        command_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_HELMET}/{helmet_id}/command"
+
+        payload = {
+            "command": "alert",
+            "level": "warning",
+            "message": message,
+            "distance_m": distance_m,
+            "timestamp": clock.time()
+        }
+
+        result = self.publisher.publish(command_topic, json.dumps(payload), "alert")
+        if result.rc == 0:
+            DANGER_WARNINGS_TOTAL.inc()
+        else:
+            LOG_HELMET.error("❌ Failed to send alert to helmet", extra={"fields": {"id": helmet_id}})
+        return result
+
     def _check_helmet_battery(self, helmet_id, battery, current_led_status):
         """
         Business Logic: Battery monitoring
@@ -404,13 +788,15 @@ class DataCollectorManager:
         
         # Battery LOW: activate charging mode (LED ON)
         if battery < BATTERY_LOW_LIMIT and current_led_status == 0:
-            print(f"    🔋 LOW BATTERY ({battery}%) -> CMD: CHARGE ON")
+            LOG_HELMET.info("🔋 LOW BATTERY -> CMD: CHARGE ON", extra={"fields": {"id": helmet_id, "battery": battery}})
             self._send_led_command(helmet_id, 1)
+            self.storage.record_event(clock.time(), "charge_on", helmet_id, {"battery": battery})
         
         # Battery FULL: deactivate charging mode (LED OFF)
         elif battery >= BATTERY_FULL_LIMIT and current_led_status == 1:
-            print(f"    🔋 BATTERY FULL ({battery}%) -> CMD: CHARGE OFF")
+            LOG_HELMET.info("🔋 BATTERY FULL -> CMD: CHARGE OFF", extra={"fields": {"id": helmet_id, "battery": battery}})
             self._send_led_command(helmet_id, 0)
+            self.storage.record_event(clock.time(), "charge_off", helmet_id, {"battery": battery})
         
         else:
             # print(f"ℹ️  Helmet {helmet_id}: Battery={battery}%, LED={current_led_status} (no action needed)")
@@ -430,69 +816,235 @@ class DataCollectorManager:
         payload = {
             "command": "set_led",
             "led": led_status,
-            "timestamp": time.time()
+            "timestamp": clock.time()
         }
         
         payload_json = json.dumps(payload)
         
         # Publish command
-        result = self.mqtt_client.publish(command_topic, payload_json, qos=2, retain=False)
+        result = self.publisher.publish(command_topic, payload_json, "set_led")
         
         if result.rc == 0:
-            print(f"    [MGR] 📤 CMD SENT to Helmet {helmet_id}: {payload_json}")
+            if LOG_HELMET.isEnabledFor(logging.DEBUG):
+                LOG_HELMET.debug("📤 CMD SENT set_led", extra={"fields": {"id": helmet_id, "led": led_status}})
         else:
-            print(f"❌ Failed to send command to helmet {helmet_id}")
+            LOG_HELMET.error("❌ Failed to send command to helmet", extra={"fields": {"id": helmet_id}})
         
         return result
     
-    def get_helmet_status(self, helmet_id):
-        """Get current status of a helmet"""
-        return self.helmet_states.get(helmet_id, {})
+    def tick(self):
+        """Periodic per-site housekeeping (called by DataCollectorManager.tick)"""
+        with self.lock: # The inbound worker waits: no message is applied halfway through a flush
+            self.site_state.flush()
+            if self.display_dirty:
+                self._flush_alarm_display()
+            if self.danger_map_dirty and clock.monotonic() - self.danger_map_sent_at >= DANGER_MAP_INTERVAL:
+                self._publish_danger_map()
+            if self.exposure.dirty and clock.monotonic() - self.exposure_flushed_at >= EXPOSURE_FLUSH_INTERVAL:
+                self.flush_exposure()
+            if DOSE_INTERVAL > 0 and clock.monotonic() - self.dose_at >= DOSE_INTERVAL:
+                self.integrate_doses()
+            if self.hazard.dirty and clock.monotonic() - self.hazard_flushed_at >= HAZARD_FLUSH_INTERVAL:
+                self.flush_hazard()
+            self.flush_storage()
+        if (CHECKPOINT_INTERVAL > 0 and self.last_activity > self.checkpoint_at
+                and clock.monotonic() - self.checkpoint_at >= CHECKPOINT_INTERVAL):
+            self.save_checkpoint()
 
-    def update_sectors_csv(self):
-        """
-        Saves the current grid to map.csv with STATUS.
-        Format: id, vertices_json, status
-        status: 0 = SAFE, 1 = DANGEROUS
-        """
-        import csv
-        filepath = ROOT / "data" / "dynamic" / "map.csv"
+    def flush_storage(self):
+        """Write the changes buffered since the last tick in one batch"""
         try:
-            with open(filepath, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["id", "vertices_json", "status"])
-                for sector in self.site.grid:
-                    is_dangerous = 1 if sector.id in self.current_dangerous_sector_ids else 0
-                    coords = [[p.latitude, p.longitude] for p in sector.area_vertices.vertices]
-                    writer.writerow([sector.id, json.dumps(coords), is_dangerous])
-            # print(f"    [MGR] 💾 Saved map.csv")
+            with PERSISTENCE_SECONDS.time(self.storage.name):
+                self.storage.flush()
         except Exception as e:
-            print(f"❌ Failed to save map.csv: {e}")
+            LOG_STORAGE.error("❌ Failed to write live state", extra={"fields": {"site": self.site_id, "backend": self.storage.name, "error": e}})
+
+    def flush_exposure(self):
+        """Hand the heatmap accumulators to storage (written with the next storage flush)"""
+        self.exposure.dirty = False
+        occupancy, danger = self.exposure.minutes()
+        now = clock.time()
+        self.storage.save_sector_layer("occupancy", occupancy, now, since=self.exposure.since)
+        self.storage.save_sector_layer("danger_exposure", danger, now, since=self.exposure.since)
+        self.exposure_flushed_at = clock.monotonic()
+
+    def flush_hazard(self):
+        """Hand the interpolated hazard layers (index, dust, noise, gas) to storage"""
+        self.hazard.dirty = False
+        now = clock.time()
+        for name, values in self.hazard.layers().items():
+            self.storage.save_sector_layer(name, values, now)
+        self.hazard_flushed_at = clock.monotonic()
+
+    def integrate_doses(self):
+        """
+        One integration step for every active helmet (seen within EXPOSURE_MAX_GAP, not charging):
+        one vectorized helmet-station join, then dose limits are flagged
+        """
+        self.dose_at = clock.monotonic()
+        now = clock.time()
+        shift = math.floor((now - DOSE_RESET_HOUR * 3600) / 86400)
+        if self.dose.shift != shift:
+            if self.dose.shift is not None:
+                LOG.info("🔄 New shift: worker doses reset", extra={"fields": {"site": self.site_id}})
+            self.dose.reset(shift)
+
+        cutoff = now - EXPOSURE_MAX_GAP
+        ids, lats, lons = [], [], []
+        for helmet_id, state in list(self.helmet_states.items()):
+            if state.get('led') == 1 or state.get('latitude') is None or state.get('longitude') is None:
+                continue
+            if self.last_seen.get((TOPIC_HELMET, helmet_id), 0) < cutoff:
+                continue
+            ids.append(helmet_id)
+            lats.append(state['latitude'])
+            lons.append(state['longitude'])
+
+        with DOSE_SECONDS.time():
+            east, north = self.site.to_local(np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64))
+            crossed = self.dose.integrate(now, ids, east, north)
+        for helmet_id, quantity, value in crossed:
+            self._flag_dose_limit(helmet_id, quantity, value)
+        if ids or crossed:
+            self.storage.save_worker_doses(self.dose.doses(), now)
+
+    def _flag_dose_limit(self, helmet_id, quantity, value):
+        """A worker reached the shift limit for noise dose or dust exposure (once per shift)"""
+        LOG_HELMET.warning("☣️  Worker reached the shift dose limit", extra={"fields": {
+            "id": helmet_id, "quantity": quantity, "value": round(value, 3)}})
+        DOSE_LIMITS_TOTAL.inc(quantity)
+        self.storage.record_event(clock.time(), "dose_limit", helmet_id, {"quantity": quantity, "value": round(value, 3)})
+
+        command_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_MANAGER}/{TOPIC_HELMET}/{helmet_id}/command"
+        message = "Noise dose limit reached" if quantity == "noise" else "Dust exposure limit reached"
+        payload = {
+            "command": "alert",
+            "level": "dose",
+            "message": message,
+            "quantity": quantity,
+            "value": round(value, 3),
+            "timestamp": clock.time()
+        }
+        result = self.publisher.publish(command_topic, json.dumps(payload), "alert")
+        if result.rc != 0:
+            LOG_HELMET.error("❌ Failed to send dose alert to helmet", extra={"fields": {"id": helmet_id}})
+
+    # --- Checkpoints (warm restart) ---
 
-    def update_helmets_csv(self):
+    def checkpoint_state(self):
         """
-        Saves current helmet positions and states to helmets.csv
-        Format: id, latitude, longitude, battery, is_dangerous
+        Everything the safety decisions depend on. Call with self.lock held (one consistent
+        state); the copies let the worker thread go on while the snapshot is pickled.
         """
-        import csv
-        filepath = ROOT / "data" / "dynamic" / "helmets.csv"
+        return {
+            "version": CHECKPOINT_VERSION,
+            "site_id": self.site_id,
+            "grid": self.grid_key,
+            "saved_at": clock.time(),
+            "helmet_states": {k: dict(v) for k, v in list(self.helmet_states.items())},
+            "station_states": {k: dict(v) for k, v in list(self.station_states.items())},
+            "station_danger_zones": dict(self.station_danger_zones),
+            "last_sent_mask": self.last_sent_mask.copy(),
+            "workers_in_danger": set(self.workers_in_danger),
+            "workers_warned": set(self.workers_warned),
+            "edge_helmets": set(self.edge_helmets),
+            "helmet_cells": dict(self.helmet_cells),
+            "helmet_intervals": dict(self.helmet_intervals),
+            "last_seen": dict(self.last_seen),
+            "siren_active": self.siren_active,
+            "display_seq": self.display_seq,
+            "danger_map_seq": self.danger_map_seq,
+            "exposure": self.exposure.state(),
+            "dose": self.dose.state()
+        }
+
+    def save_checkpoint(self):
+        """Write an atomic checkpoint of this site (errors are logged, never raised)"""
+        if not self.config.persist:
+            return None
+        self.checkpoint_at = clock.monotonic()
         try:
-            with open(filepath, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["id", "latitude", "longitude", "battery", "led"])
-                for helmet_id, state in self.helmet_states.items():
-                    lat = state.get("latitude", 0)
-                    lon = state.get("longitude", 0)
-                    battery = state.get("battery", 0)
-                    led = state.get("led", 0)
-                    writer.writerow([helmet_id, lat, lon, battery, led])
-            # print(f"    [MGR] 💾 Saved helmets.csv")
+            with PERSISTENCE_SECONDS.time("checkpoint"):
+                with self.lock: # No message applied halfway through the copy
+                    state = self.checkpoint_state()
+                return write_checkpoint(CHECKPOINT_DIR, self.site_id, state, keep=CHECKPOINT_KEEP)
         except Exception as e:
-            print(f"❌ Failed to save helmets.csv: {e}")
+            LOG_STORAGE.error("❌ Checkpoint failed", extra={"fields": {"site": self.site_id, "error": e}})
+            return None
+
+    def _accept_checkpoint(self, state):
+        if not isinstance(state, dict) or state.get("version") != CHECKPOINT_VERSION:
+            return False
+        if state.get("site_id") != self.site_id:
+            return False
+        if state.get("grid") != self.grid_key:
+            return False # Other geometry or sector size: sector indices don't match
+        age = clock.time() - state.get("saved_at", 0)
+        return CHECKPOINT_MAX_AGE <= 0 or age <= CHECKPOINT_MAX_AGE
+
+    def _restore_checkpoint(self):
+        """Restore the newest valid checkpoint (falls back to the CSV seeds when there is none)"""
+        start = time.perf_counter()
+        state, path = load_latest_checkpoint(CHECKPOINT_DIR, self.site_id, accept=self._accept_checkpoint)
+        if state is None:
+            return False
+
+        self.helmet_states.update(state["helmet_states"])
+        self.station_states.update(state["station_states"])
+        # Refcounts are derived from the zones, never restored as stored
+        self.station_danger_zones = state["station_danger_zones"]
+        self.danger_refcount[:] = 0
+        for indices in self.station_danger_zones.values():
+            self.danger_refcount[indices] += 1 # Indices are unique per station
+        for station_id, s in self.station_states.items():
+            if 'dust' in s:
+                east, north = self.site.to_local(s['latitude'], s['longitude'])
+                self.hazard.update_station(station_id, east, north, {"dust": s['dust'], "noise": s['noise'], "gas": s['gas']})
+                self.dose.update_station(station_id, east, north, s['dust'], s['noise'])
+        self._compute_danger_mask()
+        self.last_sent_mask[:] = state["last_sent_mask"]
+        # A helmet silent for longer may have left (or been switched off): its next telemetry decides
+        # again, geofenced here (not as an edge helmet) until it announces itself again
+        now = clock.time()
+        fresh = lambda helmet_id: now - state["last_seen"].get((TOPIC_HELMET, helmet_id), 0) <= CHECKPOINT_DANGER_MAX_AGE
+        self.workers_in_danger = {h for h in state["workers_in_danger"] if fresh(h)}
+        self.workers_warned = {h for h in state["workers_warned"] if fresh(h)}
+        self.edge_helmets = {h for h in state["edge_helmets"] if fresh(h)}
+        self.helmet_cells = state["helmet_cells"]
+        self.helmet_intervals = state["helmet_intervals"]
+        self.last_seen = state["last_seen"]
+        self.siren_active = state["siren_active"]
+        self.display_seq = state["display_seq"]
+        self.danger_map_seq = state["danger_map_seq"]
+        self.exposure.restore(state.get("exposure"))
+        self.dose.restore(state.get("dose"))
+
+        # Derived state: distance field from the dangerous sectors
+        self.field_mask[:] = self.danger_mask
+        dangerous = np.flatnonzero(self.danger_mask)
+        self.danger_field.update((self.site.sector_rows[dangerous], self.site.sector_cols[dangerous]), ([], []))
+        self.display_dirty = bool((self.danger_mask != self.last_sent_mask).any())
+        self.site_state.set_zones(dangerous.tolist())
+        self._update_siren() # Off (and the alarm told so) if no worker is still in danger
+        for station_id, s in self.station_states.items():
+            if 'dust' in s:
+                self.site_state.update_station(
+                    station_id, s['latitude'], s['longitude'], s['dust'], s['noise'], s['gas'], s['is_dangerous'])
+
+        self.restored_from = path
+        print(
+            f"♻️  State restored [{self.site_id}] from {path.name} in {(time.perf_counter() - start) * 1000:.1f} ms "
+            f"({len(self.helmet_states)} helmets, {len(dangerous)} dangerous sectors, siren {'ON' if self.siren_active else 'OFF'})"
+        )
+        return True
+
+    def get_helmet_status(self, helmet_id):
+        """Get current status of a helmet"""
+        return self.helmet_states.get(helmet_id, {})
 
     def _load_helmets_from_csv(self):
         """Loads initial helmet data from STATIC CSV to avoid wiping config"""
-        filepath = ROOT / "data" / "static" / "helmets.csv"
+        filepath = self.config.static_dir / "helmets.csv"
         if not filepath.exists():
             return
         try:
@@ -510,31 +1062,9 @@ class DataCollectorManager:
         except Exception as e:
             print(f"⚠️ Error loading helmets.csv: {e}")
 
-    def update_stations_csv(self):
-        """
-        Saves current station positions and states to stations.csv
-        Format: id, latitude, longitude, is_dangerous
-        """
-        import csv
-        filepath = ROOT / "data" / "dynamic" / "stations.csv"
-        try:
-            with open(filepath, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["id", "latitude", "longitude", "dust", "noise", "gas", "is_dangerous"])
-                for station_id, state in self.station_states.items():
-                    lat = state.get("latitude", 0)
-                    lon = state.get("longitude", 0)
-                    dust = state.get("dust", 0)
-                    noise = state.get("noise", 0)
-                    gas = state.get("gas", 0)
-                    is_dangerous = 1 if state.get("is_dangerous", False) else 0
-                    writer.writerow([station_id, lat, lon, dust, noise, gas, is_dangerous])
-        except Exception as e:
-            print(f"❌ Failed to save stations.csv: {e}")
-
     def _load_stations_from_csv(self):
         """Loads initial station data from STATIC CSV to avoid wiping config"""
-        filepath = ROOT / "data" / "static" / "stations.csv"
+        filepath = self.config.static_dir / "stations.csv"
         if not filepath.exists():
             return
         try:
@@ -551,23 +1081,290 @@ class DataCollectorManager:
         except Exception as e:
             print(f"⚠️ Error loading stations.csv: {e}")
 
-    def update_alarm_status_csv(self):
-        """
-        Saves current alarm status to alarm_status.csv
-        Format: alarm_active
-        """
-        import csv
-        filepath = ROOT / "data" / "dynamic" / "alarm_status.csv"
+class DataCollectorManager:
+    """
+    Hosts the sites of the registry in one process.
+    MQTT callbacks, decoding and routing live here; each site keeps its own
+    isolated state in a SiteManager that is loaded on first use and evicted when idle.
+    """
+
+    def __init__(self, mqtt_client, registry: SiteRegistry = None, priority_client=None,
+                 inbound_queue_size: int = INBOUND_QUEUE_SIZE):
+        self.mqtt_client = mqtt_client
+        self.priority_client = priority_client
+        self.publisher = CommandPublisher(
+            mqtt_client,
+            PublishPolicy(parse_policy(PUBLISH_QOS, int), parse_policy(PUBLISH_LANES)),
+            priority_client=priority_client,
+            max_batch=PUBLISH_LOW_BATCH
+        )
+        self.registry = registry or SiteRegistry(ROOT / "data")
+        self.sites = {} # {site_id: SiteManager}, only the loaded ones
+        self.discovered_devices = {} # {(device_type, device_id): info payload}
+        self._sites_lock = threading.Lock()
+
+        # The default site backs the single-site files (web UI, dashboard)
+        self.get_site(self.registry.default_site_id)
+
+        # Inbound pipeline: on_message only rate-limits and enqueues, a worker thread decodes and decides
+        self.rate_limiter = RateLimiter(INBOUND_RATE, INBOUND_BURST)
+        self.inbound = ConflatingQueue(inbound_queue_size) if inbound_queue_size > 0 else None
+        self._worker = None
+        if self.inbound is not None:
+            self._worker = threading.Thread(target=self._inbound_loop, name="manager-inbound", daemon=True)
+            self._worker.start()
+
+        self._register_gauges()
+
+    def _register_gauges(self):
+        """Expose live manager state as gauges evaluated at scrape time"""
+        FLEET_SIZE.set_function(lambda: self._sum_sites(lambda s: len(s.helmet_states)), TOPIC_HELMET)
+        FLEET_SIZE.set_function(lambda: self._sum_sites(lambda s: len(s.station_states)), TOPIC_STATION)
+        DANGEROUS_SECTORS.set_function(lambda: self._sum_sites(lambda s: int(np.count_nonzero(s.danger_mask))))
+        WORKERS_IN_DANGER.set_function(lambda: self._sum_sites(lambda s: len(s.workers_in_danger)))
+        SITES_LOADED.set_function(lambda: len(self.sites))
+        # paho keeps unacknowledged QoS 1/2 publishes in an internal ordered dict
+        QUEUE_DEPTH.set_function(lambda: len(getattr(self.mqtt_client, "_out_messages", ())), "mqtt_out")
+        QUEUE_DEPTH.set_function(lambda: len(getattr(self.priority_client, "_out_messages", ())), "mqtt_out_priority")
+        QUEUE_DEPTH.set_function(lambda: len(self.publisher), "publish_low")
+        QUEUE_DEPTH.set_function(lambda: len(self.inbound) if self.inbound is not None else 0, "inbound")
+
+    def _sum_sites(self, func):
+        return sum(func(site) for site in list(self.sites.values()))
+
+    # --- Site lifecycle ---
+
+    def get_site(self, site_id):
+        """Loaded SiteManager for site_id (loading it on first use), or None if unknown"""
+        site = self.sites.get(site_id)
+        if site is not None:
+            return site
+
+        config = self.registry.get(site_id)
+        if config is None:
+            return None
+        with self._sites_lock:
+            site = self.sites.get(site_id)
+            if site is None:
+                site = SiteManager(self.mqtt_client, config, self.publisher)
+                self.sites[site_id] = site
+                LOG.info("🏗️  SITE LOADED", extra={"fields": {"site": site_id, "sectors": len(site.site.grid)}})
+        return site
+
+    def _evict_idle_sites(self):
+        """Drop sites without traffic for SITE_IDLE_TIMEOUT (state files stay on disk)"""
+        if SITE_IDLE_TIMEOUT <= 0:
+            return
+        for site_id, site in list(self.sites.items()):
+            if clock.monotonic() - site.last_activity <= SITE_IDLE_TIMEOUT:
+                continue
+            # No new loads of this site, and the inbound worker is not inside it
+            with self._sites_lock, site.lock:
+                if clock.monotonic() - site.last_activity <= SITE_IDLE_TIMEOUT:
+                    continue # A message arrived while we waited for the locks
+                site.site_state.flush(force_full=True)
+                if CHECKPOINT_INTERVAL > 0:
+                    site.save_checkpoint() # Reloads warm on its next message
+                if site.exposure.dirty:
+                    site.flush_exposure()
+                if site.hazard.dirty:
+                    site.flush_hazard()
+                site.storage.close()
+                site.unloaded = True
+                self.sites.pop(site_id, None)
+            LOG.info("💤 SITE UNLOADED (idle)", extra={"fields": {"site": site_id}})
+
+    # --- MQTT ---
+
+    def on_connect(self, client, userdata, flags, rc):
+        """Callback when connected to MQTT broker"""
+        print(f"Manager connected with result code {rc}")
+        
+        if rc == 0:
+            # Device topics: {base}/{type}/{id}/{msg} (site from device assignment)
+            # and {base}/{TOPIC_SITES}/{site_id}/{type}/{id}/{msg} (site from topic)
+            for prefix in (MQTT_BASIC_TOPIC, f"{MQTT_BASIC_TOPIC}/{TOPIC_SITES}/+"):
+                # Subscribe to all device info (Retained, QoS 2)
+                info_pattern = f"{prefix}/+/+/info"
+                client.subscribe(info_pattern, qos=2)
+                print(f"✅ Subscribed to: {info_pattern}")
+
+                # Subscribe to all telemetry
+                telemetry_pattern = f"{prefix}/+/+/telemetry"
+                client.subscribe(telemetry_pattern, qos=1)
+                print(f"✅ Subscribed to: {telemetry_pattern}")
+
+                # Heartbeats of report-by-exception devices (nothing changed)
+                heartbeat_pattern = f"{prefix}/+/+/heartbeat"
+                client.subscribe(heartbeat_pattern, qos=0)
+                print(f"✅ Subscribed to: {heartbeat_pattern}")
+
+                # Edge events (helmets entering/leaving danger on their own map)
+                event_pattern = f"{prefix}/+/+/event"
+                client.subscribe(event_pattern, qos=1)
+                print(f"✅ Subscribed to: {event_pattern}")
+
+                # Alarm display resync requests (sequence gap detected by the alarm)
+                resync_pattern = f"{prefix}/{TOPIC_ALARM}/+/resync"
+                client.subscribe(resync_pattern, qos=1)
+                print(f"✅ Subscribed to: {resync_pattern}")
+
+            for site in list(self.sites.values()):
+                site._publish_sector_catalog()
+                site.danger_map_dirty = True
+        else:
+            print(f"❌ Connection failed with code {rc}")
+
+    def on_message(self, client, userdata, message):
+        """Callback when message is received (MQTT thread: rate limit, then enqueue)"""
+        device_topic, _, msg_type = message.topic.rpartition('/')
+        now = clock.monotonic()
+        essential = msg_type in ESSENTIAL_MSG_TYPES
+        if not essential and not self.rate_limiter.allow(device_topic, now):
+            INBOUND_DROPPED_TOTAL.inc("rate_limited")
+            return
+
+        if self.inbound is None:
+            self._process_message(message)
+            return
+
+        # Keyed by topic: one waiting message per device and message type
+        outcome = self.inbound.put(
+            message.topic, (now, message), conflate=msg_type in CONFLATED_MSG_TYPES, essential=essential)
+        if outcome != QUEUED:
+            INBOUND_DROPPED_TOTAL.inc(outcome)
+            if LOG.isEnabledFor(logging.DEBUG):
+                LOG.debug("⏭️  Inbound message " + outcome, extra={"fields": {"topic": message.topic}})
+
+    def _inbound_loop(self):
+        """Worker thread: process queued messages, oldest first"""
+        while True:
+            item = self.inbound.get(timeout=1.0)
+            if item is None:
+                if self.inbound.closed:
+                    return
+                continue
+            enqueued_at, message = item
+            INBOUND_WAIT_SECONDS.observe(clock.monotonic() - enqueued_at)
+            self._process_message(message)
+
+    def stop(self):
+        """Stop the inbound worker (messages still queued are discarded) and checkpoint every site"""
+        if self.inbound is not None:
+            self.inbound.close()
+            self._worker.join(timeout=5)
+        for site in list(self.sites.values()):
+            with site.lock: # The worker may still be finishing a message if the join timed out
+                if site.exposure.dirty:
+                    site.flush_exposure()
+                if site.hazard.dirty:
+                    site.flush_hazard()
+                site.flush_storage()
+                if CHECKPOINT_INTERVAL > 0:
+                    site.save_checkpoint()
+
+    def _process_message(self, message):
+        """Decode a message and route it to its site"""
         try:
-            with open(filepath, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["alarm_active"])
-                writer.writerow([1 if self.siren_active else 0])
+            topic = message.topic
+
+            # Route message based on topic pattern (relative to the base topic)
+            parts = topic[len(MQTT_BASIC_TOPIC) + 1:].split('/')
+            if len(parts) == 5 and parts[0] == TOPIC_SITES:
+                site_id = parts[1]
+                parts = parts[2:]
+            elif len(parts) == 3:
+                site_id = None
+            else:
+                return
+
+            device_type, device_id, msg_type = parts
+            MESSAGES_TOTAL.inc(device_type, msg_type)
+
+            with DECODE_SECONDS.time():
+                payload = json.loads(message.payload.decode("utf-8"))
+                if msg_type == "telemetry":
+                    # Parse SenML payload
+                    data = self._parse_senml(payload)
+                    data['id'] = device_id # Add ID for handler
+
+            if msg_type == "info" and isinstance(payload, dict) and payload.get("site_id") and site_id is None:
+                # Device announces its site: remember the assignment for its telemetry
+                self.registry.assign(device_type, device_id, payload["site_id"])
+
+            if site_id is None:
+                if device_type == TOPIC_ALARM:
+                    site_id = self.registry.site_for_alarm(device_id)
+                else:
+                    site_id = self.registry.site_for(device_type, device_id)
+            while True:
+                site = self.get_site(site_id)
+                if site is None:
+                    MESSAGE_ERRORS_TOTAL.inc("unknown_site")
+                    LOG.warning("⚠️  Message for unknown site", extra={"fields": {"topic": topic, "site": site_id}})
+                    return
+
+                with site.lock: # tick() flushes this site's state on the main thread
+                    if site.unloaded:
+                        continue # Evicted while this message waited for the lock: load it again
+                    if msg_type == "info":
+                        self._handle_info_message(site, device_type, device_id, payload)
+                    elif msg_type == "resync" and device_type == TOPIC_ALARM:
+                        site._send_alarm_display_full(device_id)
+                    elif msg_type == "telemetry":
+                        site.handle_telemetry(device_type, topic, data)
+                    elif msg_type == "heartbeat":
+                        site.handle_heartbeat(device_type, device_id)
+                    elif msg_type == "event":
+                        site.handle_event(device_type, device_id, payload)
+                    return
+            
+        except json.JSONDecodeError as e:
+            MESSAGE_ERRORS_TOTAL.inc("decode")
+            LOG.error("❌ JSON decode error", extra={"fields": {"topic": message.topic, "error": e}})
         except Exception as e:
-            print(f"❌ Failed to save alarm_status.csv: {e}")
+            MESSAGE_ERRORS_TOTAL.inc("processing")
+            LOG.exception("❌ Error processing message", extra={"fields": {"topic": message.topic}})
+
+    def _parse_senml(self, payload):
+        """Extract name-value pairs from SenML list (handling hierarchical names)"""
+        data = {}
+        if isinstance(payload, list):
+            for entry in payload:
+                name = entry.get('n', '')
+                value = entry.get('v')
+                if not name: continue
+
+                # Map hierarchical names back to flat keys for internal handlers
+                if 'gps.lat' in name: data['latitude'] = value
+                elif 'gps.lon' in name: data['longitude'] = value
+                elif 'sensor.battery' in name: data['battery'] = value
+                elif 'actuator.led' in name: data['led'] = value
+                elif 'sensor.dust' in name: data['dust'] = value
+                elif 'sensor.noise' in name: data['noise'] = value
+                elif 'sensor.gas' in name: data['gas'] = value
+                else: data[name] = value # Fallback
+        return data
+
+    def _handle_info_message(self, site, device_type, device_id, payload):
+        """Track active devices and their metadata (Discovery)"""
+        self.discovered_devices[(device_type, device_id)] = payload
+        site.handle_info(device_type, device_id, payload)
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("🚀 DEVICE DISCOVERED", extra={"fields": {
+                "id": device_id, "type": device_type, "site": site.site_id, "sw": payload.get('software_version')}})
+
+    def tick(self):
+        """Periodic housekeeping, called from the main loop every MANAGER_TICK_INTERVAL"""
+        for site in list(self.sites.values()):
+            site.tick()
+        self.publisher.flush() # Low lane: after the sites queued this tick's merged updates
+        self._evict_idle_sites()
 
 
 def main():
+    setup_logging()
+
     print("\n" + "="*60)
     print("🏗️  CONSTRUCTION SITE DATA COLLECTOR & MANAGER")
     print("="*60 + "\n")
@@ -577,13 +1374,34 @@ def main():
     import uuid
     client_id = f"python-manager-{MQTT_USERNAME}-{uuid.uuid4().hex[:6]}"
     mqtt_client = mqtt.Client(client_id)
+
+    # Siren commands (high lane) on their own connection: never behind bulk LED/display traffic
+    priority_client = None
+    if PRIORITY_CONNECTION:
+        priority_client = mqtt.Client(f"{client_id}-priority")
+        priority_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+        priority_client.on_connect = lambda client, userdata, flags, rc: print(f"Manager priority connection: result code {rc}")
     
     # Create manager instance
-    manager = DataCollectorManager(mqtt_client)
+    manager = DataCollectorManager(mqtt_client, priority_client=priority_client)
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+        print(f"📈 Metrics available at http://localhost:{METRICS_PORT}/metrics")
     
     # Set callbacks
-    mqtt_client.on_connect = manager.on_connect
     mqtt_client.on_message = manager.on_message
+
+    # Opt-in profiling (PROFILING_ENABLED=1): message handling is the cProfile target.
+    # on_message only enqueues; decoding and the safety logic run in _process_message (inbound worker)
+    profiler = setup_profiling("manager", targets=[(manager, "_process_message")])
+
+    def on_connect(client, userdata, flags, rc):
+        manager.on_connect(client, userdata, flags, rc)
+        if rc == 0 and profiler:
+            profiler.attach_mqtt(client, f"{MQTT_BASIC_TOPIC}/control/profile/manager")
+
+    mqtt_client.on_connect = on_connect
     
     def on_disconnect(client, userdata, rc):
         if rc != 0:
@@ -597,15 +1415,26 @@ def main():
     # Connect
     print(f"🔌 Connecting to {BROKER_ADDRESS}:{BROKER_PORT}")
     mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT, 60)
+    if priority_client:
+        priority_client.connect(BROKER_ADDRESS, BROKER_PORT, 60)
+        priority_client.loop_start()
     
     print("✅ Manager started. Monitoring helmets...\n")
     
-    # Start loop
+    # Network loop runs in its own thread, the main thread does periodic work
+    mqtt_client.loop_start()
     try:
-        mqtt_client.loop_forever()
+        while True:
+            manager.tick()
+            time.sleep(MANAGER_TICK_INTERVAL)
     except KeyboardInterrupt:
         print("\n🛑 Shutting down manager...")
+        mqtt_client.loop_stop()
+        manager.stop()
         mqtt_client.disconnect()
+        if priority_client:
+            priority_client.loop_stop()
+            priority_client.disconnect()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+# src/process/simulation.py
+"""
+Accelerated scenario runs
+Responsibilities:
+- Run the manager, the alarm, the helmets and the stations in one process
+- Virtual time (utils/sim_clock.SimClock) and an in-process broker (utils/sim_broker.py):
+  no sleeps, no network, a full shift runs as fast as the CPU allows
+- Seeded randomness: the same seed gives the same summary, so runs can be used
+  as regression tests for battery, charging and danger dynamics
+
+The components are the real ones (DataCollectorManager, alarm.on_message,
+helmet/station cycles); only the clock and the transport are swapped.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import contextlib
+from collections import Counter
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from utils.sim_clock import SimClock, set_clock
+from utils.sim_broker import SimBroker
+from utils.logger import setup_logging, NAMESPACE
+from model.site_registry import SiteRegistry
+
+load_dotenv()
+
+SIM_DURATION = float(os.getenv("SIM_DURATION", 8 * 3600)) # Virtual seconds (default: one 8-hour shift)
+SIM_SEED = int(os.getenv("SIM_SEED", 42))
+SIM_EPOCH = float(os.getenv("SIM_EPOCH", 1_700_000_000)) # Virtual wall-clock time at start
+SIM_OUTPUT_DIR = Path(os.getenv("SIM_OUTPUT_DIR") or ROOT / "data" / "sim")
+SIM_LOG_LEVEL = os.getenv("SIM_LOG_LEVEL", "ERROR").upper()
+SIM_PERSIST = os.getenv("SIM_PERSIST", "0").lower() in ("1", "true", "yes") # Write the manager's CSV files
+
+
+class SimWake:
+    """Stands in for the helmet's threading.Event: set() runs the next cycle now"""
+
+    def __init__(self, clock, step):
+        self.clock = clock
+        self.step = step
+        self.pending = None
+
+    def schedule(self, delay):
+        self.clock.cancel(self.pending)
+        self.pending = self.clock.call_later(delay, self.step)
+
+    def set(self):
+        self.schedule(0.0)
+
+
+class ScenarioProbe:
+    """Listens to every topic and aggregates what a regression test wants to compare"""
+
+    def __init__(self, client, clock, base_topic):
+        self.clock = clock
+        self.base = base_topic + "/"
+        self.messages = Counter() # {msg_type or command: count}
+        self.min_battery = {} # {helmet_id: lowest battery seen}
+        self.charging_cycles = Counter() # {helmet_id: set_led -> charging}
+        self.warnings = 0
+        self.danger_entries = 0
+        self.siren_activations = 0
+        self.siren_on_since = None
+        self.siren_seconds = 0.0
+        self.max_zones = 0
+        self.zones = set()
+        client.on_message = self.on_message
+        client.subscribe("#")
+
+    def on_message(self, client, userdata, message):
+        parts = message.topic[len(self.base):].split("/")
+        payload = json.loads(message.payload.decode("utf-8")) if message.payload else None
+        kind = parts[-1]
+        self.messages[kind] += 1
+
+        if kind == "telemetry" and len(parts) == 3 and payload:
+            for record in payload:
+                if record.get("n", "").endswith("sensor.battery"):
+                    helmet_id = parts[1]
+                    self.min_battery[helmet_id] = min(self.min_battery.get(helmet_id, 100), record["v"])
+        elif kind == "command" and isinstance(payload, dict):
+            command = payload.get("command")
+            self.messages[f"command:{command}"] += 1
+            if command == "set_led" and payload.get("led") == 1:
+                self.charging_cycles[parts[-2]] += 1
+            elif command == "alert":
+                self.warnings += 1
+            elif command == "turn_siren_on":
+                self.siren_activations += 1
+                self.siren_on_since = self.clock.monotonic()
+            elif command == "turn_siren_off" and self.siren_on_since is not None:
+                self.siren_seconds += self.clock.monotonic() - self.siren_on_since
+                self.siren_on_since = None
+            elif command == "update_display":
+                self.zones = set(payload.get("zones", []))
+            elif command == "update_display_delta":
+                self.zones.difference_update(payload.get("remove", []))
+                self.zones.update(payload.get("add", []))
+            self.max_zones = max(self.max_zones, len(self.zones))
+        elif kind == "event" and isinstance(payload, dict) and payload.get("event") == "danger_enter" and not payload.get("resync"):
+            self.danger_entries += 1
+
+    def summary(self):
+        if self.siren_on_since is not None:
+            self.siren_seconds += self.clock.monotonic() - self.siren_on_since
+            self.siren_on_since = self.clock.monotonic()
+        return {
+            "messages": dict(sorted(self.messages.items())),
+            "min_battery": dict(sorted(self.min_battery.items())),
+            "charging_cycles": dict(sorted(self.charging_cycles.items())),
+            "early_warnings": self.warnings,
+            "danger_entries": self.danger_entries,
+            "siren_activations": self.siren_activations,
+            "siren_seconds": round(self.siren_seconds, 3),
+            "max_dangerous_zones": self.max_zones
+        }
+
+
+def run_simulation(duration=SIM_DURATION, seed=SIM_SEED, output_dir=SIM_OUTPUT_DIR):
+    """Run one seeded scenario in virtual time and return its summary"""
+    clock = SimClock(epoch=SIM_EPOCH)
+    set_clock(clock)
+    random.seed(seed)
+    broker = SimBroker(clock)
+
+    # Imported here so their module-level setup runs after the clock is installed
+    import manager
+    import alarm
+    import helmet
+    import station
+
+    # Manager: real site registry, dynamic files (if any) redirected to the output directory
+    registry = SiteRegistry(ROOT / "data")
+    for config in registry.sites.values():
+        config.dynamic_dir = Path(output_dir) / config.site_id
+        config.persist = SIM_PERSIST
+    manager_client = broker.client("manager")
+    priority_client = broker.client("manager-priority")
+    # Messages are handled inline: the broker's deliveries already serialize them on the virtual clock
+    collector = manager.DataCollectorManager(manager_client, registry, priority_client, inbound_queue_size=0)
+    manager_client.on_connect = collector.on_connect
+    manager_client.on_message = collector.on_message
+    manager_client.connect()
+    priority_client.connect()
+    clock.call_every(manager.MANAGER_TICK_INTERVAL, collector.tick)
+
+    probe_client = broker.client("probe")
+    probe = ScenarioProbe(probe_client, clock, manager.MQTT_BASIC_TOPIC)
+    probe_client.connect()
+
+    alarm_client = broker.client(alarm.alarm_id)
+    alarm_client.on_connect = alarm.on_connect
+    alarm_client.on_message = alarm.on_message
+    alarm_client.connect()
+    clock.call_every(1.0, alarm.check_resync, alarm_client)
+
+    # Devices: one scheduled cycle each, first cycles spread over one interval
+    boundaries = helmet.load_site_boundaries(helmet.SITE_CSV_PATH)
+    for helmet_id, lat, lon in helmet.load_helmets(helmet.CSV_PATH):
+        client = broker.client(f"helmet-{helmet_id}")
+        state = {}
+
+        def helmet_cycle(client=client, state=state):
+            helmet.run_helmet_step(client, state['userdata'])
+            state['wake'].schedule(state['userdata']['helmet'].report_interval)
+
+        wake = SimWake(clock, helmet_cycle)
+        state['wake'] = wake
+        state['userdata'] = helmet.setup_helmet_device(client, helmet_id, lat, lon, boundaries, wake)
+        client.connect()
+        wake.schedule(random.uniform(0, helmet.TIME_BETWEEN_MESSAGE))
+
+    for station_id, lat, lon in station.load_stations(station.CSV_PATH):
+        client = broker.client(f"station-{station_id}")
+        userdata = station.setup_station_device(client, station_id, lat, lon)
+        client.connect()
+        clock.call_every(
+            station.TIME_BETWEEN_MESSAGE, station.run_station_step, client, userdata,
+            first=random.uniform(0, station.TIME_BETWEEN_MESSAGE))
+
+    clock.run_until(duration)
+
+    summary = probe.summary()
+    default_site = collector.sites.get(registry.default_site_id)
+    if default_site is not None:
+        summary["final_helmets"] = {
+            helmet_id: {"battery": state.get("battery"), "led": state.get("led")}
+            for helmet_id, state in sorted(default_site.helmet_states.items())
+        }
+    summary["final_alarm"] = {"siren": alarm.alarm_system.siren, "zones": len(alarm.alarm_system.display)}
+    summary["virtual_seconds"] = duration
+    summary["events"] = clock.events_run
+    summary["seed"] = seed
+    return summary
+
+
+def main():
+    setup_logging()
+    logging.getLogger(NAMESPACE).setLevel(getattr(logging, SIM_LOG_LEVEL, logging.ERROR))
+
+    SIM_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    print("\n" + "="*60)
+    print(f"⏩ SIMULATING {SIM_DURATION / 3600:g} h (seed {SIM_SEED})")
+    print("="*60 + "\n")
+
+    start = time.perf_counter()
+    # Component prints (connections, alarm commands, ...) go to the run log
+    with open(SIM_OUTPUT_DIR / "simulation.log", "w") as log, contextlib.redirect_stdout(log):
+        summary = run_simulation()
+    elapsed = time.perf_counter() - start
+
+    summary_path = SIM_OUTPUT_DIR / "summary.json"
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+
+    print(json.dumps({k: v for k, v in summary.items() if k not in ("min_battery", "final_helmets")}, indent=2))
+    print(f"\n✅ {SIM_DURATION:g} virtual s in {elapsed:.1f} s ({SIM_DURATION / max(elapsed, 1e-9):.0f}x), {summary['events']} events")
+    print(f"📄 Summary: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,18 @@ from pathlib import Path
 
 import csv
 import threading
+import json
 
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
 from model.environmental_monitoring_station import EnvironmentalMonitoringStation
 from model.gps import GPS
+from utils.deadband import Deadband, HEARTBEAT
+from utils.sim_clock import clock
+from utils.profiling import setup_profiling
+from utils.logger import setup_logging, get_logger
+import logging
 
 load_dotenv()
 
@@ -30,63 +36,121 @@ MESSAGE_LIMIT = int(os.getenv("MESSAGE_LIMIT"))
 TIME_BETWEEN_MESSAGE = int(os.getenv("TIME_BETWEEN_MESSAGE"))
 TOPIC_STATION = os.getenv("TOPIC_STATION")
 
+# Report-by-exception: publish telemetry only on meaningful changes, heartbeats otherwise
+TELEMETRY_DEADBAND = os.getenv("TELEMETRY_DEADBAND", "1").lower() in ("1", "true", "yes")
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", 30))
+TELEMETRY_REFRESH_INTERVAL = float(os.getenv("TELEMETRY_REFRESH_INTERVAL", 300))
+STATION_DEADBAND_POSITION = float(os.getenv("STATION_DEADBAND_POSITION", 1.0)) # Meters
+STATION_DEADBAND_DUST = float(os.getenv("STATION_DEADBAND_DUST", 2.0))
+STATION_DEADBAND_NOISE = float(os.getenv("STATION_DEADBAND_NOISE", 2.0))
+STATION_DEADBAND_GAS = float(os.getenv("STATION_DEADBAND_GAS", 0.05))
+# Crossing a danger limit is always reported, whatever the deadband
+DUST_LIMIT = float(os.getenv("DUST_LIMIT", 50.0))
+NOISE_LIMIT = float(os.getenv("NOISE_LIMIT", 50.0))
+GAS_LIMIT = float(os.getenv("GAS_LIMIT", 1.0))
+
 CSV_PATH = ROOT / "data" / "static" / "stations.csv"
 
+LOG = get_logger("station")
+
 
 def on_connect(client, userdata, flags, rc):
     station_id = userdata['station_id']
     station = userdata['station']
+    deadband = userdata.get('deadband')
     print(f"Station {station_id} connected with result code {rc}")
     
     if rc == 0:
         # Publish device info (Retained, QoS 2)
         info_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_STATION}/{station_id}/info"
-        info_payload = station.device_info()
+        info_payload = station.device_info(deadband.settings() if deadband else None)
+        if deadband:
+            deadband.reset() # Full telemetry right after (re)connecting
         client.publish(info_topic, info_payload, qos=2, retain=True)
         print(f"✅ Station {station_id} published info to: {info_topic}")
 
-def start_station_device(station_id, latitude, longitude):
-    """
+        # Only one station per process listens for profiling commands
+        profiler = userdata.get('profiler')
+        if profiler:
+            profiler.attach_mqtt(client, f"{MQTT_BASIC_TOPIC}/control/profile/station")
+
+def run_station_cycle(mqtt_client, station, telemetry_topic, deadband=None, heartbeat_topic=None):
+    """Update sensor readings and publish station telemetry (or a heartbeat)"""
+    station.update_dust_level()
+    station.update_noise_level()
+    station.update_gas_level()
+
+    if deadband is not None:
+        decision = deadband.decide(
+            station.position.latitude, station.position.longitude,
+            {"dust": station.dust, "noise": station.noise, "gas": station.gas})
+        if decision is None:
+            return
+        if decision == HEARTBEAT:
+            mqtt_client.publish(heartbeat_topic, json.dumps({"t": clock.time()}), 0, False)
+            return
     
+    # Publish telemetry (SenML)
+    payload = station.to_senml()
+    mqtt_client.publish(telemetry_topic, payload, 1, False)
+    
+    if LOG.isEnabledFor(logging.DEBUG):
+        LOG.debug("📤 SENT", extra={"fields": {
+            "id": station.id, "dust": round(station.dust, 2), "noise": round(station.noise, 2),
+            "gas": round(station.gas, 2),
+            "lat": round(station.position.latitude, 6), "lon": round(station.position.longitude, 6)}})
+
+def setup_station_device(mqtt_client, station_id, latitude, longitude, profiler=None):
+    """
+    Create a station and wire it to an MQTT client (callbacks + user data).
+    Returns the user data (station, deadband, topics) used to run its cycles.
     """
     # create station
     position = GPS(latitude, longitude)
     station = EnvironmentalMonitoringStation(station_id, position)
+    deadband = None
+    if TELEMETRY_DEADBAND:
+        deadband = Deadband(
+            position_m=STATION_DEADBAND_POSITION,
+            deltas={"dust": STATION_DEADBAND_DUST, "noise": STATION_DEADBAND_NOISE, "gas": STATION_DEADBAND_GAS},
+            limits={"dust": [DUST_LIMIT], "noise": [NOISE_LIMIT], "gas": [GAS_LIMIT]},
+            heartbeat_s=HEARTBEAT_INTERVAL,
+            refresh_s=TELEMETRY_REFRESH_INTERVAL
+        )
     
-    # setup client MQTT
-    mqtt_client = mqtt.Client(station_id)
-    mqtt_client.user_data_set({
+    userdata = {
         'station_id': station_id,
-        'station': station
-    })
+        'station': station,
+        'profiler': profiler,
+        'deadband': deadband,
+        'telemetry_topic': f"{MQTT_BASIC_TOPIC}/{TOPIC_STATION}/{station_id}/telemetry",
+        'heartbeat_topic': f"{MQTT_BASIC_TOPIC}/{TOPIC_STATION}/{station_id}/heartbeat"
+    }
+    mqtt_client.user_data_set(userdata)
     mqtt_client.on_connect = on_connect
+    return userdata
+
+def run_station_step(mqtt_client, userdata):
+    """One cycle of a station created by setup_station_device"""
+    run_station_cycle(
+        mqtt_client, userdata['station'], userdata['telemetry_topic'], userdata['deadband'], userdata['heartbeat_topic'])
+
+def start_station_device(station_id, latitude, longitude, profiler=None):
+    """
+    
+    """
+    # setup client MQTT
+    mqtt_client = mqtt.Client(station_id)
+    userdata = setup_station_device(mqtt_client, station_id, latitude, longitude, profiler)
     mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
     
     print(f"Connecting station {station_id} to {BROKER_ADDRESS}:{BROKER_PORT}")
     mqtt_client.connect(BROKER_ADDRESS, BROKER_PORT)
     mqtt_client.loop_start()
     # Loop telemetry
-    telemetry_topic = f"{MQTT_BASIC_TOPIC}/{TOPIC_STATION}/{station_id}/telemetry"
-    
     # for message_id in range(MESSAGE_LIMIT):
     while True:
-        
-        station.update_dust_level()
-        station.update_noise_level()
-        station.update_gas_level()
-        
-        # Publish telemetry (SenML)
-        payload = station.to_senml()
-        mqtt_client.publish(telemetry_topic, payload, 1, False)
-        
-        log_msg = (
-            f"[STA-{station_id}] 📤 SENT | "
-            f"Dust: {station.dust:6.2f} | "
-            f"Noise: {station.noise:6.2f} | "
-            f"Gas: {station.gas:4.2f} | "
-            f"Pos: ({station.position.latitude:.5f}, {station.position.longitude:.5f})"
-        )
-        print(log_msg)
+        run_station_step(mqtt_client, userdata)
         time.sleep(TIME_BETWEEN_MESSAGE)
     
     mqtt_client.loop_stop()
@@ -104,16 +168,21 @@ def load_stations(csv_path):
     return stations
 
 def main():
+    setup_logging()
+
     print("=== Starting Stations ===\n")
 
     stations = load_stations(CSV_PATH)
 
     threads = []
 
-    for station in stations:
+    # Opt-in profiling (PROFILING_ENABLED=1): the simulation cycle is the cProfile target
+    profiler = setup_profiling("station", targets=[(sys.modules[__name__], "run_station_cycle")])
+
+    for i, station in enumerate(stations):
         t = threading.Thread(
             target=start_station_device,
-            args=station,
+            args=(*station, profiler if i == 0 else None),
             daemon=True
         )
         t.start()
@@ -0,0 +1,88 @@
+# src/utils/checkpoint.py
+"""
+Atomic, checksummed state checkpoints
+Responsibilities:
+- Write a state object as {prefix}-{seq}.ckpt (temp file + fsync + rename, so a
+  crash never leaves a half-written checkpoint under the final name)
+- Keep only the newest `keep` checkpoints per prefix
+- Load the newest checkpoint whose checksum verifies, skipping corrupt ones
+
+File layout: MAGIC (8 bytes) | SHA-256 of the body (32 bytes) | pickled body.
+Checkpoints are written and read by the manager only (pickle is not a
+format for untrusted input).
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+MAGIC = b"IOTCKPT1"
+SUFFIX = ".ckpt"
+
+
+def _paths(directory, prefix):
+    """Checkpoints of a prefix, newest first (sequence number in the name)"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    found = []
+    for path in directory.glob(f"{prefix}-*{SUFFIX}"):
+        seq = path.name[len(prefix) + 1:-len(SUFFIX)]
+        if seq.isdigit():
+            found.append((int(seq), path))
+    return [path for _, path in sorted(found, reverse=True)]
+
+
+def write_checkpoint(directory, prefix, state, keep=3):
+    """Write state as the next checkpoint of prefix; returns its path"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    existing = _paths(directory, prefix)
+    seq = int(existing[0].name[len(prefix) + 1:-len(SUFFIX)]) + 1 if existing else 1
+
+    body = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    path = directory / f"{prefix}-{seq:010d}{SUFFIX}"
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(hashlib.sha256(body).digest())
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    for old in ([path] + existing)[max(1, keep):]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+    return path
+
+
+def read_checkpoint(path):
+    """State stored in path; ValueError if the file is truncated or corrupt"""
+    data = Path(path).read_bytes()
+    header = len(MAGIC) + 32
+    if len(data) < header or data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a checkpoint")
+    body = data[header:]
+    if hashlib.sha256(body).digest() != data[len(MAGIC):header]:
+        raise ValueError("checksum mismatch")
+    return pickle.loads(body)
+
+
+def load_latest_checkpoint(directory, prefix, accept=None):
+    """
+    Newest valid checkpoint of prefix as (state, path), or (None, None).
+    accept(state) -> bool can reject otherwise valid states (e.g. too old, other grid).
+    """
+    for path in _paths(directory, prefix):
+        try:
+            state = read_checkpoint(path)
+        except Exception as e:
+            print(f"⚠️  Skipping checkpoint {path.name}: {e}")
+            continue
+        if accept is None or accept(state):
+            return state, path
+    return None, None
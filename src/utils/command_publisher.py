@@ -0,0 +1,129 @@
+# src/utils/command_publisher.py
+"""
+Publish policy for manager commands
+Responsibilities:
+- Per-command QoS (instead of QoS 2 for everything)
+- Priority lanes:
+  high   -> dedicated connection (siren), never queued behind bulk traffic
+  normal -> main connection, published right away
+  low    -> queued and flushed in batches from the manager tick; with conflate=True
+            a newer message for the same topic and command replaces the queued one
+
+Policies are "command=value" lists, e.g. PUBLISH_QOS="set_led=1,turn_siren_on=2".
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+
+LANE_HIGH = "high"
+LANE_NORMAL = "normal"
+LANE_LOW = "low"
+LANES = (LANE_HIGH, LANE_NORMAL, LANE_LOW)
+
+# Commands are idempotent state updates (LED, siren, interval) or carry a sequence
+# number (display deltas), so at-least-once delivery is enough for all of them
+DEFAULT_QOS = {
+    "turn_siren_on": 1,
+    "turn_siren_off": 1,
+    "set_led": 1,
+    "alert": 1,
+    "set_interval": 1,
+    "update_display": 1,
+    "update_display_delta": 1,
+}
+DEFAULT_LANES = {
+    "turn_siren_on": LANE_HIGH,
+    "turn_siren_off": LANE_HIGH,
+    "set_interval": LANE_LOW,
+    # Full display and deltas share a lane so the alarm receives them in sequence order
+    "update_display": LANE_LOW,
+    "update_display_delta": LANE_LOW,
+}
+
+
+def parse_policy(text, cast=str):
+    """'a=1, b=2' -> {'a': cast('1'), 'b': cast('2')} (empty or malformed items are skipped)"""
+    policy = {}
+    for item in (text or "").split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip() and value.strip():
+            policy[name.strip()] = cast(value.strip())
+    return policy
+
+
+class QueuedPublish:
+    """Result for a message accepted on the low lane (same rc convention as paho)"""
+    rc = 0
+
+
+class PublishPolicy:
+
+    def __init__(self, qos: dict = None, lanes: dict = None, default_qos: int = 1):
+        self.qos = {**DEFAULT_QOS, **(qos or {})}
+        self.lanes = {**DEFAULT_LANES, **(lanes or {})}
+        self.default_qos = default_qos
+        for command, lane in self.lanes.items():
+            if lane not in LANES:
+                raise ValueError(f"Unknown lane '{lane}' for command '{command}'")
+        for command, qos in self.qos.items():
+            if qos not in (0, 1, 2):
+                raise ValueError(f"Invalid QoS {qos} for command '{command}'")
+
+    def qos_for(self, command):
+        return self.qos.get(command, self.default_qos)
+
+    def lane_for(self, command):
+        return self.lanes.get(command, LANE_NORMAL)
+
+
+class CommandPublisher:
+    """
+    Routes manager commands to a connection and lane according to a PublishPolicy.
+    The low lane is flushed by flush() (at most max_batch messages per call).
+    """
+
+    def __init__(self, mqtt_client, policy: PublishPolicy = None, priority_client=None, max_batch: int = 500):
+        self.mqtt_client = mqtt_client
+        self.priority_client = priority_client or mqtt_client
+        self.policy = policy or PublishPolicy()
+        self.max_batch = max_batch
+        self.low_queue = OrderedDict() # {key: (topic, command, payload)}, oldest first
+        self._seq = itertools.count()
+        self._lock = threading.Lock() # publish() runs on the MQTT thread, flush() on the tick thread
+        self.sent = {lane: 0 for lane in LANES}
+        self.replaced = 0 # Low-lane messages superseded before being sent
+
+    def lane(self, command):
+        return self.policy.lane_for(command)
+
+    def publish(self, topic, payload, command, conflate=False):
+        """
+        Publish (or queue) a command payload (str); returns the paho result or QueuedPublish.
+        conflate: only the latest queued message per (topic, command) matters (state, not events)
+        """
+        lane = self.policy.lane_for(command)
+        if lane == LANE_LOW:
+            with self._lock:
+                key = (topic, command) if conflate else next(self._seq)
+                if key in self.low_queue:
+                    self.replaced += 1
+                    del self.low_queue[key] # Re-queued at the back with the newest payload
+                self.low_queue[key] = (topic, command, payload)
+            return QueuedPublish()
+
+        client = self.priority_client if lane == LANE_HIGH else self.mqtt_client
+        self.sent[lane] += 1
+        return client.publish(topic, payload, qos=self.policy.qos_for(command), retain=False)
+
+    def flush(self):
+        """Send queued low-lane messages (oldest first); returns how many were sent"""
+        with self._lock:
+            batch = [self.low_queue.popitem(last=False)[1] for _ in range(min(len(self.low_queue), self.max_batch))]
+        for topic, command, payload in batch:
+            self.mqtt_client.publish(topic, payload, qos=self.policy.qos_for(command), retain=False)
+        self.sent[LANE_LOW] += len(batch)
+        return len(batch)
+
+    def __len__(self):
+        return len(self.low_queue)
@@ -0,0 +1,147 @@
+# src/utils/deadband.py
+"""
+Report-by-exception for device telemetry
+Responsibilities:
+- Decide, per sample, whether a device must publish telemetry
+- Fall back to a small heartbeat when nothing changed for a while
+
+A sample is published when the position moved more than position_m meters,
+when any value moved more than its delta since the last published sample,
+or when a value reached or crossed one of its limits (so threshold logic in
+the manager never misses a transition). A delta of 0 means "any change". Full telemetry is also forced every refresh_s
+seconds, so a restarted consumer rebuilds its state from stationary devices.
+"""
+
+import numpy as np
+from utils.sim_clock import clock
+from model.projection import LocalProjection
+
+TELEMETRY = "telemetry"
+HEARTBEAT = "heartbeat"
+
+
+def _settings(band):
+    return {
+        "mode": "deadband",
+        "position_m": band.position_m,
+        "deltas": band.deltas,
+        "heartbeat_s": band.heartbeat_s,
+        "refresh_s": band.refresh_s
+    }
+
+
+class Deadband:
+
+    def __init__(self, position_m: float = 0.0, deltas: dict = None, limits: dict = None,
+                 heartbeat_s: float = 30.0, refresh_s: float = 300.0):
+        self.position_m = float(position_m)
+        self.deltas = dict(deltas or {}) # {name: max change without publishing}
+        self.limits = {name: list(values) for name, values in (limits or {}).items()} # {name: [limit, ...]}
+        self.heartbeat_s = float(heartbeat_s)
+        self.refresh_s = float(refresh_s)
+        self.last_sent = None # (lat, lon, {name: value}) of the last published telemetry
+        self.last_telemetry = None # Time of the last telemetry
+        self.last_publish = None # Time of the last telemetry or heartbeat
+
+    def reset(self):
+        """Publish the next sample unconditionally (e.g. after a reconnect)"""
+        self.last_sent = None
+
+    def settings(self):
+        """Deadband configuration, announced in the device info"""
+        return _settings(self)
+
+    def decide(self, lat, lon, values: dict, now: float = None):
+        """TELEMETRY, HEARTBEAT or None (nothing to publish) for this sample"""
+        now = clock.time() if now is None else now
+        if (self.last_sent is None or now - self.last_telemetry >= self.refresh_s
+                or self._changed(lat, lon, values)):
+            self.last_sent = (lat, lon, dict(values))
+            self.last_telemetry = self.last_publish = now
+            return TELEMETRY
+        if now - self.last_publish >= self.heartbeat_s:
+            self.last_publish = now
+            return HEARTBEAT
+        return None
+
+    def _changed(self, lat, lon, values):
+        last_lat, last_lon, last_values = self.last_sent
+        if lat != last_lat or lon != last_lon:
+            east, north = LocalProjection(last_lat, last_lon).forward(lat, lon)
+            if (east * east + north * north) ** 0.5 > self.position_m:
+                return True
+
+        for name, value in values.items():
+            last = last_values.get(name)
+            if value == last:
+                continue
+            if value is None or last is None:
+                return True
+            if abs(value - last) > self.deltas.get(name, 0):
+                return True
+            for limit in self.limits.get(name, ()):
+                if (last < limit) != (value < limit) or (last <= limit) != (value <= limit):
+                    return True
+        return False
+
+
+class VectorDeadband:
+    """
+    Deadband for a whole fleet: the same rules as Deadband, one array entry per device.
+    projection (LocalProjection) converts position changes to meters.
+    """
+
+    def __init__(self, size: int, projection: LocalProjection, position_m: float = 0.0, deltas: dict = None,
+                 limits: dict = None, heartbeat_s: float = 30.0, refresh_s: float = 300.0):
+        self.projection = projection
+        self.position_m = float(position_m)
+        self.deltas = dict(deltas or {})
+        self.limits = {name: list(values) for name, values in (limits or {}).items()}
+        self.heartbeat_s = float(heartbeat_s)
+        self.refresh_s = float(refresh_s)
+        self.last_lat = np.zeros(size)
+        self.last_lon = np.zeros(size)
+        self.last_values = {} # {name: array}, created on first use
+        self.last_telemetry = np.full(size, -np.inf) # -inf: publish the next sample unconditionally
+        self.last_publish = np.full(size, -np.inf)
+
+    def settings(self):
+        return _settings(self)
+
+    def reset(self, indices=None):
+        if indices is None:
+            self.last_telemetry[:] = -np.inf
+        else:
+            self.last_telemetry[indices] = -np.inf
+
+    def decide(self, indices, lat, lon, values: dict, now: float = None):
+        """
+        Split the devices sampled now into (telemetry_indices, heartbeat_indices).
+        lat, lon and values hold full-fleet arrays; only entries at indices are read.
+        """
+        now = clock.time() if now is None else now
+        indices = np.asarray(indices, dtype=np.intp)
+
+        changed = now - self.last_telemetry[indices] >= self.refresh_s
+        east = (lon[indices] - self.last_lon[indices]) * self.projection.m_per_deg_lon
+        north = (lat[indices] - self.last_lat[indices]) * self.projection.m_per_deg_lat
+        changed |= np.hypot(east, north) > self.position_m
+        for name, array in values.items():
+            value = array[indices]
+            last = self.last_values.setdefault(name, np.zeros(len(self.last_telemetry), dtype=array.dtype))[indices]
+            changed |= np.abs(value.astype(np.float64) - last) > self.deltas.get(name, 0)
+            for limit in self.limits.get(name, ()):
+                changed |= ((last < limit) != (value < limit)) | ((last <= limit) != (value <= limit))
+
+        telemetry = indices[changed]
+        self.last_lat[telemetry] = lat[telemetry]
+        self.last_lon[telemetry] = lon[telemetry]
+        for name, array in values.items():
+            self.last_values[name][telemetry] = array[telemetry]
+        self.last_telemetry[telemetry] = now
+        self.last_publish[telemetry] = now
+
+        rest = indices[~changed]
+        heartbeat = rest[now - self.last_publish[rest] >= self.heartbeat_s]
+        self.last_publish[heartbeat] = now
+        return telemetry, heartbeat
@@ -0,0 +1,139 @@
+# src/utils/inbound_queue.py
+"""
+Bounded inbound pipeline for the manager
+Responsibilities:
+- ConflatingQueue: bounded FIFO keyed by device; a newer conflatable message
+  (telemetry, heartbeat) replaces the one still waiting for the same key,
+  keeping its place in line
+- Overflow policy: evict the oldest conflatable message (stale data), and only
+  when none is left drop the incoming one
+- Essential messages (safety events, resync requests) are never evicted nor
+  dropped: when the queue is full of them it grows past maxsize instead
+- TokenBucket: per-device rate limit against devices flooding the broker;
+  buckets that refilled completely are pruned (a new one behaves the same)
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+
+# put() outcomes
+QUEUED = "queued"
+CONFLATED = "conflated" # Replaced a waiting message for the same key
+EVICTED = "evicted" # Queued, the oldest conflatable message was dropped to make room
+DROPPED = "dropped" # Queue full of non-evictable messages: incoming message dropped
+
+
+class TokenBucket:
+    """rate tokens/s, up to burst tokens; one token per message"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def level(self, now: float) -> float:
+        """Tokens available at now"""
+        return min(self.burst, self.tokens + (now - self.updated) * self.rate)
+
+    def allow(self, now: float) -> bool:
+        self.tokens = self.level(now)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class RateLimiter:
+    """
+    One TokenBucket per key, created on first use (rate <= 0 disables limiting).
+    Every prune_interval seconds (default: the time a bucket takes to refill) the
+    full buckets are dropped, so keys of devices that went away don't accumulate.
+    """
+
+    def __init__(self, rate: float, burst: float, prune_interval: float = None):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.buckets = {} # {key: TokenBucket}
+        self.prune_interval = prune_interval if prune_interval is not None else (
+            max(self.burst / rate, 1.0) if rate > 0 else 0.0)
+        self._pruned_at = None
+
+    def allow(self, key, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        if self._pruned_at is None:
+            self._pruned_at = now
+        elif now - self._pruned_at >= self.prune_interval:
+            self.prune(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+        return bucket.allow(now)
+
+    def prune(self, now: float) -> int:
+        """Drop the buckets that are full again; returns how many were dropped"""
+        self._pruned_at = now
+        full = [key for key, bucket in self.buckets.items() if bucket.level(now) >= bucket.burst]
+        for key in full:
+            del self.buckets[key]
+        return len(full)
+
+    def forget(self, key):
+        self.buckets.pop(key, None)
+
+
+class ConflatingQueue:
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, int(maxsize))
+        self._items = OrderedDict() # {key: (item, evictable)}, oldest first
+        self._unique = itertools.count() # Keys for messages that must not be conflated
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, key, item, conflate: bool = True, essential: bool = False):
+        """
+        Enqueue item; returns QUEUED, CONFLATED, EVICTED or DROPPED.
+        essential: never evicted later, never dropped (may exceed maxsize)
+        """
+        evictable = conflate and not essential
+        with self._cond:
+            if conflate and key in self._items:
+                self._items[key] = (item, evictable) # Same position, newest payload
+                return CONFLATED
+
+            outcome = QUEUED
+            if len(self._items) >= self.maxsize:
+                stale = next((k for k, (_, e) in self._items.items() if e), None)
+                if stale is not None:
+                    del self._items[stale]
+                    outcome = EVICTED
+                elif not essential:
+                    return DROPPED
+
+            self._items[key if conflate else ("#", next(self._unique))] = (item, evictable)
+            self._cond.notify()
+            return outcome
+
+    def get(self, timeout: float = None):
+        """Oldest item, or None on timeout / after close()"""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            _, (item, _) = self._items.popitem(last=False)
+            return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
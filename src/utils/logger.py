@@ -0,0 +1,182 @@
+# src/utils/logger.py
+"""
+Structured, asynchronous logging for hot paths
+Responsibilities:
+- Category loggers with levels (LOG_LEVEL, per-category LOG_LEVELS)
+- Per-category rate limiting (LOG_RATE_LIMIT, LOG_RATE_LIMITS) before enqueueing
+- Queue-based handler: formatting and console I/O happen on a listener thread
+- key=value (or JSON) output with structured fields
+
+Usage on hot paths (nothing is built or formatted when the level is off):
+    LOG = get_logger("manager.helmet")
+    if LOG.isEnabledFor(logging.DEBUG):
+        LOG.debug("📥 RECV Helmet", extra={"fields": {"id": helmet_id, "battery": battery}})
+
+Config examples:
+    LOG_LEVEL=INFO
+    LOG_LEVELS="manager.helmet=DEBUG,station=WARNING"
+    LOG_RATE_LIMIT=50                      # records/s per category, 0 = unlimited
+    LOG_RATE_LIMITS="manager.helmet=5"
+    LOG_FORMAT=text                        # text | json
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+NAMESPACE = "csms"
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", 50))
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def _parse_mapping(spec):
+    """'a=1,b.c=2' -> {'a': '1', 'b.c': '2'}"""
+    mapping = {}
+    for item in spec.split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+
+def _category(record):
+    prefix = NAMESPACE + "."
+    return record.name[len(prefix):] if record.name.startswith(prefix) else record.name
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per category. Records over the limit are dropped before they
+    reach the queue; the number dropped is attached to the next record that passes.
+    WARNING and above are never dropped.
+    """
+
+    def __init__(self, default_rate=LOG_RATE_LIMIT, rates=None):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = {k: float(v) for k, v in (rates or {}).items()}
+        self._buckets = {}  # {category: [tokens, last_refill, suppressed]}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, category):
+        name = category
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return self.default_rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        category = _category(record)
+        rate = self._rate_for(category)
+        if rate <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(category)
+            if bucket is None:
+                bucket = [rate, now, 0]
+                self._buckets[category] = bucket
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders `time level [category] message key=value ...` or one JSON object per line"""
+
+    def __init__(self, fmt=LOG_FORMAT):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record):
+        fields = dict(getattr(record, "fields", None) or {})
+        if getattr(record, "suppressed", 0):
+            fields["suppressed"] = record.suppressed
+        message = record.getMessage()
+
+        if self.json:
+            entry = {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "category": _category(record),
+                "msg": message,
+            }
+            entry.update(fields)
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str, ensure_ascii=False)
+
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} [{_category(record)}] {message}"
+        if fields:
+            line += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The default prepare() formats the message in the caller's thread;
+    # keep the record intact so formatting happens on the listener thread.
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # Never block a hot path on logging
+
+
+def setup_logging():
+    """Install the queue handler and its listener once per process"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        root = logging.getLogger(NAMESPACE)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.propagate = False
+        for name, level in _parse_mapping(LOG_LEVELS).items():
+            logging.getLogger(f"{NAMESPACE}.{name}").setLevel(getattr(logging, level.upper(), logging.INFO))
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = _DeferredQueueHandler(log_queue)
+        handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, _parse_mapping(LOG_RATE_LIMITS)))
+        root.addHandler(handler)
+
+        console = logging.StreamHandler()
+        console.setFormatter(StructuredFormatter())
+        _listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(category):
+    """Logger for a category such as 'manager.helmet' (dotted names inherit levels)"""
+    return logging.getLogger(f"{NAMESPACE}.{category}")
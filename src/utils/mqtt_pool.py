@@ -0,0 +1,50 @@
+# src/utils/mqtt_pool.py
+"""
+Small pool of MQTT connections shared by many simulated devices
+Responsibilities:
+- Open N client connections (each with its own network loop thread)
+- Map every device to one connection (stable, so per-device message order is kept)
+- Route subscriptions/callbacks through the first ("primary") connection
+"""
+
+import paho.mqtt.client as mqtt
+
+
+class MqttClientPool:
+
+    def __init__(self, size: int, client_id_prefix: str, username: str = None, password: str = None,
+                 userdata=None, on_connect=None, on_message=None):
+        self.clients = []
+        for i in range(max(1, int(size))):
+            client = mqtt.Client(f"{client_id_prefix}-{i}", userdata=userdata)
+            if username:
+                client.username_pw_set(username, password)
+            client.max_inflight_messages_set(1000) # QoS 1 throughput: don't wait for each PUBACK
+            client.max_queued_messages_set(0) # Unbounded local queue
+            self.clients.append(client)
+
+        # Commands and other subscriptions arrive on the primary connection only
+        self.primary = self.clients[0]
+        if on_connect:
+            self.primary.on_connect = on_connect
+        if on_message:
+            self.primary.on_message = on_message
+
+    def __len__(self):
+        return len(self.clients)
+
+    def connect(self, host, port):
+        for client in self.clients:
+            client.connect(host, port)
+            client.loop_start()
+
+    def client_for(self, key: int):
+        return self.clients[key % len(self.clients)]
+
+    def publish(self, key: int, topic, payload, qos=0, retain=False):
+        return self.client_for(key).publish(topic, payload, qos, retain)
+
+    def stop(self):
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
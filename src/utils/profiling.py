@@ -0,0 +1,276 @@
+# src/utils/profiling.py
+"""
+On-demand profiling for long-running processes
+Responsibilities:
+- Deterministic profiling (cProfile) of a registered hot callable for N seconds
+- Sampling profiler over all threads for N seconds (collapsed stacks)
+- tracemalloc snapshots
+- Triggers: POSIX signals and an MQTT control topic
+
+Nothing is installed unless PROFILING_ENABLED=1, and while no session is
+running the profiled callables are the original ones (no wrapper, no hook).
+
+Control topic payloads (JSON):
+    {"command": "cprofile", "seconds": 30}
+    {"command": "sample", "seconds": 30, "interval": 0.005}
+    {"command": "tracemalloc", "seconds": 30}
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", ROOT / "data" / "profiles"))
+PROFILE_SECONDS = float(os.getenv("PROFILE_SECONDS", 30))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile")  # Action for SIGUSR1: cprofile | sample
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", 25))
+
+
+class ProfilingController:
+    """
+    Runs one profiling session of each kind at a time and writes results
+    to PROFILE_DIR as <process>-<kind>-<timestamp>.<ext>.
+
+    targets: list of (owner, attribute_name) pairs whose callable is swapped
+    with a cProfile wrapper for the duration of a cprofile session, e.g.
+    (mqtt_client, "on_message") or (app, "wsgi_app").
+    """
+
+    def __init__(self, process_name, targets=None, output_dir=PROFILE_DIR):
+        self.process_name = process_name
+        self.targets = list(targets or [])
+        self.output_dir = Path(output_dir)
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    # --- Session bookkeeping ---
+
+    def _acquire(self, kind):
+        with self._lock:
+            if kind in self._busy:
+                print(f"⚠️  [PROF] {kind} session already running for {self.process_name}")
+                return False
+            self._busy.add(kind)
+            return True
+
+    def _release(self, kind):
+        with self._lock:
+            self._busy.discard(kind)
+
+    def _output_path(self, kind, ext):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return self.output_dir / f"{self.process_name}-{kind}-{stamp}.{ext}"
+
+    def _after(self, seconds, func):
+        timer = threading.Timer(seconds, func)
+        timer.daemon = True
+        timer.start()
+
+    # --- cProfile ---
+
+    def start_cprofile(self, seconds=PROFILE_SECONDS):
+        """Profile every call of the registered targets for `seconds`"""
+        if not self.targets:
+            print(f"⚠️  [PROF] No cProfile targets registered for {self.process_name}, sampling instead")
+            return self.start_sampling(seconds)
+        if not self._acquire("cprofile"):
+            return False
+
+        profiler = cProfile.Profile()
+        originals = []
+        for owner, name in self.targets:
+            original = getattr(owner, name)
+            originals.append((owner, name, original))
+            setattr(owner, name, self._wrap(profiler, original))
+
+        def stop():
+            for owner, name, original in originals:
+                setattr(owner, name, original)
+            try:
+                path = self._output_path("cprofile", "prof")
+                profiler.dump_stats(path)
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+                path.with_suffix(".txt").write_text(summary.getvalue())
+                print(f"✅ [PROF] cProfile written to {path}")
+            except Exception as e:
+                print(f"❌ [PROF] Failed to write cProfile results: {e}")
+            finally:
+                self._release("cprofile")
+
+        print(f"🔬 [PROF] cProfile ON for {seconds:g}s ({self.process_name})")
+        self._after(seconds, stop)
+        return True
+
+    @staticmethod
+    def _wrap(profiler, func):
+        # The profiler is enabled only around each call, in the calling thread
+        @functools.wraps(func)
+        def profiled(*args, **kwargs):
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+        return profiled
+
+    # --- Sampling profiler ---
+
+    def start_sampling(self, seconds=PROFILE_SECONDS, interval=PROFILE_SAMPLE_INTERVAL):
+        """Sample the stacks of all threads every `interval` seconds"""
+        if not self._acquire("sample"):
+            return False
+
+        def run():
+            stacks = Counter()
+            own_id = threading.get_ident()
+            names = {}
+            deadline = time.monotonic() + seconds
+            samples = 0
+            try:
+                while time.monotonic() < deadline:
+                    for thread in threading.enumerate():
+                        names[thread.ident] = thread.name
+                    for thread_id, frame in sys._current_frames().items():
+                        if thread_id == own_id:
+                            continue
+                        stack = []
+                        while frame is not None:
+                            code = frame.f_code
+                            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                            frame = frame.f_back
+                        stack.append(names.get(thread_id, str(thread_id)))
+                        stacks[";".join(reversed(stack))] += 1
+                    samples += 1
+                    time.sleep(interval)
+                self._write_samples(stacks, samples, interval)
+            except Exception as e:
+                print(f"❌ [PROF] Sampling failed: {e}")
+            finally:
+                self._release("sample")
+
+        print(f"🔬 [PROF] Sampling ON for {seconds:g}s every {interval * 1000:.1f}ms ({self.process_name})")
+        threading.Thread(target=run, name="profiling-sampler", daemon=True).start()
+        return True
+
+    def _write_samples(self, stacks, samples, interval):
+        # Collapsed stacks: readable by flamegraph.pl and speedscope
+        path = self._output_path("sample", "collapsed")
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        lines = [f"{samples} sampling rounds, interval {interval * 1000:.1f}ms", ""]
+        for leaf, count in leaves.most_common(40):
+            lines.append(f"{100.0 * count / total:6.2f}%  {count:7d}  {leaf}")
+        path.with_suffix(".txt").write_text("\n".join(lines) + "\n")
+        print(f"✅ [PROF] Samples written to {path}")
+
+    # --- tracemalloc ---
+
+    def start_tracemalloc(self, seconds=PROFILE_SECONDS):
+        """Trace allocations for `seconds`, then dump a snapshot and top allocators"""
+        if not self._acquire("tracemalloc"):
+            return False
+
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+
+        def stop():
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                path = self._output_path("tracemalloc", "snapshot")
+                snapshot.dump(str(path))
+                lines = [f"{stat}" for stat in snapshot.statistics("lineno")[:40]]
+                path.with_suffix(".txt").write_text("\n".join(lines) + "\n")
+                print(f"✅ [PROF] tracemalloc snapshot written to {path}")
+            except Exception as e:
+                print(f"❌ [PROF] Failed to write tracemalloc snapshot: {e}")
+            finally:
+                if not already_tracing:
+                    tracemalloc.stop()
+                self._release("tracemalloc")
+
+        print(f"🔬 [PROF] tracemalloc ON for {seconds:g}s ({self.process_name})")
+        self._after(seconds, stop)
+        return True
+
+    # --- Triggers ---
+
+    def handle_command(self, payload):
+        """Dispatch a control payload (dict) to the matching session"""
+        command = payload.get("command")
+        seconds = float(payload.get("seconds", PROFILE_SECONDS))
+
+        if command == "cprofile":
+            return self.start_cprofile(seconds)
+        elif command == "sample":
+            return self.start_sampling(seconds, float(payload.get("interval", PROFILE_SAMPLE_INTERVAL)))
+        elif command == "tracemalloc":
+            return self.start_tracemalloc(seconds)
+        print(f"⚠️  [PROF] Unknown profiling command: {command}")
+        return False
+
+    def install_signal_handlers(self):
+        """SIGUSR1 -> PROFILE_MODE session, SIGUSR2 -> tracemalloc snapshot (POSIX only)"""
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        def on_usr1(signum, frame):
+            # Timers/threads do the work, the handler only schedules it
+            if PROFILE_MODE == "sample":
+                self.start_sampling()
+            else:
+                self.start_cprofile()
+
+        def on_usr2(signum, frame):
+            self.start_tracemalloc()
+
+        signal.signal(signal.SIGUSR1, on_usr1)
+        signal.signal(signal.SIGUSR2, on_usr2)
+        print(f"🔬 [PROF] kill -USR1 {os.getpid()} -> {PROFILE_MODE}, kill -USR2 {os.getpid()} -> tracemalloc")
+
+    def attach_mqtt(self, client, topic):
+        """
+        Listen for control payloads on `topic`.
+        Call from on_connect so the subscription survives reconnects.
+        """
+        def on_control(client, userdata, message):
+            try:
+                self.handle_command(json.loads(message.payload.decode("utf-8")))
+            except Exception as e:
+                print(f"❌ [PROF] Invalid profiling command: {e}")
+
+        client.message_callback_add(topic, on_control)
+        client.subscribe(topic, qos=1)
+
+
+def setup_profiling(process_name, targets=None):
+    """Return a ProfilingController with signal handlers installed, or None when disabled"""
+    if not PROFILING_ENABLED:
+        return None
+    controller = ProfilingController(process_name, targets)
+    controller.install_signal_handlers()
+    return controller
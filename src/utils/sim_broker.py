@@ -0,0 +1,128 @@
+# src/utils/sim_broker.py
+"""
+In-process MQTT broker for simulations
+Responsibilities:
+- Topic routing with MQTT wildcards (+, #) and retained messages
+- SimClient: the subset of the paho client API used by the manager, the alarm
+  and the device simulators (publish, subscribe, callbacks, user data)
+
+Deliveries are scheduled on a SimClock (call_soon), never run inline, so
+callbacks don't re-enter each other and ordering is deterministic.
+"""
+
+import itertools
+from paho.mqtt.client import topic_matches_sub
+
+
+class SimMessage:
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class SimPublishResult:
+
+    def __init__(self, mid):
+        self.rc = 0
+        self.mid = mid
+
+    def wait_for_publish(self, timeout=None):
+        return None
+
+    def is_published(self):
+        return True
+
+
+class SimBroker:
+
+    def __init__(self, clock, latency: float = 0.0):
+        self.clock = clock
+        self.latency = latency # Virtual seconds between publish and delivery
+        self.clients = []
+        self.retained = {} # {topic: SimMessage}
+        self._mid = itertools.count(1)
+        self.messages_routed = 0
+
+    def client(self, client_id):
+        client = SimClient(self, client_id)
+        self.clients.append(client)
+        return client
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif payload is None:
+            payload = b""
+        message = SimMessage(topic, payload, qos, False, next(self._mid))
+        if retain:
+            if payload:
+                self.retained[topic] = SimMessage(topic, payload, qos, True, message.mid)
+            else:
+                self.retained.pop(topic, None) # Empty retained payload clears the topic
+
+        for client in self.clients:
+            if client.connected and client.matches(topic):
+                self.clock.call_later(self.latency, client._deliver, message)
+                self.messages_routed += 1
+        return SimPublishResult(message.mid)
+
+    def subscribe(self, client, pattern):
+        # Retained messages matching a new subscription are delivered right away
+        for topic, message in list(self.retained.items()):
+            if topic_matches_sub(pattern, topic):
+                self.clock.call_later(self.latency, client._deliver, message)
+
+
+class SimClient:
+
+    def __init__(self, broker, client_id):
+        self.broker = broker
+        self.client_id = client_id
+        self.subscriptions = [] # Patterns, in subscription order
+        self.connected = False
+        self._userdata = None
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+
+    def user_data_set(self, userdata):
+        self._userdata = userdata
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self.connected = True
+        if self.on_connect:
+            self.broker.clock.call_soon(self.on_connect, self, self._userdata, {}, 0)
+        return 0
+
+    def disconnect(self):
+        self.connected = False
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def subscribe(self, pattern, qos=0):
+        if pattern not in self.subscriptions:
+            self.subscriptions.append(pattern)
+        self.broker.subscribe(self, pattern)
+        return (0, 0)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return self.broker.publish(topic, payload, qos, retain)
+
+    def matches(self, topic):
+        # One delivery per client, even with overlapping subscriptions
+        return any(topic_matches_sub(pattern, topic) for pattern in self.subscriptions)
+
+    def _deliver(self, message):
+        if self.connected and self.on_message:
+            self.on_message(self, self._userdata, message)
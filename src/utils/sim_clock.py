@@ -0,0 +1,113 @@
+# src/utils/sim_clock.py
+"""
+Injectable clock and discrete-event scheduler
+Responsibilities:
+- `clock`: the time source used by the manager, site state and device models
+  (wall clock by default, so production behaviour is unchanged)
+- SimClock: virtual time plus a heap of scheduled callbacks, advanced as fast
+  as the CPU allows (no sleeps)
+
+Events with the same due time run in scheduling order, so a seeded run is
+fully deterministic.
+"""
+
+import heapq
+import itertools
+import time
+
+
+class WallClock:
+    """Real time (the default)"""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimClock:
+    """Virtual time: monotonic() starts at 0, time() at a fixed epoch"""
+
+    def __init__(self, epoch: float = 1_700_000_000.0):
+        self.now = 0.0
+        self.epoch = float(epoch)
+        self._queue = [] # [when, seq, callback, args]; callback None = cancelled
+        self._seq = itertools.count()
+        self.events_run = 0
+
+    def time(self):
+        return self.epoch + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    # --- Scheduler ---
+
+    def call_at(self, when, callback, *args):
+        event = [max(when, self.now), next(self._seq), callback, args]
+        heapq.heappush(self._queue, event)
+        return event
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.now + max(0.0, delay), callback, *args)
+
+    def call_soon(self, callback, *args):
+        return self.call_at(self.now, callback, *args)
+
+    def call_every(self, interval, callback, *args, first=None):
+        """Run callback every interval seconds (first run after `first`, default one interval)"""
+        def repeat():
+            callback(*args)
+            self.call_later(interval, repeat)
+        return self.call_later(interval if first is None else first, repeat)
+
+    @staticmethod
+    def cancel(event):
+        if event is not None:
+            event[2] = None
+
+    def run_until(self, end):
+        """Run every event due up to `end` (virtual seconds), then move the clock to `end`"""
+        queue = self._queue
+        while queue and queue[0][0] <= end:
+            when, _, callback, args = heapq.heappop(queue)
+            if callback is None:
+                continue
+            self.now = when
+            callback(*args)
+            self.events_run += 1
+        self.now = max(self.now, end)
+
+
+class _ClockProxy:
+    """Module-level handle that always forwards to the installed clock"""
+
+    def time(self):
+        return _active.time()
+
+    def monotonic(self):
+        return _active.monotonic()
+
+    def sleep(self, seconds):
+        _active.sleep(seconds)
+
+
+_active = WallClock()
+clock = _ClockProxy()
+
+
+def set_clock(new_clock):
+    """Install a clock (e.g. SimClock) for every module using `clock`"""
+    global _active
+    _active = new_clock
+
+
+def get_clock():
+    return _active
@@ -0,0 +1,97 @@
+# src/utils/snapshot_cache.py
+"""
+Shared, pre-serialized response snapshot for the web server
+Responsibilities:
+- One background thread watches the storage's data_version() (file mtimes for
+  csv, PRAGMA data_version for sqlite) and rebuilds the snapshot only when it changes
+- The snapshot is immutable: JSON bytes, their gzip form and an ETag, swapped in
+  one assignment, so every concurrent request serves the same bytes without locking
+- Request cost no longer depends on the data: no reads, no parsing, no serialization
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+
+class Snapshot:
+
+    __slots__ = ("body", "gzip_body", "etag", "built_at", "version")
+
+    def __init__(self, data, version):
+        self.body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=5)
+        self.etag = hashlib.sha1(self.body).hexdigest()[:16]
+        self.built_at = time.time()
+        self.version = version
+
+    def with_version(self, version):
+        """Copy with the same content (and build time) for another data version"""
+        copy = Snapshot.__new__(Snapshot)
+        copy.body, copy.gzip_body, copy.etag, copy.built_at = self.body, self.gzip_body, self.etag, self.built_at
+        copy.version = version
+        return copy
+
+
+class SnapshotCache:
+    """
+    build() -> dict of the response; version() -> any value that changes with the data
+    (None = unknown: rebuild every interval).
+    """
+
+    def __init__(self, build, version, interval: float = 0.5, on_build=None):
+        self.build = build
+        self.version = version
+        self.interval = interval
+        self.on_build = on_build # Called with the build time in seconds (metrics)
+        self.snapshot = None
+        self.builds = 0
+        self._lock = threading.Lock() # Only one build at a time
+        self._thread = None
+        self._stop = threading.Event()
+
+    def get(self):
+        """Current snapshot (built inline the first time)"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self.refresh(force=True)
+        return snapshot
+
+    def refresh(self, force=False):
+        """Rebuild if the data version changed; returns the current snapshot"""
+        with self._lock:
+            try:
+                version = self.version()
+            except Exception:
+                version = None
+            current = self.snapshot
+            if current is not None and not force and version is not None and version == current.version:
+                return current
+
+            start = time.perf_counter()
+            snapshot = Snapshot(self.build(), version)
+            if current is not None and snapshot.etag == current.etag:
+                snapshot = current.with_version(version) # Same content: keep the old build time
+            else:
+                self.builds += 1
+            self.snapshot = snapshot
+            if self.on_build:
+                self.on_build(time.perf_counter() - start)
+            return snapshot
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️  Snapshot refresh failed: {e}")
@@ -0,0 +1,581 @@
+# src/utils/storage.py
+"""
+Storage backends for the manager's live site state (and readers for the web UI)
+Responsibilities:
+- StorageBackend: the interface (and a no-op backend for in-memory runs)
+- CsvStorage: the historical files in data/dynamic (map.csv, helmets.csv, stations.csv, alarm_status.csv)
+- SqliteStorage: one WAL-mode database per site (state.db) with latest device state,
+  sector status, alarm state, an append-only events table and (optionally) the
+  telemetry history exported by process/export_history.py, trimmed to a retention window
+- Sector layers: one value per sector index (e.g. the exposure heatmap), replaced whole
+- Worker doses: shift noise dose and dust exposure per helmet, upserted by id
+
+Writers buffer changes (upserts by id, appended events) and write them in one
+batch on flush(), called from the manager tick. Readers (read_snapshot,
+read_events) use their own connection: in WAL mode they never block the writer.
+"""
+
+import csv
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+BACKENDS = ("csv", "sqlite")
+SQLITE_FILENAME = "state.db"
+
+HELMET_FIELDS = ("latitude", "longitude", "battery", "led")
+STATION_FIELDS = ("latitude", "longitude", "dust", "noise", "gas", "is_dangerous")
+HISTORY_FIELDS = ("latitude", "longitude", "battery", "led", "dust", "noise", "gas")
+DOSE_FIELDS = ("noise_dose", "dust_twa", "noise_level", "dust_level", "over_limit")
+HISTORY_PRUNE_INTERVAL = 3600.0 # Seconds of history time between two retention deletes
+
+
+class StorageBackend:
+    """No-op backend (nothing persisted); the base of the real ones"""
+
+    name = "none"
+
+    def save_sectors(self, sectors, mask):
+        """Full sector table: sectors = site.grid, mask = dangerous flag per sector index"""
+
+    def update_sectors(self, indices, mask):
+        """Sector indices whose status changed"""
+
+    def upsert_helmet(self, helmet_id, state, t):
+        pass
+
+    def upsert_station(self, station_id, state, t):
+        pass
+
+    def set_alarm(self, alarm_id, active, t):
+        pass
+
+    def record_event(self, t, kind, device_id=None, data=None):
+        pass
+
+    def record_telemetry(self, device_type, device_id, t, values):
+        """One telemetry reading for the history (values: decoded SenML fields)"""
+
+    def save_sector_layer(self, name, values, t, since=None):
+        """Named per-sector values (indexed like site.grid), replacing the previous ones"""
+
+    def save_worker_doses(self, doses, t):
+        """{helmet_id: {noise_dose, dust_twa, noise_level, dust_level, over_limit}} (see model/worker_dose.py)"""
+
+    def flush(self):
+        """Write everything buffered since the last flush; returns True if something was written"""
+        return False
+
+    def close(self):
+        self.flush()
+
+    # --- Readers (web server) ---
+
+    def read_snapshot(self):
+        return {"sectors": [], "helmets": [], "stations": [], "alarm_active": False}
+
+    def read_events(self, limit=100, kind=None, since=None):
+        return []
+
+    def read_sector_layers(self):
+        """{name: {"values": [...], "t": updated at, "since": start of accumulation}}"""
+        return {}
+
+    def read_worker_doses(self):
+        """[{"id", "noise_dose", "dust_twa", "noise_level", "dust_level", "over_limit", "updated_at"}]"""
+        return []
+
+    def data_version(self):
+        """Changes whenever stored data may have changed (None = unknown)"""
+        return None
+
+
+class CsvStorage(StorageBackend):
+    """
+    The historical CSV files. Each file is rewritten whole, at most once per flush.
+    Events are not stored (CSV snapshots have no history).
+    """
+
+    name = "csv"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.sectors = [] # [(id, vertices_json)] by sector index
+        self.mask = []
+        self.helmets = {} # {id: row dict}
+        self.stations = {}
+        self.alarm_active = False
+        self.layers = {} # {name: (values_json, t, since)}
+        self.doses = {} # {helmet_id: row dict}
+        self.doses_at = None
+        self.dirty = set() # File names to rewrite
+        self.files_written = 0
+
+    def save_sectors(self, sectors, mask):
+        self.sectors = [
+            (sector.id, json.dumps([[p.latitude, p.longitude] for p in sector.area_vertices.vertices]))
+            for sector in sectors
+        ]
+        self.mask = [1 if dangerous else 0 for dangerous in mask]
+        self.dirty.add("map.csv")
+
+    def update_sectors(self, indices, mask):
+        for i in indices:
+            self.mask[i] = 1 if mask[i] else 0
+        self.dirty.add("map.csv")
+
+    def upsert_helmet(self, helmet_id, state, t):
+        self.helmets[helmet_id] = {field: state.get(field, 0) for field in HELMET_FIELDS}
+        self.dirty.add("helmets.csv")
+
+    def upsert_station(self, station_id, state, t):
+        row = {field: state.get(field, 0) for field in STATION_FIELDS}
+        row["is_dangerous"] = 1 if row["is_dangerous"] else 0
+        self.stations[station_id] = row
+        self.dirty.add("stations.csv")
+
+    def set_alarm(self, alarm_id, active, t):
+        self.alarm_active = bool(active)
+        self.dirty.add("alarm_status.csv")
+
+    def save_sector_layer(self, name, values, t, since=None):
+        self.layers[name] = (_layer_json(values), t, since)
+        self.dirty.add("layers.csv")
+
+    def save_worker_doses(self, doses, t):
+        self.doses.update(doses)
+        self.doses_at = t
+        self.dirty.add("doses.csv")
+
+    def flush(self):
+        if not self.dirty:
+            return False
+        dirty, self.dirty = self.dirty, set()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name in sorted(dirty):
+            if name == "map.csv":
+                header, rows = ["id", "vertices_json", "status"], (
+                    [sector_id, vertices, status] for (sector_id, vertices), status in zip(self.sectors, self.mask))
+            elif name == "helmets.csv":
+                header, rows = ["id", *HELMET_FIELDS], (
+                    [helmet_id, *(row[f] for f in HELMET_FIELDS)] for helmet_id, row in list(self.helmets.items()))
+            elif name == "stations.csv":
+                header, rows = ["id", *STATION_FIELDS], (
+                    [station_id, *(row[f] for f in STATION_FIELDS)] for station_id, row in list(self.stations.items()))
+            elif name == "layers.csv":
+                header, rows = ["layer", "updated_at", "since", "values_json"], (
+                    [layer, t, "" if since is None else since, values] for layer, (values, t, since) in list(self.layers.items()))
+            elif name == "doses.csv":
+                header, rows = ["id", *DOSE_FIELDS, "updated_at"], (
+                    [helmet_id, *("" if row[f] is None else int(row[f]) if f == "over_limit" else row[f] for f in DOSE_FIELDS),
+                     self.doses_at]
+                    for helmet_id, row in list(self.doses.items()))
+            else:
+                header, rows = ["alarm_active"], [[1 if self.alarm_active else 0]]
+            with open(self.directory / name, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+            self.files_written += 1
+        return True
+
+    # --- Readers ---
+
+    def _read_rows(self, name):
+        path = self.directory / name
+        if not path.exists():
+            return []
+        try:
+            with open(path, newline="") as f:
+                return list(csv.DictReader(f))
+        except Exception as e:
+            print(f"Error reading {name}: {e}")
+            return []
+
+    def read_snapshot(self):
+        data = super().read_snapshot()
+        for row in self._read_rows("map.csv"):
+            data["sectors"].append({
+                "id": row["id"], "vertices": json.loads(row["vertices_json"]), "status": int(row.get("status") or 0)})
+        for row in self._read_rows("helmets.csv"):
+            if not row.get("latitude") or not row.get("longitude"):
+                continue
+            data["helmets"].append({
+                "id": row["id"],
+                "latitude": float(row["latitude"]),
+                "longitude": float(row["longitude"]),
+                "battery": int(float(row.get("battery") or 0)),
+                "led": int(float(row.get("led") or 0))
+            })
+        for row in self._read_rows("stations.csv"):
+            if not row.get("latitude") or not row.get("longitude"):
+                continue
+            data["stations"].append({
+                "id": row["id"],
+                "latitude": float(row["latitude"]),
+                "longitude": float(row["longitude"]),
+                "dust": float(row.get("dust") or 0),
+                "noise": float(row.get("noise") or 0),
+                "gas": float(row.get("gas") or 0),
+                "is_dangerous": int(float(row.get("is_dangerous") or 0)) == 1
+            })
+        alarm = self._read_rows("alarm_status.csv")
+        data["alarm_active"] = bool(alarm) and int(float(alarm[0].get("alarm_active") or 0)) == 1
+        return data
+
+    def read_sector_layers(self):
+        return {
+            row["layer"]: {
+                "values": json.loads(row["values_json"]),
+                "t": float(row["updated_at"]),
+                "since": float(row["since"]) if row.get("since") else None
+            }
+            for row in self._read_rows("layers.csv")
+        }
+
+    def read_worker_doses(self):
+        return [
+            {
+                "id": row["id"],
+                "noise_dose": float(row["noise_dose"] or 0),
+                "dust_twa": float(row["dust_twa"] or 0),
+                "noise_level": float(row["noise_level"]) if row.get("noise_level") else None,
+                "dust_level": float(row["dust_level"]) if row.get("dust_level") else None,
+                "over_limit": int(row.get("over_limit") or 0) == 1,
+                "updated_at": float(row["updated_at"]) if row.get("updated_at") else None
+            }
+            for row in self._read_rows("doses.csv")
+        ]
+
+    def data_version(self):
+        versions = []
+        for name in ("map.csv", "helmets.csv", "stations.csv", "alarm_status.csv", "layers.csv", "doses.csv"):
+            try:
+                stat = (self.directory / name).stat()
+                versions.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                versions.append(None)
+        return tuple(versions)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sectors (
+    idx INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    vertices_json TEXT NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS helmets (
+    id TEXT PRIMARY KEY,
+    latitude REAL, longitude REAL, battery INTEGER, led INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS stations (
+    id TEXT PRIMARY KEY,
+    latitude REAL, longitude REAL, dust REAL, noise REAL, gas REAL, is_dangerous INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS alarms (
+    id TEXT PRIMARY KEY,
+    active INTEGER NOT NULL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    t REAL NOT NULL,
+    kind TEXT NOT NULL,
+    device_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_t ON events (t);
+CREATE INDEX IF NOT EXISTS events_kind_t ON events (kind, t);
+CREATE TABLE IF NOT EXISTS history (
+    t REAL NOT NULL,
+    device_type TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    latitude REAL, longitude REAL,
+    battery INTEGER, led INTEGER,
+    dust REAL, noise REAL, gas REAL
+);
+CREATE INDEX IF NOT EXISTS history_type_device_t ON history (device_type, device_id, t);
+CREATE INDEX IF NOT EXISTS history_t ON history (t);
+CREATE INDEX IF NOT EXISTS history_type_t ON history (device_type, t);
+CREATE TABLE IF NOT EXISTS sector_layers (
+    layer TEXT PRIMARY KEY,
+    values_json TEXT NOT NULL,
+    updated_at REAL,
+    since REAL
+);
+CREATE TABLE IF NOT EXISTS worker_doses (
+    id TEXT PRIMARY KEY,
+    noise_dose REAL, dust_twa REAL, noise_level REAL, dust_level REAL, over_limit INTEGER,
+    updated_at REAL
+);
+"""
+
+
+class SqliteStorage(StorageBackend):
+    """
+    SQLite in WAL mode. Upserts are buffered per id (only the latest state of a
+    device is written) and committed in one transaction per flush.
+    history=True also appends every telemetry reading to the history table; rows older
+    than history_retention seconds (measured from the newest reading, 0 = keep all) are
+    deleted in the flush transaction at most every HISTORY_PRUNE_INTERVAL.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, readonly=False, history=False, history_retention=0.0):
+        self.path = Path(path)
+        self.readonly = readonly
+        self.history = history
+        self.history_retention = float(history_retention)
+        self.history_pruned = 0 # Rows deleted by the retention window
+        self._history_pruned_at = None # Reading time of the last retention delete
+        self._lock = threading.Lock() # Writes come from the tick thread, buffering from the MQTT worker
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL") # Durable at checkpoints; a crash loses at most the last flushes
+            self.conn.executescript(SCHEMA)
+        self._reset_buffers()
+        self.rows_written = 0
+
+    def _reset_buffers(self):
+        self.sector_rows = None # Full sector table (save_sectors)
+        self.sector_status = {} # {idx: status}
+        self.helmet_rows = {} # {id: row tuple}
+        self.station_rows = {}
+        self.alarm_rows = {}
+        self.event_rows = []
+        self.history_rows = []
+        self.layer_rows = {} # {name: row tuple}
+        self.dose_rows = {} # {helmet_id: row tuple}
+
+    def save_sectors(self, sectors, mask):
+        rows = [
+            (sector.index, sector.id, json.dumps([[p.latitude, p.longitude] for p in sector.area_vertices.vertices]),
+             1 if dangerous else 0)
+            for sector, dangerous in zip(sectors, mask)
+        ]
+        with self._lock:
+            self.sector_rows = rows
+            self.sector_status.clear()
+
+    def update_sectors(self, indices, mask):
+        with self._lock:
+            for i in indices:
+                self.sector_status[int(i)] = 1 if mask[i] else 0
+
+    def upsert_helmet(self, helmet_id, state, t):
+        row = (helmet_id, *(state.get(f) for f in HELMET_FIELDS), t)
+        with self._lock:
+            self.helmet_rows[helmet_id] = row
+
+    def upsert_station(self, station_id, state, t):
+        row = (station_id, *(state.get(f) for f in STATION_FIELDS[:-1]), 1 if state.get("is_dangerous") else 0, t)
+        with self._lock:
+            self.station_rows[station_id] = row
+
+    def set_alarm(self, alarm_id, active, t):
+        with self._lock:
+            self.alarm_rows[alarm_id] = (alarm_id, 1 if active else 0, t)
+
+    def record_event(self, t, kind, device_id=None, data=None):
+        with self._lock:
+            self.event_rows.append((t, kind, device_id, json.dumps(data, separators=(",", ":")) if data else None))
+
+    def record_telemetry(self, device_type, device_id, t, values):
+        if not self.history:
+            return
+        row = (t, device_type, device_id, *(values.get(f) for f in HISTORY_FIELDS))
+        with self._lock:
+            self.history_rows.append(row)
+
+    def save_sector_layer(self, name, values, t, since=None):
+        row = (name, _layer_json(values), t, since)
+        with self._lock:
+            self.layer_rows[name] = row
+
+    def save_worker_doses(self, doses, t):
+        rows = {
+            helmet_id: (helmet_id, *(int(d[f]) if f == "over_limit" else d[f] for f in DOSE_FIELDS), t)
+            for helmet_id, d in doses.items()
+        }
+        with self._lock:
+            self.dose_rows.update(rows)
+
+    def flush(self):
+        with self._lock:
+            sectors, status = self.sector_rows, self.sector_status
+            helmets, stations = self.helmet_rows, self.station_rows
+            alarms, events, history = self.alarm_rows, self.event_rows, self.history_rows
+            layers, doses = self.layer_rows, self.dose_rows
+            self._reset_buffers()
+        if not (sectors or status or helmets or stations or alarms or events or history or layers or doses):
+            return False
+
+        with self.conn: # One transaction
+            if sectors is not None:
+                self.conn.execute("DELETE FROM sectors")
+                self.conn.executemany("INSERT INTO sectors (idx, id, vertices_json, status) VALUES (?, ?, ?, ?)", sectors)
+            if status:
+                self.conn.executemany("UPDATE sectors SET status = ? WHERE idx = ?", [(s, i) for i, s in status.items()])
+            if helmets:
+                self.conn.executemany(
+                    "INSERT INTO helmets (id, latitude, longitude, battery, led, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET latitude=excluded.latitude, longitude=excluded.longitude, "
+                    "battery=excluded.battery, led=excluded.led, updated_at=excluded.updated_at",
+                    helmets.values())
+            if stations:
+                self.conn.executemany(
+                    "INSERT INTO stations (id, latitude, longitude, dust, noise, gas, is_dangerous, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET latitude=excluded.latitude, longitude=excluded.longitude, "
+                    "dust=excluded.dust, noise=excluded.noise, gas=excluded.gas, "
+                    "is_dangerous=excluded.is_dangerous, updated_at=excluded.updated_at",
+                    stations.values())
+            if alarms:
+                self.conn.executemany(
+                    "INSERT INTO alarms (id, active, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET active=excluded.active, updated_at=excluded.updated_at",
+                    alarms.values())
+            if events:
+                self.conn.executemany("INSERT INTO events (t, kind, device_id, data) VALUES (?, ?, ?, ?)", events)
+            if history:
+                self.conn.executemany(
+                    "INSERT INTO history (t, device_type, device_id, latitude, longitude, battery, led, dust, noise, gas) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", history)
+                newest = history[-1][0]
+                if self.history_retention > 0 and (
+                        self._history_pruned_at is None or newest - self._history_pruned_at >= HISTORY_PRUNE_INTERVAL):
+                    self._history_pruned_at = newest
+                    self.history_pruned += self.conn.execute(
+                        "DELETE FROM history WHERE t < ?", (newest - self.history_retention,)).rowcount
+            if layers:
+                self.conn.executemany(
+                    "INSERT INTO sector_layers (layer, values_json, updated_at, since) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(layer) DO UPDATE SET values_json=excluded.values_json, "
+                    "updated_at=excluded.updated_at, since=excluded.since",
+                    layers.values())
+            if doses:
+                self.conn.executemany(
+                    "INSERT INTO worker_doses (id, noise_dose, dust_twa, noise_level, dust_level, over_limit, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET noise_dose=excluded.noise_dose, dust_twa=excluded.dust_twa, "
+                    "noise_level=excluded.noise_level, dust_level=excluded.dust_level, "
+                    "over_limit=excluded.over_limit, updated_at=excluded.updated_at",
+                    doses.values())
+        self.rows_written += (len(sectors or ()) + len(status) + len(helmets) + len(stations) + len(alarms)
+                              + len(events) + len(history) + len(layers) + len(doses))
+        return True
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+        self.conn.close()
+
+    # --- Readers ---
+
+    def read_snapshot(self):
+        data = super().read_snapshot()
+        with self._lock:
+            cur = self.conn.cursor()
+            data["sectors"] = [
+                {"id": sector_id, "vertices": json.loads(vertices), "status": status}
+                for sector_id, vertices, status in cur.execute("SELECT id, vertices_json, status FROM sectors ORDER BY idx")
+            ]
+            data["helmets"] = [
+                {"id": helmet_id, "latitude": lat, "longitude": lon, "battery": battery or 0, "led": led or 0}
+                for helmet_id, lat, lon, battery, led in cur.execute(
+                    "SELECT id, latitude, longitude, battery, led FROM helmets "
+                    "WHERE latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY id")
+            ]
+            data["stations"] = [
+                {"id": station_id, "latitude": lat, "longitude": lon,
+                 "dust": dust or 0.0, "noise": noise or 0.0, "gas": gas or 0.0, "is_dangerous": bool(dangerous)}
+                for station_id, lat, lon, dust, noise, gas, dangerous in cur.execute(
+                    "SELECT id, latitude, longitude, dust, noise, gas, is_dangerous FROM stations "
+                    "WHERE latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY id")
+            ]
+            data["alarm_active"] = cur.execute("SELECT COUNT(*) FROM alarms WHERE active = 1").fetchone()[0] > 0
+        return data
+
+    def read_events(self, limit=100, kind=None, since=None):
+        """Newest events first (indexed on t and kind, t)"""
+        query, args = "SELECT seq, t, kind, device_id, data FROM events", []
+        conditions = []
+        if kind:
+            conditions.append("kind = ?")
+            args.append(kind)
+        if since is not None:
+            conditions.append("t > ?")
+            args.append(float(since))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY t DESC LIMIT ?"
+        args.append(int(limit))
+        with self._lock:
+            rows = self.conn.execute(query, args).fetchall()
+        return [
+            {"seq": seq, "t": t, "kind": kind, "device_id": device_id, "data": json.loads(data) if data else None}
+            for seq, t, kind, device_id, data in rows
+        ]
+
+    def read_sector_layers(self):
+        with self._lock:
+            try:
+                rows = self.conn.execute("SELECT layer, values_json, updated_at, since FROM sector_layers").fetchall()
+            except sqlite3.OperationalError:
+                return {} # Database created before sector layers existed
+        return {layer: {"values": json.loads(values), "t": t, "since": since} for layer, values, t, since in rows}
+
+    def read_worker_doses(self):
+        with self._lock:
+            try:
+                rows = self.conn.execute(
+                    f"SELECT id, {', '.join(DOSE_FIELDS)}, updated_at FROM worker_doses ORDER BY id").fetchall()
+            except sqlite3.OperationalError:
+                return [] # Database created before worker doses existed
+        return [
+            {"id": helmet_id, **dict(zip(DOSE_FIELDS, values[:-1])), "over_limit": bool(values[-2]), "updated_at": values[-1]}
+            for helmet_id, *values in rows
+        ]
+
+    def data_version(self):
+        """PRAGMA data_version: changes when another connection commits"""
+        with self._lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _layer_json(values):
+    """Per-sector values as a compact JSON array (2 decimals, null where NaN)"""
+    return json.dumps([None if v != v else round(float(v), 2) for v in values], separators=(",", ":"))
+
+
+def open_storage(backend, directory, persist=True, history=False, history_retention=0.0):
+    """
+    Writer backend for a site's dynamic directory ("csv" | "sqlite"; no-op when persist is False).
+    history: keep every telemetry reading (sqlite only), for history_retention seconds (0 = forever)
+    """
+    if not persist:
+        return StorageBackend()
+    if backend == "sqlite":
+        return SqliteStorage(Path(directory) / SQLITE_FILENAME, history=history, history_retention=history_retention)
+    if backend == "csv":
+        return CsvStorage(directory)
+    raise ValueError(f"Unknown storage backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+
+
+def open_reader(backend, directory):
+    """Read side for the web server; None while the sqlite database doesn't exist yet"""
+    if backend == "sqlite":
+        path = Path(directory) / SQLITE_FILENAME
+        return SqliteStorage(path, readonly=True) if path.exists() else None
+    if backend == "csv":
+        return CsvStorage(directory)
+    raise ValueError(f"Unknown storage backend '{backend}' (expected one of {', '.join(BACKENDS)})")
@@ -1,106 +1,213 @@
 import os
-import json
-import pandas as pd
-from flask import Flask, render_template, jsonify
+import sys
+import time
+import threading
+from flask import Flask, render_template, jsonify, request, g, Response, abort, make_response
 from pathlib import Path
 from dotenv import load_dotenv
 
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+from utils.metrics import REGISTRY, CONTENT_TYPE
+from utils.profiling import setup_profiling
+from model.site_registry import SiteRegistry
+from utils.storage import open_reader
+from utils.snapshot_cache import SnapshotCache
+
 load_dotenv()
 
 MONITORING_STATION_RANGE = int(os.getenv("MONITORING_STATION_RANGE", 50))
+WEB_REFRESH_INTERVAL = float(os.getenv("WEB_REFRESH_INTERVAL", 0.5)) # Seconds between data-version checks
+WEB_MODE = os.getenv("WEB_MODE", "production").lower() # production | development (Flask debug server)
+WEB_THREADS = int(os.getenv("WEB_THREADS", 8)) # Worker threads in production mode
+WEB_PORT = int(os.getenv("WEB_PORT", 5001))
 
 app = Flask(__name__)
 
-ROOT = Path(__file__).resolve().parent
-DATA_DIR = ROOT / "data" / "dynamic"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv").lower() # Same backend as the manager
+registry = SiteRegistry(ROOT / "data") # Same sites as the manager: ?site=<site_id>, default site otherwise
+
+# Request instrumentation
+REQUESTS_TOTAL = REGISTRY.counter(
+    "web_requests_total", "HTTP requests served", ["endpoint", "method", "status"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "web_request_seconds", "Time spent handling HTTP requests", ["endpoint"])
+SNAPSHOT_BUILDS_TOTAL = REGISTRY.counter(
+    "web_snapshot_builds_total", "Response snapshots rebuilt after a data change", ["snapshot"])
+SNAPSHOT_BUILD_SECONDS = REGISTRY.histogram(
+    "web_snapshot_build_seconds", "Time spent reading and serializing a response snapshot", ["snapshot"])
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop("request_start", None)
+    endpoint = request.endpoint or "unknown"
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+    REQUESTS_TOTAL.inc(endpoint, request.method, response.status_code)
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    """Request timings in Prometheus text format"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 @app.route("/")
 def index():
     """Serves the main dashboard page"""
     return render_template("index.html")
 
+def snapshot_metrics(name):
+    """on_build callback recording a snapshot's rebuilds"""
+    def record(seconds):
+        SNAPSHOT_BUILDS_TOTAL.inc(name)
+        SNAPSHOT_BUILD_SECONDS.observe(seconds, name)
+    return record
+
+
+class SiteData:
+    """
+    Read side of one site's live state (its dynamic directory): storage opened once,
+    one snapshot per endpoint shared by every client, rebuilt by a background thread
+    when the data changes
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._storage = None
+        self._lock = threading.Lock() # Requests and the snapshot refreshers open the storage concurrently
+        self.snapshot_cache = SnapshotCache(self.build_snapshot, self.version, WEB_REFRESH_INTERVAL, on_build=snapshot_metrics("data"))
+        self.heatmap_cache = SnapshotCache(self.build_heatmap, self.version, WEB_REFRESH_INTERVAL, on_build=snapshot_metrics("heatmap"))
+        self.doses_cache = SnapshotCache(self.build_doses, self.version, WEB_REFRESH_INTERVAL, on_build=snapshot_metrics("doses"))
+
+    def storage(self):
+        """Read side of the manager's storage backend, opened once (sqlite: once the database exists)"""
+        storage = self._storage
+        if storage is None:
+            with self._lock:
+                if self._storage is None:
+                    self._storage = open_reader(STORAGE_BACKEND, self.config.dynamic_dir)
+                storage = self._storage
+        return storage
+
+    def version(self):
+        """Storage data version ("missing" until the sqlite database exists)"""
+        storage = self.storage()
+        return storage.data_version() if storage else "missing"
+
+    def build_snapshot(self):
+        """Live view as served by /api/data"""
+        storage = self.storage()
+        data = storage.read_snapshot() if storage else {"sectors": [], "helmets": [], "stations": [], "alarm_active": False}
+        data["site_id"] = self.config.site_id
+        data["station_range"] = MONITORING_STATION_RANGE
+        return data
+
+    def build_heatmap(self):
+        """Per-sector layers (same order as /api/data sectors), e.g. occupancy and danger exposure in worker-minutes"""
+        storage = self.storage()
+        return {"layers": storage.read_sector_layers() if storage else {}}
+
+    def build_doses(self):
+        """Shift noise dose (1.0 = 100 % of the allowance) and dust TWA per worker"""
+        storage = self.storage()
+        return {"workers": storage.read_worker_doses() if storage else []}
+
+
+_sites = {} # {site_id: SiteData}, created on the first request for the site
+_sites_lock = threading.Lock()
+
+def get_site_data(site_id=None):
+    """SiteData of site_id (default site when None), or None for an unknown site"""
+    site_id = site_id or registry.default_site_id
+    site = _sites.get(site_id)
+    if site is None:
+        config = registry.get(site_id)
+        if config is None:
+            return None
+        with _sites_lock:
+            site = _sites.get(site_id)
+            if site is None:
+                site = _sites[site_id] = SiteData(config)
+    return site
+
+def request_site():
+    """SiteData for the request's ?site= parameter; aborts with 404 for an unknown site"""
+    site = get_site_data(request.args.get("site"))
+    if site is None:
+        abort(make_response(jsonify({"error": f"Unknown site '{request.args.get('site')}'"}), 404))
+    return site
+
+def snapshot_response(cache):
+    """Serve a cache's current bytes (gzip if accepted), 304 when the client's ETag matches"""
+    cache.start()
+    snapshot = cache.get()
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = Response(snapshot.gzip_body, content_type="application/json")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(snapshot.body, content_type="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache" # Revalidate every poll: unchanged data costs a 304
+    response.set_etag(snapshot.etag)
+    return response.make_conditional(request)
+
+@app.route("/api/sites")
+def get_sites():
+    """Sites of the registry; every /api endpoint takes ?site=<site_id> (default site otherwise)"""
+    return jsonify({"default": registry.default_site_id, "sites": list(registry.sites)})
+
 @app.route("/api/data")
 def get_data():
-    """API endpoint to get real-time site data"""
-    map_csv = DATA_DIR / "map.csv"
-    helmets_csv = DATA_DIR / "helmets.csv"
-    
-    data = {
-        "sectors": [],
-        "helmets": [],
-        "stations": [],
-        "station_range": MONITORING_STATION_RANGE
-    }
-    
-    # Load sectors
-    if map_csv.exists():
-        try:
-            df_grid = pd.read_csv(map_csv, dtype={'id': str})
-            for _, row in df_grid.iterrows():
-                data["sectors"].append({
-                    "id": row["id"],
-                    "vertices": json.loads(row["vertices_json"]),
-                    "status": int(row.get("status", 0))
-                })
-        except Exception as e:
-            print(f"Error reading map.csv: {e}")
-
-    # Load helmets
-    if helmets_csv.exists():
-        try:
-            df_helmets = pd.read_csv(helmets_csv, dtype={'id': str})
-            for _, row in df_helmets.iterrows():
-                # Use .get() but with a default and better type conversion
-                lat = row.get("latitude")
-                lon = row.get("longitude")
-                if pd.isna(lat) or pd.isna(lon):
-                    continue
-                    
-                data["helmets"].append({
-                    "id": str(row["id"]),
-                    "latitude": float(lat),
-                    "longitude": float(lon),
-                    "battery": int(row["battery"]) if not pd.isna(row.get("battery")) else 0,
-                    "led": int(row["led"]) if not pd.isna(row.get("led")) else 0
-                })
-        except Exception as e:
-            print(f"Error reading helmets.csv: {e}")
-            
-    # Load stations
-    data["stations"] = []
-    stations_csv = DATA_DIR / "stations.csv"
-    if stations_csv.exists():
-        try:
-            df_stations = pd.read_csv(stations_csv, dtype={'id': str})
-            for _, row in df_stations.iterrows():
-                lat = row["latitude"]
-                lon = row["longitude"]
-                if pd.isna(lat) or pd.isna(lon):
-                    continue
-                data["stations"].append({
-                    "id": row["id"],
-                    "latitude": float(lat),
-                    "longitude": float(lon),
-                    "dust": float(row.get("dust", 0)) if not pd.isna(row.get("dust")) else 0,
-                    "noise": float(row.get("noise", 0)) if not pd.isna(row.get("noise")) else 0,
-                    "gas": float(row.get("gas", 0)) if not pd.isna(row.get("gas")) else 0,
-                    "is_dangerous": int(row.get("is_dangerous", 0)) == 1
-                })
-        except Exception as e:
-            print(f"Error reading stations.csv: {e}")
-            
-    # Load alarm status
-    alarm_csv = DATA_DIR / "alarm_status.csv"
-    data["alarm_active"] = False
-    if alarm_csv.exists():
-        try:
-            df_alarm = pd.read_csv(alarm_csv)
-            if not df_alarm.empty:
-                data["alarm_active"] = bool(df_alarm.iloc[0]["alarm_active"] == 1)
-        except Exception as e:
-            print(f"Error reading alarm_status.csv: {e}")
-            
-    return jsonify(data)
+    """API endpoint to get real-time site data (pre-serialized, shared snapshot)"""
+    return snapshot_response(request_site().snapshot_cache)
+
+@app.route("/api/heatmap")
+def get_heatmap():
+    """Sector heatmap layers: {"layers": {"occupancy": {"values": [...], "t", "since"}, "danger_exposure": ...}}"""
+    return snapshot_response(request_site().heatmap_cache)
+
+@app.route("/api/doses")
+def get_doses():
+    """Per-worker shift doses: {"workers": [{"id", "noise_dose", "dust_twa", "noise_level", "dust_level", "over_limit"}]}"""
+    return snapshot_response(request_site().doses_cache)
+
+@app.route("/api/events")
+def get_events():
+    """Latest safety events (sqlite backend): ?limit=100&kind=danger_enter&since=<unix time>"""
+    storage = request_site().storage()
+    if storage is None:
+        return jsonify([])
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    return jsonify(storage.read_events(limit=limit, kind=request.args.get("kind"), since=request.args.get("since", type=float)))
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    # Opt-in profiling (PROFILING_ENABLED=1): request handling is the cProfile target
+    setup_profiling("web_server", targets=[(app, "wsgi_app")])
+    default_site = get_site_data() # Warm: other sites start refreshing on their first request
+    default_site.snapshot_cache.start()
+    default_site.heatmap_cache.start()
+    default_site.doses_cache.start()
+
+    if WEB_MODE == "development":
+        app.run(host="0.0.0.0", port=WEB_PORT, debug=True)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            serve = None
+        if serve is not None:
+            print(f"🌐 Web server (waitress, {WEB_THREADS} threads) on port {WEB_PORT}")
+            serve(app, host="0.0.0.0", port=WEB_PORT, threads=WEB_THREADS)
+        else:
+            # Werkzeug without debugger or reloader: one thread per request
+            print(f"⚠️  waitress is not installed (see requirements.txt): falling back to the Werkzeug server, "
+                  f"one thread per request, on port {WEB_PORT}")
+            app.run(host="0.0.0.0", port=WEB_PORT, debug=False, threaded=True)
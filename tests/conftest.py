@@ -0,0 +1,7 @@
+# Unit tests for the pure model/ and utils/ components (no broker, no storage).
+# Run from the repository root: python -m pytest -q
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,50 @@
+from collections import deque
+import numpy as np
+import pytest
+from model.danger_field import DangerDistanceField
+
+
+def reference_distance(dangerous, max_distance):
+    """Plain queue BFS over 8 neighbours from every dangerous cell, capped at max_distance + 1"""
+    rows, cols = dangerous.shape
+    distance = np.full(dangerous.shape, max_distance + 1, dtype=np.int16)
+    queue = deque()
+    for r, c in zip(*np.nonzero(dangerous)):
+        distance[r, c] = 0
+        queue.append((r, c))
+    while queue:
+        r, c = queue.popleft()
+        d = distance[r, c] + 1
+        if d > max_distance:
+            continue
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                nr, nc = r + dr, c + dc
+                if 0 <= nr < rows and 0 <= nc < cols and distance[nr, nc] > d:
+                    distance[nr, nc] = d
+                    queue.append((nr, nc))
+    return distance
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 3])
+def test_incremental_updates_match_a_full_bfs(max_distance):
+    rng = np.random.default_rng(max_distance)
+    field = DangerDistanceField(17, 23, max_distance)
+    for _ in range(200):
+        candidates = rng.integers(0, (17, 23), size=(rng.integers(1, 6), 2))
+        flip = np.unique(candidates, axis=0)
+        was = field.dangerous[flip[:, 0], flip[:, 1]]
+        added, removed = flip[~was], flip[was]
+        field.update((added[:, 0], added[:, 1]), (removed[:, 0], removed[:, 1]))
+        np.testing.assert_array_equal(field.distance, reference_distance(field.dangerous, max_distance))
+
+
+def test_empty_update_and_clearing_everything():
+    field = DangerDistanceField(5, 5, 2)
+    field.update(([], []), ([], []))
+    assert (field.distance == field.far).all()
+    field.update(([0, 4], [0, 4]), ([], []))
+    assert field.distance_at(0, 0) == 0 and field.distance_at(1, 1) == 1 and field.distance_at(2, 2) == 2
+    assert field.distance_at(0, 4) == field.far
+    field.update(([], []), ([0, 4], [0, 4]))
+    assert (field.distance == field.far).all()
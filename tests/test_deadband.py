@@ -0,0 +1,57 @@
+import numpy as np
+from model.projection import LocalProjection
+from utils.deadband import Deadband, VectorDeadband, TELEMETRY, HEARTBEAT
+
+LAT, LON = 45.156, 10.791
+
+
+def make_deadband():
+    return Deadband(position_m=2.0, deltas={"battery": 5}, limits={"battery": [10, 100]},
+                    heartbeat_s=30.0, refresh_s=300.0)
+
+
+def test_reaching_or_leaving_a_limit_publishes_inside_the_delta():
+    band = make_deadband()
+    assert band.decide(LAT, LON, {"battery": 13}, now=0.0) == TELEMETRY
+    assert band.decide(LAT, LON, {"battery": 12}, now=1.0) is None
+    assert band.decide(LAT, LON, {"battery": 10}, now=2.0) == TELEMETRY # Reached the limit
+    assert band.decide(LAT, LON, {"battery": 9}, now=3.0) == TELEMETRY # Went below it
+    assert band.decide(LAT, LON, {"battery": 10}, now=4.0) == TELEMETRY # Back at it
+    assert band.decide(LAT, LON, {"battery": 11}, now=5.0) == TELEMETRY # Above it
+    assert band.decide(LAT, LON, {"battery": 99}, now=6.0) == TELEMETRY # Delta exceeded
+    assert band.decide(LAT, LON, {"battery": 100}, now=7.0) == TELEMETRY # Charging complete
+
+
+def test_heartbeat_and_refresh_when_nothing_changes():
+    band = make_deadband()
+    assert band.decide(LAT, LON, {"battery": 50}, now=0.0) == TELEMETRY
+    assert band.decide(LAT, LON, {"battery": 50}, now=29.0) is None
+    assert band.decide(LAT, LON, {"battery": 50}, now=30.0) == HEARTBEAT
+    assert band.decide(LAT, LON, {"battery": 50}, now=31.0) is None
+    assert band.decide(LAT, LON, {"battery": 50}, now=300.0) == TELEMETRY
+
+
+def test_position_threshold_in_meters():
+    band = make_deadband()
+    band.decide(LAT, LON, {}, now=0.0)
+    one_meter = 1.0 / LocalProjection(LAT, LON).m_per_deg_lat
+    assert band.decide(LAT + one_meter, LON, {}, now=1.0) is None
+    assert band.decide(LAT + 3 * one_meter, LON, {}, now=2.0) == TELEMETRY
+
+
+def test_vector_deadband_matches_the_scalar_one():
+    rng = np.random.default_rng(0)
+    size = 20
+    vector = VectorDeadband(size, LocalProjection(LAT, LON), position_m=2.0, deltas={"battery": 5},
+                            limits={"battery": [10, 100]}, heartbeat_s=30.0, refresh_s=300.0)
+    scalars = [make_deadband() for _ in range(size)]
+    battery = rng.integers(0, 101, size)
+    for step in range(400):
+        now = step * 3.0
+        battery = np.clip(battery + rng.integers(-2, 3, size), 0, 100)
+        lat = LAT + rng.normal(0, 1e-5, size)
+        indices = np.flatnonzero(rng.random(size) < 0.7)
+        telemetry, heartbeat = vector.decide(indices, lat, np.full(size, LON), {"battery": battery}, now=now)
+        expected = {i: scalars[i].decide(float(lat[i]), LON, {"battery": int(battery[i])}, now=now) for i in indices}
+        assert set(telemetry.tolist()) == {i for i, d in expected.items() if d == TELEMETRY}
+        assert set(heartbeat.tolist()) == {i for i, d in expected.items() if d == HEARTBEAT}
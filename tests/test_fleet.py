@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from model.fleet import points_in_polygon
+from model.gps import GPS
+from model.worker_smart_helmet import WorkerSmartHelmet
+
+POLYGONS = {
+    "square": [(45.0, 10.0), (45.0, 10.01), (45.01, 10.01), (45.01, 10.0)],
+    "site": [(45.1580, 10.7880), (45.1590, 10.7960), (45.1530, 10.7975), (45.1525, 10.7890)],
+    "concave": [(0.0, 0.0), (0.0, 4.0), (4.0, 4.0), (2.0, 2.0), (4.0, 0.0)],
+}
+
+
+@pytest.mark.parametrize("name", POLYGONS)
+def test_vectorized_ray_casting_matches_the_helmet(name):
+    polygon = POLYGONS[name]
+    helmet = WorkerSmartHelmet("001", GPS(0.0, 0.0))
+    lats = np.array([p[0] for p in polygon])
+    lons = np.array([p[1] for p in polygon])
+    rng = np.random.default_rng(0)
+    margin = (lats.max() - lats.min()) * 0.1
+    lat = rng.uniform(lats.min() - margin, lats.max() + margin, 2000)
+    lon = rng.uniform(lons.min() - margin, lons.max() + margin, 2000)
+    # Boundary cases: the vertices, edge midpoints and points on a vertex's latitude/longitude
+    mid_lat, mid_lon = (lats + np.roll(lats, -1)) / 2, (lons + np.roll(lons, -1)) / 2
+    lat = np.concatenate([lat, lats, mid_lat, lats, rng.uniform(lats.min(), lats.max(), lats.size)])
+    lon = np.concatenate([lon, lons, mid_lon, rng.uniform(lons.min(), lons.max(), lons.size), lons])
+
+    expected = [helmet._point_in_polygon(a, b, polygon) for a, b in zip(lat.tolist(), lon.tolist())]
+    np.testing.assert_array_equal(points_in_polygon(lat, lon, polygon), expected)
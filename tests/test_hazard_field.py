@@ -0,0 +1,44 @@
+import copy
+import numpy as np
+import pytest
+from model.hazard_field import HazardField
+
+LIMITS = {"dust": 50.0, "noise": 85.0, "gas": 1.0}
+
+
+def random_values(rng):
+    values = {"dust": rng.uniform(0, 100), "noise": rng.uniform(40, 110), "gas": rng.uniform(0, 2)}
+    for q in LIMITS:
+        if rng.random() < 0.15:
+            values[q] = np.nan # Quantity not reported
+    return values
+
+
+@pytest.mark.parametrize("radius", [0.0, 40.0])
+def test_incremental_updates_match_a_full_recompute(radius):
+    rng = np.random.default_rng(int(radius))
+    xs, ys = np.meshgrid(np.arange(0, 200, 10.0) + 5, np.arange(0, 120, 10.0) + 5)
+    field = HazardField(np.column_stack([xs.ravel(), ys.ravel()]), LIMITS, radius=radius, refresh_every=10 ** 9)
+    positions = {f"s{i}": rng.uniform(0, (200, 120)) for i in range(6)}
+    for _ in range(300):
+        station = f"s{rng.integers(0, 6)}"
+        if rng.random() < 0.05:
+            positions[station] = rng.uniform(0, (200, 120)) # Moved: rebuilds the pairs
+        east, north = positions[station]
+        changed = field.update_station(station, east, north, random_values(rng))
+
+        reference = copy.deepcopy(field)
+        reference._recompute() # Incremental float drift stays far below the tolerance
+        for q in LIMITS:
+            np.testing.assert_allclose(field.estimate[q], reference.estimate[q], rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(field.index, reference.index, rtol=1e-6, atol=1e-6)
+        assert field.dirty and len(changed) > 0
+
+
+def test_sectors_out_of_reach_stay_nan():
+    field = HazardField([[0.0, 0.0], [100.0, 0.0]], LIMITS, radius=10.0)
+    changed = field.update_station("s1", 1.0, 0.0, {"dust": 100.0, "noise": 85.0, "gas": 0.0})
+    assert changed.tolist() == [0]
+    assert field.index[0] == pytest.approx(2.0) # dust at twice its limit
+    assert np.isnan(field.index[1])
+    assert field.estimate["noise"][0] == pytest.approx(85.0)
@@ -0,0 +1,77 @@
+from utils.inbound_queue import ConflatingQueue, RateLimiter, QUEUED, CONFLATED, EVICTED, DROPPED
+
+
+def drain(queue):
+    items = []
+    while len(queue):
+        items.append(queue.get(timeout=0))
+    return items
+
+
+def test_conflation_keeps_the_place_in_line():
+    queue = ConflatingQueue(10)
+    assert queue.put("a", "a1") == QUEUED
+    assert queue.put("b", "b1") == QUEUED
+    assert queue.put("a", "a2") == CONFLATED
+    assert queue.put("c", "c1", conflate=False) == QUEUED
+    assert queue.put("c", "c2", conflate=False) == QUEUED # Never conflated
+    assert drain(queue) == ["a2", "b1", "c1", "c2"]
+    assert queue.get(timeout=0) is None
+
+
+def test_overflow_evicts_the_oldest_conflatable_message():
+    queue = ConflatingQueue(3)
+    queue.put("event", "e1", conflate=False)
+    queue.put("a", "a1")
+    queue.put("b", "b1")
+    assert queue.put("c", "c1") == EVICTED # a1 is the oldest stale telemetry
+    assert queue.put("d", "d1") == EVICTED
+    assert drain(queue) == ["e1", "c1", "d1"]
+
+
+def test_full_of_unevictable_messages_drops_the_incoming_one():
+    queue = ConflatingQueue(2)
+    queue.put("x", "x1", conflate=False)
+    queue.put("y", "y1", conflate=False)
+    assert queue.put("a", "a1") == DROPPED
+    assert queue.put("z", "z1", conflate=False) == DROPPED
+    assert drain(queue) == ["x1", "y1"]
+
+
+def test_essential_messages_are_never_evicted_or_dropped():
+    queue = ConflatingQueue(2)
+    queue.put("a", "a1", essential=True) # Conflatable resync, but essential
+    queue.put("b", "b1", conflate=False, essential=True)
+    assert queue.put("c", "c1") == DROPPED
+    assert queue.put("d", "d1", conflate=False, essential=True) == QUEUED # Grows past maxsize
+    assert len(queue) == 3
+    assert queue.put("a", "a2", essential=True) == CONFLATED
+    assert drain(queue) == ["a2", "b1", "d1"]
+
+
+def test_essential_message_evicts_stale_telemetry_first():
+    queue = ConflatingQueue(2)
+    queue.put("a", "a1")
+    queue.put("b", "b1")
+    assert queue.put("e", "e1", conflate=False, essential=True) == EVICTED
+    assert drain(queue) == ["b1", "e1"]
+
+
+def test_rate_limiter_burst_refill_and_prune():
+    limiter = RateLimiter(rate=2.0, burst=3.0)
+    assert [limiter.allow("h1", 0.0) for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("h1", 0.5) # One token back after 0.5 s at 2/s
+    assert not limiter.allow("h1", 0.5)
+    assert limiter.allow("h2", 0.5)
+    assert limiter.prune(0.6) == 0 # Neither bucket is full yet
+    assert limiter.prune(10.0) == 2
+    assert limiter.buckets == {}
+
+
+def test_rate_limiter_prunes_idle_devices_automatically():
+    limiter = RateLimiter(rate=1.0, burst=2.0) # Prune every 2 s
+    for i in range(100):
+        limiter.allow(f"h{i}", 0.0)
+    limiter.allow("busy", 5.0)
+    assert set(limiter.buckets) == {"busy"}
+    assert RateLimiter(rate=0.0, burst=1.0).allow("h", 0.0)
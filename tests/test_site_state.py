@@ -0,0 +1,56 @@
+import json
+from model.site_state import SiteStatePublisher, SiteStateView
+
+
+def make_publisher():
+    sent = []
+    publisher = SiteStatePublisher(lambda payload, retain: sent.append(json.loads(payload)),
+                                   min_interval=1.0, full_interval=10.0)
+    return publisher, sent
+
+
+def test_deltas_follow_the_full_snapshot():
+    publisher, sent = make_publisher()
+    view = SiteStateView()
+    publisher.update_helmet("001", 45.1, 10.7, 80, 0)
+    assert publisher.flush(now=0.0) == "full"
+    publisher.update_helmet("002", 45.2, 10.8, 50, 1)
+    publisher.set_zones([3, 4])
+    assert publisher.flush(now=0.5) is None # Rate limited
+    assert publisher.flush(now=1.0) == "delta"
+    assert sent[1]["zones"] == [3, 4] and set(sent[1]["helmets"]) == {"002"}
+
+    for message in sent:
+        assert view.apply(message)
+    assert view.synced and view.seq == 2
+    assert set(view.helmets) == {"001", "002"} and view.zones == [3, 4]
+    assert view.fleet["charging"] == 1
+
+
+def test_gap_waits_for_the_next_full_snapshot():
+    publisher, sent = make_publisher()
+    view = SiteStateView()
+    publisher.flush(now=0.0)
+    for t, battery in ((1.0, 70), (2.0, 60), (3.0, 50)):
+        publisher.update_helmet("001", 45.1, 10.7, battery, 0)
+        publisher.flush(now=t)
+    assert [m["seq"] for m in sent] == [1, 2, 3, 4]
+
+    assert view.apply(sent[0])
+    assert view.apply(sent[1])
+    assert not view.apply(sent[3]) # seq 3 lost
+    assert not view.synced and view.helmets["001"]["battery"] == 70
+    publisher.update_helmet("001", 45.1, 10.7, 40, 0)
+    publisher.flush(now=4.0)
+    assert not view.apply(sent[4]) # Still waiting, even though it follows seq 4
+
+    publisher.flush(now=10.0)
+    assert sent[5]["type"] == "full"
+    assert view.apply(sent[5])
+    assert view.synced and view.seq == sent[5]["seq"] and view.helmets["001"]["battery"] == 40
+
+
+def test_delta_before_any_full_snapshot_is_ignored():
+    view = SiteStateView()
+    assert not view.apply({"seq": 1, "type": "delta", "helmets": {"001": {}}})
+    assert view.helmets == {} and view.seq is None
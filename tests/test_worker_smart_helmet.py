@@ -0,0 +1,53 @@
+import base64
+import numpy as np
+from model.gps import GPS
+from model.worker_smart_helmet import WorkerSmartHelmet
+
+LAT, LON = 45.0, 10.0
+
+
+def danger_map(seq, dangerous, grid="g1"):
+    """2x2 map of 10 m cells starting at (LAT, LON); dangerous: set of (row, col)"""
+    bits = np.zeros((2, 2), dtype=bool)
+    for cell in dangerous:
+        bits[cell] = True
+    return {
+        "seq": seq, "grid": grid, "origin": [LAT, LON], "m_per_deg": [111000.0, 78000.0],
+        "grid_origin": [0.0, 0.0], "step": [10.0, 10.0], "shape": [2, 2],
+        "bits": base64.b64encode(np.packbits(bits.ravel()).tobytes()).decode("ascii")
+    }
+
+
+def helmet_in_cell_00():
+    return WorkerSmartHelmet("001", GPS(LAT + 5 / 111000.0, LON + 5 / 78000.0))
+
+
+def test_changes_are_reported_once():
+    helmet = helmet_in_cell_00()
+    helmet.set_danger_map(danger_map(1, set()))
+    assert helmet.update_danger_state() is None
+    assert not helmet.set_danger_map(danger_map(2, {(0, 0)}))
+    assert helmet.update_danger_state() == "danger_enter"
+    assert not helmet.set_danger_map(danger_map(3, {(0, 0), (1, 1)}))
+    assert helmet.update_danger_state() is None
+    assert not helmet.set_danger_map(danger_map(4, set()))
+    assert helmet.update_danger_state() == "danger_exit"
+
+
+def test_state_is_resent_after_a_manager_restart():
+    helmet = helmet_in_cell_00()
+    assert helmet.set_danger_map(danger_map(1, {(0, 0)})) # First map
+    assert helmet.update_danger_state(True) == "danger_enter"
+    assert not helmet.set_danger_map(danger_map(2, {(0, 0)}))
+
+    # Restarted manager without checkpoint: seq starts again, same zones
+    resync = helmet.set_danger_map(danger_map(1, {(0, 0)}))
+    assert resync and helmet.update_danger_state(resync) == "danger_enter"
+    assert helmet.in_danger
+
+    # Same seq again (retained map after a reconnect) and another grid also resync
+    assert helmet.set_danger_map(danger_map(1, {(0, 0)}))
+    assert helmet.set_danger_map(danger_map(2, set(), grid="g2"))
+    assert helmet.update_danger_state(True) == "danger_exit"
+    assert helmet.update_danger_state(True) == "danger_exit" # Safe state is re-sent too
+    assert helmet.update_danger_state() is None